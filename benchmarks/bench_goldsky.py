@@ -0,0 +1,166 @@
+"""
+Goldsky ingestion throughput benchmark against the local stand-in.
+
+Each scraper mode runs from an empty working directory against the same
+synthetic data set and reports:
+
+- rows/s: events committed per second of wall time
+- p50/p99: client-side page latency, from the shared 'goldsky' RateController
+- data bytes: size of the raw output (CSV + state, or Parquet segments + manifest)
+- index bytes: size of the dedup index written alongside it (event store modes)
+- check: whether every served event was written exactly once
+
+    uv run python benchmarks/bench_goldsky.py --events 200000 --latency 0.02
+    uv run python benchmarks/bench_goldsky.py --modes csv,parquet --throttle-rate 0.02 --json bench.json
+
+By default requests are paced by the production 'goldsky' controller limits;
+pass --rate/--max-rate to measure the scraper itself rather than the budget.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from benchmarks.goldsky_standin import add_server_args, generate_events, standin_from_args
+from poly_utils.rate_control import get_controller, reset_controller
+
+MODES = ['csv', 'csv-pipelined', 'parquet', 'parquet-pipelined', 'backfill']
+
+
+def _dir_bytes(path: str, index: bool) -> int:
+    """Bytes under path, either only dedup index files or everything else"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        in_index = '_dedup' in dirpath
+        if in_index == index:
+            total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+def _written_ids(mode: str) -> pl.Series:
+    """Identity of every committed row (event id for Parquet, transaction hash for CSV)"""
+    if mode.startswith('csv'):
+        return pl.read_csv('goldsky/orderFilled.csv', columns=['transactionHash'])['transactionHash']
+    from update_utils.event_store import EventStore
+    return EventStore().scan().select('id').collect()['id']
+
+
+def run_mode(mode: str, url: str, events: List[Dict], page_size: int, workers: int, verbose: bool,
+             rate_limits: Dict) -> Dict:
+    """Run one scraper mode in a fresh directory and measure it"""
+    reset_controller('goldsky')
+    get_controller('goldsky', **rate_limits)
+    workdir = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.makedirs('goldsky', exist_ok=True)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        from update_utils.update_goldsky import scrape
+        from update_utils.goldsky_backfill import backfill
+
+        started = time.perf_counter()
+        with output:
+            if mode == 'backfill':
+                end = int(events[-1]['timestamp']) + 1
+                backfill(start=int(events[0]['timestamp']), end=end, workers=workers,
+                         at_once=page_size, url=url)
+            else:
+                fmt, _, pipelined = mode.partition('-')
+                scrape(at_once=page_size, output_format=fmt, pipelined=bool(pipelined), url=url)
+        elapsed = time.perf_counter() - started
+
+        written = _written_ids(mode)
+        stats = get_controller('goldsky').stats
+        key = 'transactionHash' if mode.startswith('csv') else 'id'
+        expected = len({e[key] for e in events})
+        unique = written.n_unique()
+        return {
+            'mode': mode,
+            'rows': len(written),
+            'seconds': elapsed,
+            'rows_per_second': len(written) / elapsed if elapsed > 0 else 0.0,
+            'requests': stats.requests,
+            'throttles': stats.throttles,
+            'latency_p50': stats.latency_percentile(50),
+            'latency_p99': stats.latency_percentile(99),
+            'data_bytes': _dir_bytes('goldsky', index=False),
+            'index_bytes': _dir_bytes('goldsky', index=True),
+            'check': 'ok' if len(written) == unique == expected else
+                     f"{expected - unique:,} missing, {len(written) - unique:,} duplicated",
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(results: List[Dict]) -> None:
+    header = (f"{'mode':<19}{'rows':>10}{'rows/s':>10}{'p50 ms':>8}{'p99 ms':>8}"
+              f"{'429s':>6}{'data MB':>9}{'index MB':>10}  check")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['mode']:<19}{r['rows']:>10,}{r['rows_per_second']:>10,.0f}"
+              f"{r['latency_p50'] * 1000:>8.1f}{r['latency_p99'] * 1000:>8.1f}{r['throttles']:>6}"
+              f"{r['data_bytes'] / 1e6:>9.1f}{r['index_bytes'] / 1e6:>10.1f}  {r['check']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Goldsky scraper modes against a local stand-in")
+    add_server_args(parser)
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma-separated subset of {MODES}")
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8, help="backfill workers")
+    parser.add_argument('--rate', type=float, help="initial goldsky request rate (default: the controller's)")
+    parser.add_argument('--max-rate', type=float, help="goldsky request rate ceiling")
+    parser.add_argument('--json', help="also write results to this file")
+    parser.add_argument('--verbose', action='store_true', help="show scraper output")
+    args = parser.parse_args()
+
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        skipped = [m for m in modes if m.endswith('pipelined')]
+        if skipped:
+            print(f"aiohttp not installed, skipping {', '.join(skipped)}")
+        modes = [m for m in modes if not m.endswith('pipelined')]
+
+    print(f"Generating {args.events:,} events...")
+    events = generate_events(args.events, seed=args.seed)
+
+    rate_limits = {k: v for k, v in (('rate', args.rate), ('max_rate', args.max_rate)) if v is not None}
+
+    results = []
+    for mode in modes:
+        # A fresh server per mode so its counters and throttling state start clean
+        with standin_from_args(args, events) as standin:
+            print(f"Running {mode}...")
+            result = run_mode(mode, standin.url, events, min(args.page_size, args.page_limit),
+                              args.workers, args.verbose, rate_limits)
+            result['server'] = standin.stats.as_dict()
+            results.append(result)
+
+    print()
+    print(f"{args.events:,} events, latency {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} ms, "
+          f"page limit {args.page_limit}, 429 rate {args.throttle_rate:.1%}")
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
@@ -0,0 +1,162 @@
+"""
+Gamma market ingestion throughput benchmark against the local stand-in.
+
+Each mode runs from an empty working directory against the same synthetic
+data set and reports:
+
+- markets/s: markets written per second of wall time
+- requests: client-side requests (retries included) and server-side 429s/500s
+- p50/p99: client-side request latency, from the shared 'gamma' RateController
+- check: whether every expected market was written exactly once
+
+Modes:
+
+- markets-serial / markets-concurrent: update_markets() with workers=1 / --workers
+- tokens-serial / tokens-concurrent: update_missing_tokens() for --tokens token
+  ids sampled from the data set, with workers=1 / --workers
+
+    uv run python benchmarks/bench_markets.py --markets 20000 --latency 0.05
+    uv run python benchmarks/bench_markets.py --modes markets-concurrent --throttle-rate 0.02 --error-rate 0.01 --json bench.json
+
+By default requests are paced by the production 'gamma' controller limits;
+pass --rate/--max-rate/--concurrency to measure the fetchers rather than the
+budget.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from benchmarks.gamma_standin import add_server_args, generate_markets, standin_from_args
+from poly_utils.rate_control import get_controller, reset_controller
+
+MODES = ['markets-serial', 'markets-concurrent', 'tokens-serial', 'tokens-concurrent']
+
+
+def sample_tokens(markets: List[Dict], count: int, seed: int = 0) -> List[str]:
+    """`count` token ids of distinct markets, one side each"""
+    rng = random.Random(seed)
+    chosen = rng.sample(markets, min(count, len(markets)))
+    return [json.loads(m['clobTokenIds'])[rng.randint(0, 1)] for m in chosen]
+
+
+def run_mode(mode: str, url: str, markets: List[Dict], tokens: List[str], batch_size: int,
+             workers: int, verbose: bool, rate_limits: Dict) -> Dict:
+    """Run one mode in a fresh directory and measure it"""
+    reset_controller('gamma')
+    get_controller('gamma', **rate_limits)
+    workdir = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    kind, _, path = mode.partition('-')
+    mode_workers = 1 if path == 'serial' else workers
+    try:
+        from update_utils.update_markets import update_markets
+        from poly_utils.utils import update_missing_tokens
+
+        started = time.perf_counter()
+        with output:
+            if kind == 'markets':
+                update_markets('markets.csv', batch_size=batch_size, workers=mode_workers, url=url)
+            else:
+                update_missing_tokens(tokens, 'missing_markets.csv', workers=mode_workers, url=url)
+        elapsed = time.perf_counter() - started
+
+        written_file = 'markets.csv' if kind == 'markets' else 'missing_markets.csv'
+        written = (pl.read_csv(written_file, columns=['id'], schema_overrides={'id': pl.Utf8})['id']
+                   if os.path.exists(written_file) else pl.Series('id', [], dtype=pl.Utf8))
+        if kind == 'markets':
+            expected = {m['id'] for m in markets}
+        else:
+            wanted = set(tokens)
+            expected = {m['id'] for m in markets if wanted & set(json.loads(m['clobTokenIds']))}
+        unique = set(written.to_list())
+        stats = get_controller('gamma').stats
+        return {
+            'mode': mode,
+            'workers': mode_workers,
+            'markets': len(written),
+            'seconds': elapsed,
+            'markets_per_second': len(written) / elapsed if elapsed > 0 else 0.0,
+            'requests': stats.requests,
+            'throttles': stats.throttles,
+            'errors': stats.errors,
+            'latency_p50': stats.latency_percentile(50),
+            'latency_p99': stats.latency_percentile(99),
+            'check': 'ok' if unique == expected and len(written) == len(unique) else
+                     f"{len(expected - unique):,} missing, {len(written) - len(unique):,} duplicated",
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(results: List[Dict]) -> None:
+    header = (f"{'mode':<20}{'workers':>8}{'markets':>9}{'markets/s':>11}{'requests':>10}"
+              f"{'429s':>6}{'5xx':>5}{'p50 ms':>8}{'p99 ms':>8}  check")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['mode']:<20}{r['workers']:>8}{r['markets']:>9,}{r['markets_per_second']:>11,.0f}"
+              f"{r['requests']:>10,}{r['throttles']:>6}{r['errors']:>5}"
+              f"{r['latency_p50'] * 1000:>8.1f}{r['latency_p99'] * 1000:>8.1f}  {r['check']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Gamma market ingestion against a local stand-in")
+    add_server_args(parser)
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma-separated subset of {MODES}")
+    parser.add_argument('--batch-size', type=int, default=500, help="markets per update_markets request")
+    parser.add_argument('--tokens', type=int, default=2000, help="token ids looked up by the tokens modes")
+    parser.add_argument('--workers', type=int, default=4, help="workers for the concurrent modes")
+    parser.add_argument('--rate', type=float, help="initial gamma request rate (default: the controller's)")
+    parser.add_argument('--max-rate', type=float, help="gamma request rate ceiling")
+    parser.add_argument('--concurrency', type=int, help="initial gamma concurrency")
+    parser.add_argument('--json', help="also write results to this file")
+    parser.add_argument('--verbose', action='store_true', help="show fetcher output")
+    args = parser.parse_args()
+
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    print(f"Generating {args.markets:,} markets...")
+    markets, events = generate_markets(args.markets, seed=args.seed)
+    tokens = sample_tokens(markets, args.tokens, seed=args.seed)
+
+    rate_limits = {k: v for k, v in (('rate', args.rate), ('max_rate', args.max_rate),
+                                     ('concurrency', args.concurrency)) if v is not None}
+
+    results = []
+    for mode in modes:
+        # A fresh server per mode so its counters and fault injection start clean
+        with standin_from_args(args, markets, events) as standin:
+            print(f"Running {mode}...")
+            result = run_mode(mode, standin.markets_url, markets, tokens, min(args.batch_size, args.page_limit),
+                              args.workers, args.verbose, rate_limits)
+            result['server'] = standin.stats.as_dict()
+            results.append(result)
+
+    print()
+    print(f"{args.markets:,} markets, {len(tokens):,} tokens, latency {args.latency * 1000:.0f}+"
+          f"{args.jitter * 1000:.0f} ms, 429 rate {args.throttle_rate:.1%}, 500 rate {args.error_rate:.1%}")
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
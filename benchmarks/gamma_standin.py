@@ -0,0 +1,331 @@
+"""
+Local stand-in for the Gamma markets API (gamma-api.polymarket.com).
+
+Serves `/markets` and `/events` from a deterministic synthetic data set with
+the query parameters the ingestion code sends:
+
+- /markets: `limit`/`offset` pagination in createdAt order, `closed`,
+  `end_date_min`, repeated `id` and `clob_token_ids` filters
+- /events: `limit`/`offset` pagination and `closed`; each event carries its
+  markets, and a share of them are up/down events for market_discovery
+
+and knobs for the things that matter for ingestion throughput:
+
+- latency: fixed per-request delay plus uniform jitter
+- page_limit: largest `limit` honoured; larger requests are clamped, as Gamma does
+- throttle_rate: fraction of requests answered 429 with a Retry-After header
+- error_rate: fraction of requests answered 500
+- gzip: compress responses when the client accepts it
+
+Run standalone:
+
+    uv run python benchmarks/gamma_standin.py --markets 50000 --port 8766
+
+and point the fetchers at it with update_markets(url='http://127.0.0.1:8766/markets')
+or update_missing_tokens(..., url='http://127.0.0.1:8766/markets').
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+START = datetime(2022, 1, 1, tzinfo=timezone.utc)
+MAX_LIMIT = 500
+UPDOWN_ASSETS = [('btc', 'Bitcoin'), ('eth', 'Ethereum'), ('sol', 'Solana')]
+UPDOWN_DURATIONS = [('5m', 300), ('15m', 900), ('1h', 3600)]
+
+
+def _iso(ts: datetime) -> str:
+    return ts.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def generate_markets(count: int, seed: int = 0, markets_per_event: int = 3,
+                     updown_share: float = 0.2, closed_share: float = 0.7) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Synthetic Gamma markets (in createdAt order) and the events grouping them
+
+    Payloads carry the fields the decoder reads plus a description, so page
+    sizes are close to the real API's. A share of the events are single-market
+    up/down events ("Bitcoin Up or Down", slug btc-updown-5m-<ts>).
+
+    Returns:
+        (markets, events); every event embeds its markets
+    """
+    rng = random.Random(seed)
+    markets, events = [], []
+    created = START
+    while len(markets) < count:
+        event_id = str(len(events) + 1)
+        closed = rng.random() < closed_share
+        if rng.random() < updown_share:
+            (asset, name), (duration, seconds) = rng.choice(UPDOWN_ASSETS), rng.choice(UPDOWN_DURATIONS)
+            start = int(created.timestamp())
+            title = f"{name} Up or Down - {duration}"
+            slug = f"{asset}-updown-{duration}-{start}"
+            size, outcomes = 1, ['Up', 'Down']
+            end = created + timedelta(seconds=seconds)
+        else:
+            title = f"Synthetic event {event_id}?"
+            slug = f"synthetic-event-{event_id}"
+            size, outcomes = rng.randint(1, markets_per_event * 2 - 1), ['Yes', 'No']
+            end = created + timedelta(days=rng.randint(1, 90))
+        event = {
+            'id': event_id, 'ticker': slug, 'slug': slug, 'title': title,
+            'endDate': _iso(end), 'closed': closed, 'markets': [],
+        }
+        for _ in range(min(size, count - len(markets))):
+            created += timedelta(seconds=rng.randint(1, 600))
+            market_id = str(len(markets) + 1)
+            market = {
+                'id': market_id,
+                'question': title if size == 1 else f"{title} (outcome {len(event['markets']) + 1})",
+                'conditionId': f"0x{rng.getrandbits(256):064x}",
+                'slug': f"{slug}-{market_id}",
+                'endDate': _iso(end),
+                'description': f"This market resolves according to synthetic rule {market_id}. " * 6,
+                'outcomes': json.dumps(outcomes),
+                'volume': f"{rng.random() * 1e6:.6f}",
+                'active': True,
+                'closed': closed,
+                'createdAt': _iso(created),
+                'closedTime': _iso(end) if closed else None,
+                'clobTokenIds': json.dumps([str(rng.getrandbits(252)), str(rng.getrandbits(252))]),
+                'negRiskAugmented': rng.random() < 0.1,
+                'eventStartTime': _iso(created) if size == 1 and outcomes[0] == 'Up' else None,
+                'resolutionSource': 'https://data.chain.link/streams' if outcomes[0] == 'Up' else '',
+                'events': [{'id': event_id, 'ticker': slug, 'slug': slug, 'title': title}],
+            }
+            markets.append(market)
+            event['markets'].append(market)
+        events.append(event)
+    return markets, events
+
+
+class StandInStats:
+    """Request counters, shared across handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes_sent = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'rows': self.rows,
+                'bytes_sent': self.bytes_sent,
+            }
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """Ignores clients dropping keep-alive connections"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class GammaStandIn:
+    """Threaded HTTP server answering /markets and /events from an in-memory data set"""
+
+    def __init__(self, markets: List[Dict], events: List[Dict], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, page_limit: int = MAX_LIMIT,
+                 throttle_rate: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0,
+                 gzip_responses: bool = True, seed: int = 0):
+        self.markets = markets
+        self.events = events
+        # Pre-encoded rows: a page is a join of byte strings
+        self.encoded = [json.dumps(m, separators=(',', ':')).encode() for m in markets]
+        self.encoded_events = [json.dumps(e, separators=(',', ':')).encode() for e in events]
+        self.by_id = {m['id']: i for i, m in enumerate(markets)}
+        self.by_token = {t: i for i, m in enumerate(markets) for t in json.loads(m['clobTokenIds'])}
+        self.latency = latency
+        self.jitter = jitter
+        self.page_limit = page_limit
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.gzip_responses = gzip_responses
+        self.stats = StandInStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection pooling is measurable
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, headers, payload = standin.handle(parts.path.rstrip('/'), parse_qs(parts.query))
+                if standin.gzip_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    payload = gzip.compress(payload, compresslevel=1)
+                    headers['Content-Encoding'] = 'gzip'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                with standin.stats.lock:
+                    standin.stats.bytes_sent += len(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _QuietServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def markets_url(self) -> str:
+        return f"{self.url}/markets"
+
+    # ------------------------------------------------------------------
+    # Query handling
+    # ------------------------------------------------------------------
+
+    def _simulate(self) -> Optional[int]:
+        """Sleep for the configured latency; returns 429/500 if this request should fail"""
+        with self._rng_lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            roll = self._rng.random()
+        if delay > 0:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def _window(self, params: Dict[str, List[str]], rows: List[int]) -> List[int]:
+        limit = min(int(params.get('limit', ['20'])[0]), self.page_limit)
+        offset = int(params.get('offset', ['0'])[0])
+        return rows[offset:offset + limit]
+
+    def select_markets(self, params: Dict[str, List[str]]) -> List[int]:
+        """Row indices answering one /markets query"""
+        if 'id' in params or 'clob_token_ids' in params:
+            rows = sorted({self.by_id[i] for i in params.get('id', []) if i in self.by_id}
+                          | {self.by_token[t] for t in params.get('clob_token_ids', []) if t in self.by_token})
+        else:
+            rows = range(len(self.markets))
+        if 'closed' in params:
+            closed = params['closed'][0] == 'true'
+            rows = [i for i in rows if self.markets[i]['closed'] == closed]
+        if 'end_date_min' in params:
+            rows = [i for i in rows if self.markets[i]['endDate'] >= params['end_date_min'][0]]
+        if params.get('ascending', ['true'])[0] == 'false':
+            rows = list(reversed(rows))
+        return self._window(params, list(rows))
+
+    def select_events(self, params: Dict[str, List[str]]) -> List[int]:
+        """Row indices answering one /events query (newest first, as order=new asks)"""
+        rows = range(len(self.events) - 1, -1, -1)
+        if 'closed' in params:
+            closed = params['closed'][0] == 'true'
+            rows = [i for i in rows if self.events[i]['closed'] == closed]
+        return self._window(params, list(rows))
+
+    def handle(self, path: str, params: Dict[str, List[str]]):
+        """Returns (status, headers, body bytes)"""
+        with self.stats.lock:
+            self.stats.requests += 1
+
+        failure = self._simulate()
+        if failure == 429:
+            with self.stats.lock:
+                self.stats.throttled += 1
+            return 429, {'Retry-After': f"{self.retry_after:g}"}, b'{"error":"rate limited"}'
+        if failure == 500:
+            with self.stats.lock:
+                self.stats.errors += 1
+            return 500, {}, b'{"error":"internal server error"}'
+
+        if path == '/markets':
+            encoded, rows = self.encoded, self.select_markets(params)
+        elif path == '/events':
+            encoded, rows = self.encoded_events, self.select_events(params)
+        else:
+            return 404, {}, b'{"error":"not found"}'
+
+        with self.stats.lock:
+            self.stats.rows += len(rows)
+        return 200, {}, b'[' + b','.join(encoded[i] for i in rows) + b']'
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> 'GammaStandIn':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--markets', type=int, default=20_000, help="synthetic markets to serve")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument('--jitter', type=float, default=0.02, help="extra uniform random delay (seconds)")
+    parser.add_argument('--page-limit', type=int, default=MAX_LIMIT, help="largest `limit` honoured")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument('--no-gzip', action='store_true', help="never compress responses")
+
+
+def standin_from_args(args, markets: List[Dict], events: List[Dict], port: int = 0) -> GammaStandIn:
+    return GammaStandIn(
+        markets, events, port=port, latency=args.latency, jitter=args.jitter, page_limit=args.page_limit,
+        throttle_rate=args.throttle_rate, error_rate=args.error_rate, retry_after=args.retry_after,
+        gzip_responses=not args.no_gzip, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic Gamma /markets and /events")
+    add_server_args(parser)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f"Generating {args.markets:,} markets...")
+    markets, events = generate_markets(args.markets, seed=args.seed)
+    standin = standin_from_args(args, markets, events, port=args.port)
+    print(f"Serving {len(markets):,} markets in {len(events):,} events on {standin.url} (Ctrl+C to stop)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
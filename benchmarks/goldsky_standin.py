@@ -0,0 +1,270 @@
+"""
+Local stand-in for the Goldsky orderbook subgraph.
+
+Serves the `orderFilledEvents` queries the scraper emits (timestamp-ordered
+pages and id-ordered drain pages, see goldsky_pager.build_keyset_query) from a
+deterministic synthetic data set, with knobs for the things that matter for
+ingestion throughput:
+
+- latency: fixed per-request delay plus uniform jitter
+- page_limit: largest `first` accepted; larger requests get a GraphQL
+  error, as graph-node does
+- throttle_rate: fraction of requests answered 429 with a Retry-After header
+- gzip: compress responses when the client accepts it
+
+Run standalone:
+
+    uv run python benchmarks/goldsky_standin.py --events 500000 --port 8765
+
+and point the scraper at it with scrape(url='http://127.0.0.1:8765/').
+"""
+import argparse
+import bisect
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.goldsky_pager import MAX_PAGE_SIZE
+
+START_TIMESTAMP = 1704067200  # 2024-01-01 00:00:00 UTC
+
+
+def generate_events(count: int, start_ts: int = START_TIMESTAMP, seed: int = 0,
+                    burst_every: int = 500, burst_size: int = 2500, tokens: int = 200) -> List[Dict]:
+    """
+    Synthetic orderFilledEvents sorted by (timestamp, id)
+
+    Most seconds hold a handful of fills; every `burst_every` seconds one
+    holds `burst_size`, more than a page, so the pager's drain path is exercised.
+    """
+    rng = random.Random(seed)
+    token_ids = [str(rng.getrandbits(252)).rjust(76, '1') for _ in range(tokens)]
+    events = []
+    ts = start_ts
+    while len(events) < count:
+        in_second = burst_size if (ts - start_ts) % burst_every == burst_every - 1 else rng.randint(0, 8)
+        for _ in range(min(in_second, count - len(events))):
+            token = rng.choice(token_ids)
+            buy = rng.random() < 0.5
+            usdc = rng.randint(1, 5_000) * 10_000
+            shares = rng.randint(1, 10_000) * 10_000
+            events.append({
+                'fee': '0',
+                'id': f"0x{rng.getrandbits(256):064x}_0x{rng.getrandbits(256):064x}",
+                'maker': f"0x{rng.getrandbits(160):040x}",
+                'makerAmountFilled': str(usdc if buy else shares),
+                'makerAssetId': '0' if buy else token,
+                'orderHash': f"0x{rng.getrandbits(256):064x}",
+                'taker': f"0x{rng.getrandbits(160):040x}",
+                'takerAmountFilled': str(shares if buy else usdc),
+                'takerAssetId': token if buy else '0',
+                'timestamp': str(ts),
+                'transactionHash': f"0x{rng.getrandbits(256):064x}",
+            })
+        ts += 1
+    events.sort(key=lambda e: (int(e['timestamp']), e['id']))
+    return events
+
+
+class StandInStats:
+    """Request counters, shared across handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.rows = 0
+        self.bytes_sent = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'rejected': self.rejected,
+                'rows': self.rows,
+                'bytes_sent': self.bytes_sent,
+            }
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """Ignores clients dropping keep-alive connections"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class GoldskyStandIn:
+    """Threaded HTTP server answering orderFilledEvents queries from an in-memory data set"""
+
+    def __init__(self, events: List[Dict], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, page_limit: int = MAX_PAGE_SIZE,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, gzip_responses: bool = True,
+                 seed: int = 0):
+        self.keys = [(int(e['timestamp']), e['id']) for e in events]
+        self.timestamps = [k[0] for k in self.keys]
+        # Pre-encoded rows: a page is a join of byte strings
+        self.encoded = [json.dumps(e, separators=(',', ':')).encode() for e in events]
+        self.latency = latency
+        self.jitter = jitter
+        self.page_limit = page_limit
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.gzip_responses = gzip_responses
+        self.stats = StandInStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection pooling is measurable
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                status, headers, payload = standin.handle(body.get('query', ''))
+                if standin.gzip_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    payload = gzip.compress(payload, compresslevel=1)
+                    headers['Content-Encoding'] = 'gzip'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                with standin.stats.lock:
+                    standin.stats.bytes_sent += len(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _QuietServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    # ------------------------------------------------------------------
+    # Query handling
+    # ------------------------------------------------------------------
+
+    def _simulate(self) -> bool:
+        """Sleep for the configured latency; returns True if this request should be throttled"""
+        with self._rng_lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            throttle = self._rng.random() < self.throttle_rate
+        if delay > 0:
+            time.sleep(delay)
+        return throttle
+
+    def select(self, query: str) -> range:
+        """Row indices answering one pager query"""
+        def arg(name):
+            match = re.search(name + r': "([^"]*)"', query)
+            return match.group(1) if match else None
+
+        first = int(re.search(r'first: (\d+)', query).group(1))
+        if 'orderBy: id' in query:
+            ts = int(arg('timestamp'))
+            lo = bisect.bisect_right(self.keys, (ts, arg('id_gt')))
+            hi = bisect.bisect_right(self.timestamps, ts)
+        else:
+            lo = bisect.bisect_right(self.timestamps, int(arg('timestamp_gt')))
+            lt = arg('timestamp_lt')
+            hi = bisect.bisect_left(self.timestamps, int(lt)) if lt is not None else len(self.keys)
+        return range(lo, max(lo, min(hi, lo + first)))
+
+    def handle(self, query: str):
+        """Returns (status, headers, body bytes)"""
+        with self.stats.lock:
+            self.stats.requests += 1
+
+        if self._simulate():
+            with self.stats.lock:
+                self.stats.throttled += 1
+            return 429, {'Retry-After': f"{self.retry_after:g}"}, b'{"error":"rate limited"}'
+
+        first = re.search(r'first: (\d+)', query)
+        if first is None or 'orderFilledEvents' not in query:
+            return 200, {}, b'{"errors":[{"message":"unsupported query"}]}'
+        if int(first.group(1)) > self.page_limit:
+            with self.stats.lock:
+                self.stats.rejected += 1
+            message = f"The `first` argument must be between 0 and {self.page_limit}"
+            return 200, {}, json.dumps({'errors': [{'message': message}]}).encode()
+
+        rows = self.select(query)
+        with self.stats.lock:
+            self.stats.rows += len(rows)
+        payload = b'{"data":{"orderFilledEvents":[' + b','.join(self.encoded[i] for i in rows) + b']}}'
+        return 200, {}, payload
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> 'GoldskyStandIn':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--events', type=int, default=200_000, help="synthetic events to serve")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every request")
+    parser.add_argument('--jitter', type=float, default=0.01, help="extra uniform random delay (seconds)")
+    parser.add_argument('--page-limit', type=int, default=MAX_PAGE_SIZE, help="largest `first` accepted")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument('--no-gzip', action='store_true', help="never compress responses")
+
+
+def standin_from_args(args, events: List[Dict], port: int = 0) -> GoldskyStandIn:
+    return GoldskyStandIn(
+        events, port=port, latency=args.latency, jitter=args.jitter, page_limit=args.page_limit,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        gzip_responses=not args.no_gzip, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic orderFilledEvents over GraphQL")
+    add_server_args(parser)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"Generating {args.events:,} events...")
+    events = generate_events(args.events, seed=args.seed)
+    standin = standin_from_args(args, events, port=args.port)
+    print(f"Serving on {standin.url} (Ctrl+C to stop)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
@@ -0,0 +1,18 @@
+"""
+Small file helpers shared by poly_utils and the update_utils pipeline stages.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    """Write JSON to a temp file, fsync it and rename it over the target"""
+    # Unique temp name: several processes or threads may publish the same file at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
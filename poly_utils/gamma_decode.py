@@ -0,0 +1,267 @@
+"""
+Columnar decoding of Gamma API market payloads.
+
+Gamma returns markets (and events, each with a `markets` list) as JSON
+objects whose list fields, `outcomes` and `clobTokenIds`, are themselves
+JSON-encoded strings. decode_markets() reads a whole response page straight
+into PAYLOAD_SCHEMA columns with polars' JSON reader (read_payload()), decodes the nested
+lists of each column in one pass and derives MARKET_SCHEMA from them. Pages
+the reader rejects (wrong types, non-object entries) fall back to building
+the same columns in Python.
+
+update_markets, update_missing_tokens, the market catalog and the up/down
+market discovery all build their rows from this frame, so every stage parses
+the same fields with the same defaults.
+
+orjson is optional (`pip install poly-data[fast]`); it speeds up loads() and
+re-encoding already parsed pages, and the standard json module is used
+without it.
+"""
+import io
+import json
+from typing import Any, Dict, List, Tuple, Union
+
+import polars as pl
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# One row per market; string columns mirror markets.csv ('' when Gamma omits them).
+# `volume` is kept as the text Gamma sent ('10.50'), as markets.csv has always stored it
+MARKET_SCHEMA = {
+    'createdAt': pl.Utf8,
+    'id': pl.Utf8,
+    'question': pl.Utf8,
+    'answer1': pl.Utf8,
+    'answer2': pl.Utf8,
+    'neg_risk': pl.Boolean,
+    'market_slug': pl.Utf8,
+    'token1': pl.Utf8,
+    'token2': pl.Utf8,
+    'condition_id': pl.Utf8,
+    'volume': pl.Utf8,
+    'ticker': pl.Utf8,
+    'closedTime': pl.Utf8,
+    'active': pl.Boolean,
+    'closed': pl.Boolean,
+    'end_date': pl.Utf8,
+    'event_start_time': pl.Utf8,
+    'resolution_source': pl.Utf8,
+}
+
+# markets.csv / missing_markets.csv columns, in file order
+MARKETS_CSV_COLUMNS = list(MARKET_SCHEMA)[:13]
+
+# Gamma fields read from each market object, as they appear on the wire
+PAYLOAD_SCHEMA = {
+    'id': pl.Utf8,
+    'createdAt': pl.Utf8,
+    'question': pl.Utf8,
+    'title': pl.Utf8,
+    'outcomes': pl.Utf8,          # JSON-encoded list
+    'clobTokenIds': pl.Utf8,      # JSON-encoded list
+    'slug': pl.Utf8,
+    'conditionId': pl.Utf8,
+    'volume': pl.Utf8,
+    'negRiskAugmented': pl.Boolean,
+    'negRiskOther': pl.Boolean,
+    'events': pl.List(pl.Struct({'ticker': pl.Utf8})),
+    'closedTime': pl.Utf8,
+    'active': pl.Boolean,
+    'closed': pl.Boolean,
+    'endDate': pl.Utf8,
+    'eventStartTime': pl.Utf8,
+    'resolutionSource': pl.Utf8,
+}
+
+# Event columns added by decode_event_markets
+EVENT_SCHEMA = {
+    'event_index': pl.UInt32,
+    'event_id': pl.Utf8,
+    'event_slug': pl.Utf8,
+    'event_title': pl.Utf8,
+    'event_end_date': pl.Utf8,
+}
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse a JSON document, with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _payload_frame(records: List[Any]) -> pl.DataFrame:
+    """
+    PAYLOAD_SCHEMA frame built field by field in Python
+
+    Slower than pl.read_json but tolerant of what it rejects: non-object
+    entries, numbers where text is expected, list fields sent unencoded.
+    """
+    records = [r if isinstance(r, dict) else {} for r in records]
+    columns = {}
+    for name, dtype in PAYLOAD_SCHEMA.items():
+        values = [r.get(name) for r in records]
+        if name in ('outcomes', 'clobTokenIds'):
+            values = [v if v is None or isinstance(v, str) else json.dumps(v) for v in values]
+        elif name == 'events':
+            values = [[{'ticker': _text(e.get('ticker'))} for e in v if isinstance(e, dict)]
+                      if isinstance(v, list) else None for v in values]
+        elif dtype == pl.Utf8:
+            values = [_text(v) for v in values]
+        columns[name] = values
+    return pl.DataFrame(columns, schema=PAYLOAD_SCHEMA, strict=False)
+
+
+def _text(value: Any, default: str = None) -> str:
+    return default if value is None else str(value)
+
+
+def _decode_lists(values: pl.Series) -> pl.Series:
+    """Decode a column of JSON-encoded string lists; missing or malformed entries become empty lists"""
+    values = values.fill_null('[]').replace('', '[]')
+    try:
+        return values.str.json_decode(pl.List(pl.Utf8))
+    except pl.exceptions.PolarsError:
+        # One bad entry fails the vectorized decode; fall back to decoding row by row
+        decoded = []
+        for value in values:
+            try:
+                items = json.loads(value)
+                decoded.append([str(v) for v in items] if isinstance(items, list) else [])
+            except ValueError:
+                decoded.append([])
+        return pl.Series(values.name, decoded, dtype=pl.List(pl.Utf8))
+
+
+def read_payload(page: Union[bytes, str, List[Dict]]) -> pl.DataFrame:
+    """
+    Read one page of Gamma markets into PAYLOAD_SCHEMA columns
+
+    Args:
+        page: Raw response body, or the already parsed list of market objects
+
+    Returns:
+        One row per page entry, in page order (malformed entries included)
+    """
+    if isinstance(page, list):
+        if not page:
+            return pl.DataFrame(schema=PAYLOAD_SCHEMA)
+        # Re-encoding is cheaper than building the columns in Python
+        page = dumps(page)
+    elif isinstance(page, str):
+        page = page.encode()
+
+    try:
+        return pl.read_json(io.BytesIO(page), schema=PAYLOAD_SCHEMA)
+    except (pl.exceptions.PolarsError, ValueError):
+        parsed = loads(page)
+        return _payload_frame(parsed if isinstance(parsed, list) else [])
+
+
+def payload_to_markets(raw: pl.DataFrame, answers: Tuple[str, str] = ('', '')) -> pl.DataFrame:
+    """
+    MARKET_SCHEMA frame for a read_payload() page; entries without an id are dropped
+
+    Args:
+        raw: read_payload() frame
+        answers: answer1/answer2 for markets whose outcomes are missing
+    """
+    total = len(raw)
+    raw = raw.filter(pl.col('id').is_not_null() & (pl.col('id') != ''))
+    if len(raw) < total:
+        print(f"Skipped {total - len(raw)} malformed market entries")
+    if len(raw) == 0:
+        return pl.DataFrame(schema=MARKET_SCHEMA)
+    outcomes = _decode_lists(raw['outcomes'])
+    tokens = _decode_lists(raw['clobTokenIds'])
+    text = lambda name: pl.col(name).fill_null('')
+    return raw.select(
+        text('createdAt'),
+        pl.col('id'),
+        pl.when(pl.col('question').fill_null('') != '').then(pl.col('question'))
+        .otherwise(text('title')).alias('question'),
+        outcomes.list.get(0, null_on_oob=True).fill_null(answers[0]).alias('answer1'),
+        outcomes.list.get(1, null_on_oob=True).fill_null(answers[1]).alias('answer2'),
+        (pl.col('negRiskAugmented').fill_null(False) | pl.col('negRiskOther').fill_null(False)).alias('neg_risk'),
+        text('slug').alias('market_slug'),
+        tokens.list.get(0, null_on_oob=True).fill_null('').alias('token1'),
+        tokens.list.get(1, null_on_oob=True).fill_null('').alias('token2'),
+        text('conditionId').alias('condition_id'),
+        text('volume'),
+        pl.col('events').list.first().struct.field('ticker').fill_null('').alias('ticker'),
+        text('closedTime'),
+        pl.col('active'),
+        pl.col('closed'),
+        pl.col('endDate').alias('end_date'),
+        pl.col('eventStartTime').alias('event_start_time'),
+        pl.col('resolutionSource').alias('resolution_source'),
+    )
+
+
+def decode_markets(page: Union[bytes, str, List[Dict]], answers: Tuple[str, str] = ('', '')) -> pl.DataFrame:
+    """
+    Decode one page of Gamma markets into a MARKET_SCHEMA frame
+
+    Args:
+        page: Raw response body, or the already parsed list of market objects
+        answers: answer1/answer2 for markets whose outcomes are missing
+
+    Returns:
+        One row per market with an id, in page order
+    """
+    return payload_to_markets(read_payload(page), answers)
+
+
+def decode_event_markets(events: Union[bytes, str, List[Dict]]) -> pl.DataFrame:
+    """
+    Decode a page of Gamma events into the first market of each event
+
+    Returns:
+        EVENT_SCHEMA columns (event_index is the event's position in the page)
+        followed by MARKET_SCHEMA columns; events without a market are dropped
+    """
+    if isinstance(events, (bytes, str)):
+        events = loads(events)
+    firsts = [(i, e, (e.get('markets') or [None])[0]) for i, e in enumerate(events or [])]
+    firsts = [(i, e, m) for i, e, m in firsts if isinstance(m, dict) and m.get('id') not in (None, '')]
+    if not firsts:
+        return pl.DataFrame(schema={**EVENT_SCHEMA, **MARKET_SCHEMA})
+
+    event_columns = pl.DataFrame({
+        'event_index': [i for i, _, _ in firsts],
+        'event_id': [_text(e.get('id')) for _, e, _ in firsts],
+        'event_slug': [_text(e.get('slug')) for _, e, _ in firsts],
+        'event_title': [_text(e.get('title')) for _, e, _ in firsts],
+        'event_end_date': [_text(e.get('endDate')) for _, e, _ in firsts],
+    }, schema=EVENT_SCHEMA)
+    return pl.concat([event_columns, decode_markets([m for _, _, m in firsts])], how='horizontal')
+
+
+# Formats tried in order; naive and date-only values are read as UTC
+ISO_FORMATS = ('%Y-%m-%dT%H:%M:%S%.f%:z', '%Y-%m-%dT%H:%M:%S%.f', '%Y-%m-%d')
+
+
+def iso_to_unix(column: str) -> pl.Expr:
+    """ISO-8601 text column → Unix seconds (null when missing or unparseable)
+
+    Each format is parsed explicitly and coalesced, so a column mixing
+    date-only values and full timestamps keeps both.
+    """
+    text = pl.col(column).str.replace(r'Z$', '+00:00')
+    return pl.coalesce(
+        text.str.to_datetime(fmt, time_zone='UTC', strict=False) for fmt in ISO_FORMATS
+    ).dt.epoch('s')
+
+
+def csv_rows(markets: pl.DataFrame, columns: List[str]) -> List[List]:
+    """Rows for csv.writer in `columns` order; nulls are written as empty fields"""
+    return [['' if v is None else v for v in row] for row in markets.select(columns).iter_rows()]
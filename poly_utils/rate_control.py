@@ -0,0 +1,308 @@
+"""
+Adaptive request throttling shared by the Polymarket and Goldsky fetchers.
+
+A RateController paces requests to one API with AIMD (additive increase,
+multiplicative decrease) on both request rate and concurrency:
+
+- every successful response nudges the rate and concurrency limit up;
+- a 429 halves them and pauses all callers for `Retry-After` seconds
+  (or an exponential backoff when the header is missing);
+- network errors and 5xx responses back off exponentially without
+  shrinking the limits as sharply.
+
+request() gives up on a host that stays unreachable: after
+MAX_NETWORK_ERRORS consecutive network errors the last one is raised, so
+callers with their own retry budget (or none) get control back.
+
+Controllers are shared per API through get_controller(), so every fetcher
+that talks to the same host draws from the same budget. Counters for
+requests, throttles, errors and rows are exposed via `stats`.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Consecutive network errors after which request() re-raises
+MAX_NETWORK_ERRORS = 8
+
+# Request latencies kept per controller for percentiles
+LATENCY_SAMPLES = 100_000
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateStats:
+    """Counters for one controller"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.successes = 0
+        self.throttles = 0
+        self.errors = 0
+        self.rows = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.time() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def latency_percentile(self, q: float) -> float:
+        """Request latency percentile in seconds (q in [0, 100]) over recent requests"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'throttles': self.throttles,
+            'errors': self.errors,
+            'rows': self.rows,
+            'rows_per_second': self.rows_per_second,
+            'latency_p50': self.latency_percentile(50),
+            'latency_p99': self.latency_percentile(99),
+        }
+
+
+class RateController:
+    """AIMD rate and concurrency limiter for one API"""
+
+    def __init__(self, name: str, rate: float = 2.0, min_rate: float = 0.1, max_rate: float = 50.0,
+                 concurrency: int = 4, max_concurrency: int = 32, additive_step: float = 0.1,
+                 decrease_factor: float = 0.5, max_backoff: float = 60.0):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.additive_step = additive_step
+        self.decrease_factor = decrease_factor
+        self.max_backoff = max_backoff
+        self.stats = RateStats()
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._next_start = 0.0
+        self._blocked_until = 0.0
+        self._consecutive_errors = 0
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _reserve(self) -> float:
+        """Claim a concurrency slot and a start time; returns seconds to wait"""
+        with self._cond:
+            while self._in_flight >= max(1, int(self.concurrency)):
+                self._cond.wait()
+            self._in_flight += 1
+            self.stats.requests += 1
+            now = time.monotonic()
+            start = max(now, self._next_start, self._blocked_until)
+            self._next_start = start + 1.0 / self.rate
+            return start - now
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold a request slot for the duration of one call; the call's latency is recorded"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stats.latencies.append(time.monotonic() - started)
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Async slot; the blocking wait for a free slot runs in a worker thread"""
+        reserved = asyncio.get_running_loop().run_in_executor(None, self._reserve)
+        try:
+            wait = await asyncio.shield(reserved)
+        except asyncio.CancelledError:
+            # The worker thread still claims the slot; hand it back once it does
+            reserved.add_done_callback(lambda f: f.cancelled() or f.exception() or self.release())
+            raise
+        started = time.monotonic()
+        try:
+            # Sleep inside the try so a task cancelled while paced frees its slot
+            if wait > 0:
+                await asyncio.sleep(wait)
+                started = time.monotonic()
+            yield
+        finally:
+            self.stats.latencies.append(time.monotonic() - started)
+            self.release()
+
+    # ------------------------------------------------------------------
+    # Feedback
+    # ------------------------------------------------------------------
+
+    def _backoff(self) -> float:
+        delay = min(self.max_backoff, 0.5 * 2 ** self._consecutive_errors)
+        return delay * (0.5 + random.random() / 2)
+
+    def on_success(self, rows: int = 0) -> None:
+        """Additive increase of rate and concurrency"""
+        with self._cond:
+            self.stats.successes += 1
+            self.stats.rows += rows
+            self._consecutive_errors = 0
+            self.rate = min(self.max_rate, self.rate + self.additive_step)
+            # Roughly +1 slot per `concurrency` successes
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / max(self.concurrency, 1.0))
+            self._cond.notify_all()
+
+    def record_rows(self, rows: int) -> None:
+        with self._cond:
+            self.stats.rows += rows
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> float:
+        """Multiplicative decrease and a shared pause; returns the pause in seconds"""
+        with self._cond:
+            self.stats.throttles += 1
+            self._consecutive_errors += 1
+            now = time.monotonic()
+            # Concurrent 429s from one congestion event only cut the limits once
+            if now >= self._blocked_until:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+            delay = retry_after if retry_after is not None else self._backoff()
+            self._blocked_until = max(self._blocked_until, now + delay)
+            return delay
+
+    def on_error(self) -> float:
+        """Exponential backoff after a network error or 5xx; returns the pause in seconds"""
+        with self._cond:
+            self.stats.errors += 1
+            self._consecutive_errors += 1
+            delay = self._backoff()
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    # ------------------------------------------------------------------
+    # HTTP helper
+    # ------------------------------------------------------------------
+
+    def request(self, method: str, url: str, session: Optional[requests.Session] = None,
+                max_attempts: Optional[int] = None, max_network_errors: Optional[int] = MAX_NETWORK_ERRORS,
+                **kwargs) -> requests.Response:
+        """
+        Issue a throttled HTTP request, retrying 429s, 5xx and network errors
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            session: Optional requests.Session to reuse connections
+            max_attempts: Give up after this many attempts (None = no limit).
+                          The last response is returned, or the last network error raised.
+            max_network_errors: Raise after this many consecutive network errors
+                                (None = retry them forever)
+            **kwargs: Passed through to requests
+
+        Returns:
+            The first response that is neither a 429 nor a retryable 5xx
+        """
+        http = session or requests
+        attempt = 0
+        network_errors = 0
+        while True:
+            attempt += 1
+            last_attempt = max_attempts is not None and attempt >= max_attempts
+
+            with self.slot():
+                try:
+                    response = http.request(method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    delay = self.on_error()
+                    network_errors += 1
+                    if last_attempt or (max_network_errors is not None and network_errors >= max_network_errors):
+                        raise
+                    print(f"[{self.name}] Network error: {e} - backing off {delay:.1f}s")
+                    continue
+            network_errors = 0
+
+            if response.status_code == 429:
+                delay = self.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+                if last_attempt:
+                    return response
+                print(f"[{self.name}] Rate limited (429) - waiting {delay:.1f}s, rate now {self.rate:.2f} req/s")
+                continue
+            if response.status_code in RETRY_STATUSES:
+                delay = self.on_error()
+                if last_attempt:
+                    return response
+                print(f"[{self.name}] Server error ({response.status_code}) - retrying in {delay:.1f}s")
+                continue
+
+            self.on_success()
+            return response
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"[{self.name}] {s.requests:,} requests, {s.throttles:,} throttled, {s.errors:,} errors, "
+                f"{s.rows:,} rows ({s.rows_per_second:,.0f} rows/s), "
+                f"p50 {s.latency_percentile(50) * 1000:.0f} ms, p99 {s.latency_percentile(99) * 1000:.0f} ms, "
+                f"rate {self.rate:.2f} req/s, concurrency {int(self.concurrency)}")
+
+
+# Per-API defaults; override with get_controller(name, **kwargs) on first use
+DEFAULT_LIMITS = {
+    'gamma': {'rate': 5.0, 'concurrency': 4, 'max_rate': 20.0},
+    'goldsky': {'rate': 10.0, 'concurrency': 8, 'max_rate': 50.0},
+    'clob': {'rate': 2.0, 'concurrency': 2, 'max_rate': 10.0},
+}
+
+_controllers: Dict[str, RateController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(name: str, **kwargs) -> RateController:
+    """Shared controller for an API, created on first use"""
+    with _controllers_lock:
+        if name not in _controllers:
+            params = {**DEFAULT_LIMITS.get(name, {}), **kwargs}
+            _controllers[name] = RateController(name, **params)
+        return _controllers[name]
+
+
+def reset_controller(name: str) -> None:
+    """Drop a shared controller so the next get_controller() starts fresh (tests, benchmarks)"""
+    with _controllers_lock:
+        _controllers.pop(name, None)
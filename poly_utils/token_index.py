@@ -0,0 +1,258 @@
+"""
+Persistent token id → (market_id, side) index.
+
+CLOB token ids are 76-digit decimal strings (uint256). Joining trades against
+a melted (market_id, side, token) table means hashing those strings for every
+batch. The index stores each token as its four 64-bit words, sorted by the
+low word (token ids are hash-derived, so it is uniformly spread), next to its
+market id and side:
+
+    key (uint64) | hi1, hi2, hi3 (uint64) | market_id (int64) | side (uint8: 1 = token1, 2 = token2)
+
+Lookups are a binary search over the key array; a hit only counts if the
+high words match too, so a token that is not indexed never borrows the
+market of one that shares its low word. Indexed tokens whose keys collide
+with each other are kept in a small exact overflow table.
+
+The index is saved under .cache/ next to markets.csv and is synced
+incrementally: only tokens not yet indexed are added when markets.csv or
+missing_markets.csv change.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from .utils import MARKETS_CACHE_DIR, _source_key, get_markets
+
+KEY_MASK = (1 << 64) - 1
+SIDES = {1: 'token1', 2: 'token2'}
+
+WORDS = ['key', 'hi1', 'hi2', 'hi3']
+INDEX_SCHEMA = {**{w: pl.UInt64 for w in WORDS}, 'market_id': pl.Int64, 'side': pl.UInt8}
+OVERFLOW_SCHEMA = {'token': pl.Utf8, 'market_id': pl.Int64, 'side': pl.UInt8}
+
+
+def token_words(token: str) -> Optional[Tuple[int, int, int, int]]:
+    """64-bit words of a decimal uint256 token id, low word first, or None if it is not one"""
+    try:
+        value = int(token)
+    except (TypeError, ValueError):
+        return None
+    if value < 0 or value >> 256:
+        return None
+    return value & KEY_MASK, (value >> 64) & KEY_MASK, (value >> 128) & KEY_MASK, value >> 192
+
+
+def token_key(token: str) -> Optional[int]:
+    """Low 64 bits of a decimal token id, or None if it is not one"""
+    words = token_words(token)
+    return words[0] if words else None
+
+
+def _words_token(words: Tuple[int, int, int, int]) -> str:
+    return str(sum(w << (64 * i) for i, w in enumerate(words)))
+
+
+def _melt_tokens(markets: pl.DataFrame, skip: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+    """
+    (market_id, side, token, key...) for every non-empty token of a markets table
+
+    Args:
+        markets: Markets table
+        skip: (market_id, side) pairs to leave out before any token is parsed
+    """
+    markets = markets.select(
+        pl.col('id').cast(pl.Int64, strict=False).alias('market_id'),
+        pl.col('token1').cast(pl.Utf8),
+        pl.col('token2').cast(pl.Utf8),
+    ).filter(pl.col('market_id').is_not_null())
+    tokens = pl.concat([
+        markets.select('market_id', pl.lit(1, dtype=pl.UInt8).alias('side'), pl.col('token1').alias('token')),
+        markets.select('market_id', pl.lit(2, dtype=pl.UInt8).alias('side'), pl.col('token2').alias('token')),
+    ]).filter(pl.col('token').is_not_null() & (pl.col('token') != ''))
+    if skip is not None:
+        tokens = tokens.join(skip, on=['market_id', 'side'], how='anti')
+    words = [token_words(t) or (None,) * len(WORDS) for t in tokens['token'].to_list()]
+    columns = [pl.Series(name, column, dtype=pl.UInt64) for name, column in zip(WORDS, zip(*words))] if words \
+        else [pl.Series(name, [], dtype=pl.UInt64) for name in WORDS]
+    # Canonical decimal form, so '0123' and '123' are one token
+    canonical = pl.Series('token', [_words_token(w) if w[0] is not None else None for w in words], dtype=pl.Utf8)
+    return tokens.with_columns(*columns, canonical).filter(pl.col('key').is_not_null())
+
+
+class TokenIndex:
+    """Sorted uint64 token keys with parallel market id and side arrays"""
+
+    def __init__(self, root: Optional[str] = None, name: str = 'token_index'):
+        root = root or MARKETS_CACHE_DIR
+        self.path = os.path.join(root, f"{name}.parquet")
+        self.overflow_path = os.path.join(root, f"{name}.overflow.parquet")
+        self.meta_path = os.path.join(root, f"{name}.json")
+        self.meta: Dict = {'sources': [], 'markets': 0, 'tokens': 0, 'collisions': 0}
+        self._set(pl.DataFrame(schema=INDEX_SCHEMA), pl.DataFrame(schema=OVERFLOW_SCHEMA))
+
+        if os.path.exists(self.meta_path) and os.path.exists(self.path):
+            try:
+                with open(self.meta_path, 'r') as f:
+                    self.meta = json.load(f)
+                overflow = (pl.read_parquet(self.overflow_path) if os.path.exists(self.overflow_path)
+                            else pl.DataFrame(schema=OVERFLOW_SCHEMA))
+                table = pl.read_parquet(self.path)
+                if table.schema != pl.Schema(INDEX_SCHEMA):
+                    raise ValueError("index written by an older version")
+                self._set(table, overflow)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable token index: {e}")
+                self.meta = {'sources': [], 'markets': 0, 'tokens': 0, 'collisions': 0}
+
+    def _set(self, table: pl.DataFrame, overflow: pl.DataFrame) -> None:
+        self.table = table.sort('key')
+        self.overflow = overflow
+        self._keys = self.table['key'].to_numpy()
+        self._high = self.table.select(WORDS[1:]).to_numpy()
+        self._market_ids = self.table['market_id'].to_numpy()
+        self._sides = self.table['side'].to_numpy()
+        self._exact = {t: (m, s) for t, m, s in overflow.iter_rows()}
+        self._collided = {token_key(t) for t in self._exact}
+
+    def __len__(self) -> int:
+        return len(self.table) + len(self.overflow)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def add_markets(self, markets: pl.DataFrame) -> int:
+        """
+        Index token1/token2 of every market that are not indexed yet
+
+        Args:
+            markets: Markets table (get_markets()); tokens already indexed keep
+                the market they were first indexed with, and a market side that
+                is already indexed is skipped without parsing its token
+
+        Returns:
+            Number of tokens added
+        """
+        if len(markets) == 0:
+            return 0
+        # Only the market sides not indexed yet are parsed, so a sync costs
+        # O(new markets) in Python rather than O(all tokens)
+        indexed = pl.concat([self.table.select('market_id', 'side'), self.overflow.select('market_id', 'side')])
+        new = (
+            _melt_tokens(markets, skip=indexed.unique())
+            # A token maps to the first market that lists it; an indexed listing wins
+            .unique(subset=WORDS, keep='first', maintain_order=True)
+            .join(self.table.select(WORDS), on=WORDS, how='anti')
+            .join(self.overflow.select('token'), on='token', how='anti')
+        )
+        if len(new) == 0:
+            return 0
+
+        # Indexed tokens sharing a key with a new one, with their token strings
+        clashing = self.table.join(new.select('key').unique(), on='key', how='semi')
+        clashing = clashing.with_columns(
+            pl.Series('token', [_words_token(w) for w in clashing.select(WORDS).iter_rows()], dtype=pl.Utf8)
+        )
+        candidates = pl.concat([clashing.select(new.columns), new])
+        collided = candidates.filter(
+            pl.col('key').is_duplicated() | pl.col('key').is_in(list(self._collided))
+        )
+
+        table = pl.concat([
+            self.table.join(collided.select('key'), on='key', how='anti'),
+            new.join(collided.select('token'), on='token', how='anti').select(list(INDEX_SCHEMA)),
+        ])
+        overflow = pl.concat([self.overflow, collided.select(list(OVERFLOW_SCHEMA))]).unique(
+            subset=['token'], keep='first', maintain_order=True
+        )
+        self._set(table, overflow)
+        markets = pl.concat([self.table['market_id'], self.overflow['market_id']]).n_unique()
+        self.meta.update(markets=markets, tokens=len(self), collisions=len(self.overflow))
+        return len(new)
+
+    def save(self, sources: Iterable = ()) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        for frame, path in ((self.table, self.path), (self.overflow, self.overflow_path)):
+            frame.write_parquet(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        self.meta['sources'] = [list(s) for s in sources]
+        with open(f"{self.meta_path}.tmp", 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def lookup(self, token: str) -> Optional[Tuple[int, str]]:
+        """(market_id, 'token1' | 'token2') for one token id, or None"""
+        market_ids, sides = self.lookup_many([token])
+        if sides[0] == 0:
+            return None
+        return int(market_ids[0]), SIDES[int(sides[0])]
+
+    def lookup_many(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized lookup; side 0 marks tokens that are not indexed"""
+        market_ids = np.zeros(len(tokens), dtype=np.int64)
+        sides = np.zeros(len(tokens), dtype=np.uint8)
+        words = [token_words(t) for t in tokens]
+        valid = np.array([w is not None for w in words], dtype=bool)
+        probe = np.array([w or (0, 0, 0, 0) for w in words], dtype=np.uint64).reshape(-1, len(WORDS))
+
+        if len(self._keys):
+            idx = np.minimum(np.searchsorted(self._keys, probe[:, 0]), len(self._keys) - 1)
+            found = valid & (self._keys[idx] == probe[:, 0]) & (self._high[idx] == probe[:, 1:]).all(axis=1)
+            market_ids[found] = self._market_ids[idx[found]]
+            sides[found] = self._sides[idx[found]]
+
+        if self._collided:
+            for i, (token, w) in enumerate(zip(tokens, words)):
+                if w is not None and w[0] in self._collided:
+                    market_id, side = self._exact.get(_words_token(w), (0, 0))
+                    market_ids[i], sides[i] = market_id, side
+        return market_ids, sides
+
+    def probe_frame(self, asset_ids: pl.Series) -> pl.DataFrame:
+        """
+        Small (asset_id, market_id, side) table for the distinct asset ids of a batch
+
+        Join trades against this instead of the full melted markets table.
+        """
+        tokens = asset_ids.drop_nulls().unique().to_list()
+        market_ids, sides = self.lookup_many(tokens)
+        hit = sides > 0
+        return pl.DataFrame({
+            'asset_id': pl.Series([t for t, h in zip(tokens, hit) if h], dtype=pl.Utf8),
+            'market_id': pl.Series(market_ids[hit], dtype=pl.Int64),
+            'side': pl.Series([SIDES[int(s)] for s in sides[hit]], dtype=pl.Utf8),
+        })
+
+
+_index_memo: Dict[Tuple[str, str], TokenIndex] = {}
+
+
+def get_token_index(main_file: str = "markets.csv", missing_file: str = "missing_markets.csv") -> TokenIndex:
+    """
+    Token index synced with the current markets files
+
+    Loaded from .cache/ when its recorded source state matches; otherwise only
+    the markets that are not yet indexed are added and the index is re-saved.
+    """
+    memo_key = (os.path.abspath(main_file), os.path.abspath(missing_file))
+    sources = _source_key([main_file, missing_file])
+    index = _index_memo.get(memo_key)
+    if index is None:
+        root = os.path.join(os.path.dirname(os.path.abspath(main_file)), MARKETS_CACHE_DIR)
+        index = TokenIndex(root)
+        _index_memo[memo_key] = index
+
+    if tuple(tuple(s) for s in index.meta.get('sources', [])) != sources:
+        added = index.add_markets(get_markets(main_file, missing_file))
+        index.save(sources)
+        if added:
+            print(f"Token index: +{added:,} tokens ({len(index):,} total, {len(index.overflow)} collisions)")
+    return index
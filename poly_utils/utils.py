@@ -1,21 +1,51 @@
 import os
 import csv
 import json
-import requests
-import time
-from typing import List
+import hashlib
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
 import polars as pl
 
+from .file_io import write_json_atomic
+from .gamma_decode import MARKETS_CSV_COLUMNS, csv_rows, decode_markets, loads
+from .rate_control import get_controller
+
 PLATFORM_WALLETS = ['0xc5d563a36ae78145c45a50134d48a1215220f80a', '0x4bfb41d5b3570defd03c39a9a4d8de6bd8b8982e']
 
 
-def get_markets(main_file: str = "markets.csv", missing_file: str = "missing_markets.csv"):
-    """
-    Load and combine markets from both files, deduplicate, and sort by createdAt
-    Returns combined Polars DataFrame sorted by creation date
-    """
-    import polars as pl
-    
+# Combined markets keyed by their source files; see get_markets()
+_markets_memo: Dict[Tuple[str, str, bool], Tuple[Tuple, pl.DataFrame]] = {}
+
+MARKETS_CACHE_DIR = '.cache'
+
+# Polars 2 dropped these read_ipc options and maps local IPC files itself
+_IPC_MAP_OPTIONS = (
+    {'memory_map': True, 'rechunk': False}
+    if 'memory_map' in inspect.signature(pl.read_ipc).parameters else {}
+)
+
+
+def _source_key(paths: List[str]) -> Tuple:
+    """(path, mtime_ns, size) for each existing source; any append or rewrite changes it"""
+    key = []
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            key.append((os.path.abspath(path), st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def _snapshot_paths(main_file: str, missing_file: str) -> Tuple[str, str]:
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(main_file)), MARKETS_CACHE_DIR)
+    name = hashlib.sha1(f"{os.path.abspath(main_file)}|{os.path.abspath(missing_file)}".encode()).hexdigest()[:12]
+    base = os.path.join(cache_dir, f"markets-{name}")
+    return f"{base}.parquet", f"{base}.json"
+
+
+def _load_markets(main_file: str, missing_file: str) -> pl.DataFrame:
     # Schema overrides for long token IDs
     schema_overrides = {
         "token1": pl.Utf8,      # 76-digit ids → strings
@@ -26,13 +56,13 @@ def get_markets(main_file: str = "markets.csv", missing_file: str = "missing_mar
     
     # Load main markets file
     if os.path.exists(main_file):
-        main_df = pl.scan_csv(main_file, schema_overrides=schema_overrides).collect(streaming=True)
+        main_df = pl.scan_csv(main_file, schema_overrides=schema_overrides).collect(engine='streaming')
         dfs.append(main_df)
         print(f"Loaded {len(main_df)} markets from {main_file}")
     
     # Load missing markets file
     if os.path.exists(missing_file):
-        missing_df = pl.scan_csv(missing_file, schema_overrides=schema_overrides).collect(streaming=True)
+        missing_df = pl.scan_csv(missing_file, schema_overrides=schema_overrides).collect(engine='streaming')
         dfs.append(missing_df)
         print(f"Loaded {len(missing_df)} markets from {missing_file}")
     
@@ -51,163 +81,309 @@ def get_markets(main_file: str = "markets.csv", missing_file: str = "missing_mar
     return combined_df
 
 
-def update_missing_tokens(missing_token_ids: List[str], csv_filename: str = "missing_markets.csv"):
+# Set to 1 to make get_markets() default to the shared memory-mapped copy
+SHARED_MARKETS_ENV = 'POLY_SHARED_MARKETS'
+
+
+def _shared_paths(main_file: str, missing_file: str) -> Tuple[str, str]:
+    """(path prefix of the versioned Arrow files, pointer file) for a pair of sources"""
+    snapshot_file, _ = _snapshot_paths(main_file, missing_file)
+    base = snapshot_file[:-len('.parquet')]
+    return base, f"{base}.current.json"
+
+
+def read_markets_pointer(main_file: str = "markets.csv", missing_file: str = "missing_markets.csv") -> Dict:
+    """The published shared-catalog pointer ({} if nothing is published)"""
+    _, pointer_file = _shared_paths(main_file, missing_file)
+    try:
+        with open(pointer_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def publish_markets(main_file: str = "markets.csv", missing_file: str = "missing_markets.csv",
+                    df: pl.DataFrame = None) -> Dict:
+    """
+    Publish the combined markets as an uncompressed Arrow IPC file for memory-mapping
+
+    Each version is a separate, never-modified file named after the source
+    state; a small pointer file names the current one and is swapped
+    atomically, so readers either see the old version or the new one. The
+    previous version is kept for readers that have not re-read the pointer.
+
+    Args:
+        main_file: Markets CSV written by update_markets
+        missing_file: Markets CSV written by update_missing_tokens
+        df: The combined markets, if already loaded for this source state
+
+    Returns:
+        The new pointer (version, file, sources, rows, published_at)
+    """
+    key = _source_key([main_file, missing_file])
+    base, pointer_file = _shared_paths(main_file, missing_file)
+    version = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+    arrow_file = f"{base}-{version}.arrow"
+
+    current = read_markets_pointer(main_file, missing_file)
+    if current.get('version') == version and os.path.exists(arrow_file):
+        return current
+
+    if not os.path.exists(arrow_file):
+        if df is None:
+            df = _load_markets(main_file, missing_file)
+        os.makedirs(os.path.dirname(arrow_file), exist_ok=True)
+        tmp_file = f"{arrow_file}.{os.getpid()}.tmp"
+        # Uncompressed, so readers can map the buffers instead of decoding them
+        df.write_ipc(tmp_file, compression='uncompressed')
+        os.replace(tmp_file, arrow_file)
+
+    pointer = {
+        'version': version,
+        'file': os.path.basename(arrow_file),
+        'previous': current.get('file') if current.get('file') != os.path.basename(arrow_file) else current.get('previous'),
+        'sources': key,
+        'rows': len(df) if df is not None else pl.scan_ipc(arrow_file).select(pl.len()).collect().item(),
+        'published_at': datetime.now(timezone.utc).isoformat(),
+    }
+    write_json_atomic(pointer_file, pointer)
+
+    # Drop versions older than the previous one; processes still mapping them keep
+    # their pages (the inode lives until the last mapping closes)
+    prefix = os.path.basename(base) + '-'
+    keep = {pointer['file'], pointer['previous']}
+    for name in os.listdir(os.path.dirname(arrow_file)):
+        if name.startswith(prefix) and name.endswith('.arrow') and name not in keep:
+            try:
+                os.remove(os.path.join(os.path.dirname(arrow_file), name))
+            except OSError:
+                pass
+
+    print(f"Published {pointer['rows']} markets as version {version}")
+    return pointer
+
+
+def _map_shared(main_file: str, missing_file: str, key: Tuple) -> pl.DataFrame:
+    """Memory-map the published version for `key`, publishing it first if it is missing or stale"""
+    pointer = read_markets_pointer(main_file, missing_file)
+    if tuple(tuple(entry) for entry in pointer.get('sources', [])) != key:
+        pointer = publish_markets(main_file, missing_file)
+    base, _ = _shared_paths(main_file, missing_file)
+    arrow_file = os.path.join(os.path.dirname(base), pointer['file'])
+    df = pl.read_ipc(arrow_file, **_IPC_MAP_OPTIONS)
+    print(f"Mapped {len(df)} markets from shared version {pointer['version']}")
+    return df
+
+
+def get_markets(main_file: str = "markets.csv", missing_file: str = "missing_markets.csv", use_cache: bool = True,
+                shared: bool = None):
+    """
+    Load and combine markets from both files, deduplicate, and sort by createdAt
+    Returns combined Polars DataFrame sorted by creation date
+
+    Results are cached per source-file state (path, mtime, size): repeat calls
+    in one process reuse the memoized frame, and a fresh process reads a
+    Parquet snapshot under .cache/ instead of re-parsing the CSVs. Either layer
+    is rebuilt as soon as one of the files changes. Every caller gets its own
+    clone of the memoized frame (the column buffers are shared, so this is
+    cheap), and in-place edits by one caller don't reach the others.
+
+    With `shared`, the frame is instead memory-mapped read-only from a
+    published Arrow IPC file (see publish_markets), so any number of processes
+    share one copy in the page cache.
+
+    Args:
+        main_file: Markets CSV written by update_markets
+        missing_file: Markets CSV written by update_missing_tokens
+        use_cache: Set to False to always re-read the CSVs
+        shared: Memory-map the shared copy (defaults to the POLY_SHARED_MARKETS env var)
+    """
+    if not use_cache:
+        return _load_markets(main_file, missing_file)
+    if shared is None:
+        shared = os.environ.get(SHARED_MARKETS_ENV, '') not in ('', '0')
+
+    key = _source_key([main_file, missing_file])
+    memo_key = (os.path.abspath(main_file), os.path.abspath(missing_file), shared)
+    cached = _markets_memo.get(memo_key)
+    if cached is not None and cached[0] == key:
+        return cached[1].clone()
+
+    if shared and key:
+        df = _map_shared(main_file, missing_file, key)
+        _markets_memo[memo_key] = (key, df)
+        return df.clone()
+
+    snapshot_file, key_file = _snapshot_paths(main_file, missing_file)
+    df = None
+    if key and os.path.exists(snapshot_file) and os.path.exists(key_file):
+        try:
+            with open(key_file, 'r') as f:
+                snapshot_key = tuple(tuple(entry) for entry in json.load(f)['sources'])
+            if snapshot_key == key:
+                df = pl.read_parquet(snapshot_file)
+                print(f"Loaded {len(df)} markets from snapshot {snapshot_file}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable markets snapshot: {e}")
+
+    if df is None:
+        df = _load_markets(main_file, missing_file)
+        if key:
+            try:
+                os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+                df.write_parquet(f"{snapshot_file}.tmp")
+                os.replace(f"{snapshot_file}.tmp", snapshot_file)
+                with open(f"{key_file}.tmp", 'w') as f:
+                    json.dump({'sources': key}, f)
+                os.replace(f"{key_file}.tmp", key_file)
+            except OSError as e:
+                print(f"Could not write markets snapshot: {e}")
+
+    _markets_memo[memo_key] = (key, df)
+    return df.clone()
+
+
+# Tokens per Gamma `clob_token_ids` request; each token belongs to one market
+TOKEN_BATCH = 50
+GAMMA_MARKETS_URL = 'https://gamma-api.polymarket.com/markets'
+
+# Market ids already written to each markets CSV, loaded once per process
+_known_ids: Dict[str, Set[str]] = {}
+_known_lock = threading.Lock()
+
+
+def known_market_ids(csv_filename: str = "missing_markets.csv") -> Set[str]:
+    """
+    Process-wide set of market ids stored in a markets CSV
+
+    The id column is read on first use; writers add to the returned set as
+    they append, so later calls never re-read the file.
+    """
+    path = os.path.abspath(csv_filename)
+    with _known_lock:
+        if path not in _known_ids:
+            ids: Set[str] = set()
+            if os.path.exists(path):
+                try:
+                    ids = set(pl.read_csv(path, columns=['id'], schema_overrides={'id': pl.Utf8})['id'].drop_nulls())
+                except Exception as e:
+                    print(f"Error reading existing file: {e}")
+            _known_ids[path] = ids
+        return _known_ids[path]
+
+
+def _fetch_token_batch(token_ids: List[str], rate, url: str = GAMMA_MARKETS_URL,
+                       max_retries: int = 3) -> Optional[List[Dict]]:
+    """Markets listing any of `token_ids`, or None after `max_retries` failed attempts"""
+    try:
+        # 429s, 5xx and network errors are retried inside the controller with adaptive backoff
+        response = rate.request(
+            'GET',
+            url,
+            params={'clob_token_ids': token_ids, 'limit': len(token_ids)},
+            timeout=30,
+            max_attempts=max_retries,
+        )
+        if response.status_code != 200:
+            print(f"API error {response.status_code} for {len(token_ids)} tokens")
+            return None
+        return loads(response.content)
+    except Exception as e:
+        print(f"Error fetching {len(token_ids)} tokens: {e}")
+        return None
+
+
+def update_missing_tokens(missing_token_ids: List[str], csv_filename: str = "missing_markets.csv",
+                          batch_size: int = TOKEN_BATCH, workers: int = 4, catalog=None, rate=None,
+                          url: str = GAMMA_MARKETS_URL) -> int:
     """
     Fetch market data for missing token IDs and save to separate CSV file
-    
+
+    Tokens are looked up `batch_size` per request with up to `workers`
+    requests in flight, paced by the shared 'gamma' controller.
+
     Args:
         missing_token_ids: List of token IDs to fetch
         csv_filename: CSV file to save missing markets (default: missing_markets.csv)
+        batch_size: Token ids per request
+        workers: Concurrent requests
+        catalog: Optional MarketCatalog; its markets resolve tokens without a
+            request, and fetched markets are upserted into it
+        rate: RateController to use (defaults to the shared 'gamma' one)
+        url: Markets endpoint (e.g. a local stand-in)
+
+    Returns:
+        Number of markets added to csv_filename
     """
-    if not missing_token_ids:
+    token_ids = list(dict.fromkeys(t for t in missing_token_ids if t and t != '0'))
+    if not token_ids:
         print("No missing tokens to fetch")
-        return
-    
-    print(f"Fetching {len(missing_token_ids)} missing tokens...")
-    
-    # Same headers as main markets.csv
-    headers = [
-        'createdAt', 'id', 'question', 'answer1', 'answer2', 'neg_risk', 
-        'market_slug', 'token1', 'token2', 'condition_id', 'volume', 'ticker', 'closedTime'
-    ]
-    
-    # Check if file exists to determine if we need headers
-    file_exists = os.path.exists(csv_filename)
-    
+        return 0
+
+    print(f"Fetching {len(token_ids)} missing tokens...")
+    known = known_market_ids(csv_filename)
     new_markets = []
-    processed_market_ids = set()
-    
-    # If file exists, read existing market IDs to avoid duplicates
-    if file_exists:
-        try:
-            with open(csv_filename, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get('id'):
-                        processed_market_ids.add(row['id'])
-            print(f"Found {len(processed_market_ids)} existing markets in {csv_filename}")
-        except Exception as e:
-            print(f"Error reading existing file: {e}")
-    
-    for token_id in missing_token_ids:
-        print(f"Fetching market for token: {token_id}")
-        
-        retry_count = 0
-        max_retries = 3
-        
-        while retry_count < max_retries:
-            try:
-                response = requests.get(
-                    'https://gamma-api.polymarket.com/markets',
-                    params={'clob_token_ids': token_id},
-                    timeout=30
-                )
-                
-                if response.status_code == 429:
-                    print(f"Rate limited - waiting 10 seconds...")
-                    time.sleep(10)
-                    continue
-                elif response.status_code != 200:
-                    print(f"API error {response.status_code} for token {token_id}")
-                    retry_count += 1
-                    time.sleep(2)
-                    continue
-                
-                markets = response.json()
-                
-                if not markets:
-                    print(f"No market found for token {token_id}")
-                    break
-                
-                market = markets[0]
-                market_id = market.get('id', '')
-                
-                # Skip if we already have this market
-                if market_id in processed_market_ids:
-                    print(f"Market {market_id} already exists - skipping")
-                    break
-                
-                # Parse clobTokenIds
-                clob_tokens_str = market.get('clobTokenIds', '[]')
-                if isinstance(clob_tokens_str, str):
-                    clob_tokens = json.loads(clob_tokens_str)
-                else:
-                    clob_tokens = clob_tokens_str
-                
-                if len(clob_tokens) < 2:
-                    print(f"Invalid token data for {token_id}")
-                    break
-                
-                token1, token2 = clob_tokens[0], clob_tokens[1]
-                
-                # Parse outcomes
-                outcomes_str = market.get('outcomes', '[]')
-                if isinstance(outcomes_str, str):
-                    outcomes = json.loads(outcomes_str)
-                else:
-                    outcomes = outcomes_str
-                
-                answer1 = outcomes[0] if len(outcomes) > 0 else 'YES'
-                answer2 = outcomes[1] if len(outcomes) > 1 else 'NO'
-                
-                # Check for negative risk
-                neg_risk = market.get('negRiskAugmented', False) or market.get('negRiskOther', False)
-                
-                # Get ticker from events if available
-                ticker = ''
-                if market.get('events') and len(market.get('events', [])) > 0:
-                    ticker = market['events'][0].get('ticker', '')
-                
-                question_text = market.get('question', '') or market.get('title', '')
-                
-                # Create market row
-                row = [
-                    market.get('createdAt', ''),
-                    market_id,
-                    question_text,
-                    answer1,
-                    answer2,
-                    neg_risk,
-                    market.get('slug', ''),
-                    token1,
-                    token2,
-                    market.get('conditionId', ''),
-                    market.get('volume', ''),
-                    ticker,
-                    market.get('closedTime', '')
-                ]
-                
-                new_markets.append(row)
-                processed_market_ids.add(market_id)
-                print(f"Successfully fetched market {market_id} for token {token_id}")
-                break
-                
-            except Exception as e:
-                print(f"Error fetching token {token_id}: {e}")
-                retry_count += 1
-                time.sleep(2)
-        
-        if retry_count >= max_retries:
-            print(f"Failed to fetch token {token_id} after {max_retries} retries")
-        
-        # Small delay between requests
-        time.sleep(0.5)
-    
+
+    def add(row: List) -> None:
+        market_id = str(row[1])
+        if market_id and market_id not in known:
+            known.add(market_id)
+            new_markets.append(row)
+
+    # Markets the catalog already holds need no request
+    if catalog is not None and catalog.rows:
+        local = catalog.markets_for_tokens(token_ids)
+        for row in csv_rows(local, MARKETS_CSV_COLUMNS):
+            add(row)
+        resolved = set(local['token1']) | set(local['token2'])
+        token_ids = [t for t in token_ids if t not in resolved]
+        if len(local):
+            print(f"Resolved {len(local)} markets from the catalog")
+
+    rate = rate or get_controller('gamma')
+    batches = [token_ids[i:i + batch_size] for i in range(0, len(token_ids), batch_size)]
+    fetched = []
+    found: Set[str] = set()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch, markets in zip(batches, pool.map(lambda b: _fetch_token_batch(b, rate, url), batches)):
+            if markets is None:
+                print(f"Failed to fetch {len(batch)} tokens after retries")
+                failed += len(batch)
+                continue
+            fetched.extend(markets)
+            # Markets found by token always get answers, as this path always wrote them
+            decoded = decode_markets(markets, answers=('YES', 'NO'))
+            complete = decoded.filter((pl.col('token1') != '') & (pl.col('token2') != ''))
+            if len(complete) < len(decoded):
+                print(f"Invalid token data for {len(decoded) - len(complete)} markets")
+            found.update(complete['token1'])
+            found.update(complete['token2'])
+            for row in csv_rows(complete, MARKETS_CSV_COLUMNS):
+                add(row)
+
+    not_found = sum(1 for t in token_ids if t not in found) - failed
+    if not_found > 0:
+        print(f"No market found for {not_found} tokens")
+
+    if catalog is not None and fetched:
+        catalog.upsert_markets(fetched)
+
     if not new_markets:
         print("No new markets to add")
-        return
-    
+        return 0
+
     # Write new markets to file
-    mode = 'a' if file_exists else 'w'
-    with open(csv_filename, mode, newline='', encoding='utf-8') as csvfile:
+    file_exists = os.path.exists(csv_filename)
+    with open(csv_filename, 'a' if file_exists else 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
-        
+
         # Write headers only if new file
         if not file_exists:
-            writer.writerow(headers)
-        
+            writer.writerow(MARKETS_CSV_COLUMNS)
+
         writer.writerows(new_markets)
-    
-    print(f"Added {len(new_markets)} new markets to {csv_filename}")
-    print(f"Total markets now in file: {len(processed_market_ids)}")
 
+    print(f"Added {len(new_markets)} new markets to {csv_filename}")
+    print(f"Total markets now in file: {len(known)}")
+    return len(new_markets)
@@ -0,0 +1,139 @@
+"""
+Unit tests for update_utils.dedup_index module
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import polars as pl
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.dedup_index import DedupIndex, fingerprint, MAX_RUNS, MIN_CAPACITY
+from update_utils.event_store import EventStore, DEDUP_NAME
+
+
+def make_events(ids, start_ts=1704067200):
+    n = len(ids)
+    return pl.DataFrame({
+        'timestamp': [start_ts + i for i in ids],
+        'maker': ['0xm'] * n,
+        'makerAssetId': ['0'] * n,
+        'makerAmountFilled': [1_000_000] * n,
+        'taker': ['0xt'] * n,
+        'takerAssetId': ['1'] * n,
+        'takerAmountFilled': [500_000] * n,
+        'transactionHash': [f"0xtx{i}" for i in ids],
+        'id': [f"0xtx{i}_0xorder" for i in ids],
+    })
+
+
+class TestDedupIndex(unittest.TestCase):
+    """Test cases for the persistent event id index"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, '_dedup')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fingerprint_is_stable(self):
+        """Fingerprints must not change between processes"""
+        self.assertEqual(fingerprint(['a'])[0], fingerprint(['a'])[0])
+        self.assertNotEqual(fingerprint(['a'])[0], fingerprint(['b'])[0])
+
+    def test_filter_new_drops_seen_and_repeated_ids(self):
+        index = DedupIndex(self.root, capacity=1000)
+        first = index.filter_new(make_events([1, 2, 2, 3]))
+        self.assertEqual(first['id'].to_list(), ['0xtx1_0xorder', '0xtx2_0xorder', '0xtx3_0xorder'])
+
+        second = index.filter_new(make_events([3, 4]))
+        self.assertEqual(second['id'].to_list(), ['0xtx4_0xorder'])
+        self.assertEqual(index.count, 4)
+
+    def test_null_ids_pass_through(self):
+        index = DedupIndex(self.root, capacity=1000)
+        df = make_events([1, 2]).with_columns(pl.lit(None, dtype=pl.Utf8).alias('id'))
+        self.assertEqual(len(index.filter_new(df)), 2)
+        self.assertEqual(index.count, 0)
+
+    def test_survives_restart(self):
+        index = DedupIndex(self.root, capacity=1000)
+        index.filter_new(make_events(range(100)))
+        index.flush(checkpoint={'row_count': 100})
+
+        reopened = DedupIndex(self.root)
+        self.assertEqual(reopened.checkpoint, {'row_count': 100})
+        self.assertEqual(len(reopened.filter_new(make_events(range(50, 150)))), 50)
+
+    def test_runs_are_compacted(self):
+        index = DedupIndex(self.root, capacity=1000)
+        for batch in range(MAX_RUNS + 1):
+            index.filter_new(make_events(range(batch * 10, batch * 10 + 10)))
+            index.flush()
+        self.assertEqual(len(index.meta['runs']), 1)
+        self.assertEqual(len(DedupIndex(self.root).filter_new(make_events(range(95)))), 5)
+
+    def test_bloom_grows_past_capacity(self):
+        index = DedupIndex(self.root, capacity=10)
+        index.filter_new(make_events(range(100)))
+        self.assertGreaterEqual(index.bloom.capacity, 100)
+        self.assertEqual(len(index.filter_new(make_events(range(100)))), 0)
+
+    def test_bloom_is_sized_from_the_ids(self):
+        """Rebuilds size the filter from the row count; oversized filters shrink on open"""
+        index = DedupIndex(self.root)
+        index.rebuild([make_events(range(50))['id']], expected=300_000)
+        self.assertEqual(index.bloom.capacity, 600_000)
+        index.rebuild([make_events(range(50))['id']], expected=50)
+        self.assertEqual(index.bloom.capacity, MIN_CAPACITY)
+
+        index = DedupIndex(self.root, capacity=10_000_000)
+        index.filter_new(make_events(range(50)))
+        index.flush()
+        reopened = DedupIndex(self.root)
+        self.assertEqual(reopened.bloom.capacity, MIN_CAPACITY)
+        self.assertEqual(DedupIndex(self.root).meta['capacity'], MIN_CAPACITY)
+        self.assertEqual(len(reopened.filter_new(make_events(range(40, 60)))), 10)
+
+    def test_event_store_rebuilds_missing_index(self):
+        """A store whose index is lost or behind rebuilds it from its segments"""
+        events_root = os.path.join(self.tmp, 'events')
+        with EventStore(root=events_root, dedup=True) as store:
+            store.append(make_events(range(20)))
+        shutil.rmtree(os.path.join(events_root, DEDUP_NAME))
+
+        store = EventStore(root=events_root, dedup=True)
+        self.assertEqual(store.dedup.count, 20)
+        self.assertEqual(len(store.append(make_events(range(15, 25)))), 5)
+
+
+    def test_fingerprint_collisions_keep_both_events(self):
+        """A fingerprint hit only drops a row once its full id is found in the store"""
+        collide = lambda ids: np.zeros(len(list(ids)), dtype=np.uint64)
+        with mock.patch('update_utils.dedup_index.fingerprint', collide):
+            with EventStore(root=os.path.join(self.tmp, 'events'), dedup=True) as store:
+                self.assertEqual(len(store.append(make_events([1]))), 1)
+                # Buffered, then committed: both checks go to the full ids
+                self.assertEqual(len(store.append(make_events([2]))), 1)
+                store.flush()
+                self.assertEqual(store.append(make_events([1, 2, 3]))['id'].to_list(), ['0xtx3_0xorder'])
+            self.assertEqual(store.scan().collect()['id'].to_list(),
+                             ['0xtx1_0xorder', '0xtx2_0xorder', '0xtx3_0xorder'])
+
+        # Without the exact check a collision counts as a repeat
+        index = DedupIndex(self.root, capacity=1000)
+        with mock.patch('update_utils.dedup_index.fingerprint', collide):
+            self.assertEqual(len(index.filter_new(make_events([1, 2]))), 2)
+            self.assertEqual(len(index.filter_new(make_events([3]))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
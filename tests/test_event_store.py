@@ -0,0 +1,109 @@
+"""
+Unit tests for update_utils.event_store module
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import polars as pl
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.event_store import EventStore, EVENT_SCHEMA
+
+DAY = 86400
+BASE = 1704067200  # 2024-01-01 00:00:00 UTC
+
+
+def make_events(timestamps, prefix='e'):
+    n = len(timestamps)
+    return pl.DataFrame({
+        'timestamp': list(timestamps),
+        'maker': ['0xm'] * n,
+        'makerAssetId': ['0'] * n,
+        'makerAmountFilled': [1_000_000] * n,
+        'taker': ['0xt'] * n,
+        'takerAssetId': ['1'] * n,
+        'takerAmountFilled': [500_000] * n,
+        'transactionHash': [f"0x{prefix}{i}" for i in range(n)],
+        'id': [f"{prefix}{i:04d}" for i in range(n)],
+    })
+
+
+class TestEventStore(unittest.TestCase):
+    """Test cases for partitioned writes, the saved cursor and the dedup index"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'events')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_flush_writes_one_segment_per_utc_day(self):
+        # Out of order and straddling two midnights
+        timestamps = [BASE + DAY + 5, BASE - 1, BASE, BASE + DAY - 1, BASE + DAY]
+        with EventStore(root=self.root) as store:
+            store.append(make_events(timestamps))
+
+        store = EventStore(root=self.root)
+        self.assertEqual([seg['partition'] for seg in store.segments],
+                         ['date=2023-12-31', 'date=2024-01-01', 'date=2024-01-02'])
+        self.assertEqual([seg['rows'] for seg in store.segments], [1, 2, 2])
+        self.assertEqual(store.rows, 5)
+        self.assertEqual(store.latest_timestamp(), BASE + DAY + 5)
+
+        df = store.scan().collect()
+        self.assertEqual(df.schema, pl.Schema(EVENT_SCHEMA))
+        self.assertEqual(df['timestamp'].to_list(), sorted(timestamps))
+        self.assertEqual(store.scan(BASE, BASE + DAY).collect()['timestamp'].to_list(), [BASE, BASE + DAY - 1])
+
+    def test_cursor_is_saved_with_the_flush(self):
+        store = EventStore(root=self.root, segment_rows=100)
+        store.append(make_events([BASE, BASE + 1]), cursor={'timestamp': BASE + 1, 'id': 'e0001'})
+        self.assertNotIn('cursor', EventStore(root=self.root).manifest)
+
+        store.flush()
+        self.assertEqual(EventStore(root=self.root).manifest['cursor'], {'timestamp': BASE + 1, 'id': 'e0001'})
+
+        # A page with no new events still moves the cursor
+        store.append(make_events([]), cursor={'timestamp': BASE + 9, 'id': None})
+        store.close()
+        reopened = EventStore(root=self.root)
+        self.assertEqual(reopened.manifest['cursor'], {'timestamp': BASE + 9, 'id': None})
+        self.assertEqual(reopened.rows, 2)
+
+    def test_dedup_index_behind_manifest_is_rebuilt(self):
+        with EventStore(root=self.root, dedup=True) as store:
+            store.append(make_events([BASE + i for i in range(3)], prefix='a'))
+        # Segments committed without the index (as after a crash between the two)
+        with EventStore(root=self.root) as store:
+            store.append(make_events([BASE + 10 + i for i in range(4)], prefix='b'))
+
+        store = EventStore(root=self.root, dedup=True)
+        self.assertEqual(store.dedup.checkpoint, {'rows': 7})
+        self.assertEqual(store.dedup.count, 7)
+        # Re-fetched events carry the timestamps they were stored with
+        added = store.append(make_events([BASE + 10 + i for i in range(6)], prefix='b'))
+        self.assertEqual(added['id'].to_list(), ['b0004', 'b0005'])
+
+    def test_compact_keeps_scan_order(self):
+        store = EventStore(root=self.root, segment_rows=100)
+        for i in range(4):
+            store.append(make_events([BASE + 10 * i, BASE + 10 * i + 1], prefix=f"p{i}_"))
+            store.flush()
+        before = store.scan().collect()
+
+        self.assertEqual(store.compact(), 3)
+        reopened = EventStore(root=self.root)
+        self.assertEqual(len(reopened.segments), 1)
+        self.assertTrue(reopened.scan().collect().equals(before))
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'date=2024-01-01'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
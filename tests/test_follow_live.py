@@ -0,0 +1,111 @@
+"""
+Unit tests for update_utils.follow_live with a stubbed Goldsky pager
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from poly_utils.token_index import _index_memo
+from poly_utils.utils import _markets_memo
+from update_utils import follow_live
+from update_utils.event_store import EventStore
+from update_utils.goldsky_pager import KeysetCursor
+from update_utils.trade_store import TradeStore
+
+BASE = 1704067200
+TOKEN1 = '1' * 76
+TOKEN2 = '2' * 76
+MARKETS = ("createdAt,id,question,answer1,answer2,neg_risk,market_slug,token1,token2,condition_id,volume,ticker,closedTime\n"
+           f"2024-01-01T00:00:00Z,1,Q?,Yes,No,False,q,{TOKEN1},{TOKEN2},0xc,1.0,T,\n")
+
+
+def event(i):
+    return {
+        'timestamp': str(BASE + i), 'id': f"e{i:04d}", 'transactionHash': f"0xh{i}",
+        'maker': '0xm', 'makerAssetId': '0', 'makerAmountFilled': '1000000',
+        'taker': '0xt', 'takerAssetId': TOKEN1 if i % 2 else TOKEN2, 'takerAmountFilled': '2000000',
+    }
+
+
+class StubSubgraph:
+    """Serves `per_poll` new events on every pager call, after the cursor it is given"""
+
+    def __init__(self, per_poll):
+        self.per_poll = per_poll
+        self.events = []
+        self.cursors = []
+
+    def pages(self, client, cursor, page_size, stats=None):
+        self.cursors.append(cursor)
+        self.events.extend(event(len(self.events)) for _ in range(self.per_poll))
+        after = [e for e in self.events if int(e['timestamp']) > cursor.timestamp]
+        for i in range(0, len(after), page_size):
+            page = after[i:i + page_size]
+            yield page, KeysetCursor(int(page[-1]['timestamp']))
+
+
+class TestFollow(unittest.TestCase):
+    """Test cases for resume, cursor persistence and commit batching"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        with open('markets.csv', 'w') as f:
+            f.write(MARKETS)
+        _index_memo.clear()
+        _markets_memo.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+        _index_memo.clear()
+        _markets_memo.clear()
+
+    def follow(self, subgraph, **kwargs):
+        with mock.patch.object(follow_live, 'iter_pages', subgraph.pages), \
+                mock.patch.object(follow_live, 'GoldskyClient', mock.MagicMock()):
+            follow_live.follow(output_format='parquet', trades_format='parquet', min_interval=0,
+                               max_interval=0, markets_every=0, at_once=10, **kwargs)
+
+    def test_resume_from_saved_cursor(self):
+        subgraph = StubSubgraph(per_poll=25)
+        self.follow(subgraph, max_polls=1, commit_every=0)
+        self.assertEqual(EventStore().manifest['cursor'], {'timestamp': BASE + 24, 'id': None})
+        self.assertEqual(TradeStore().rows, 25)
+
+        # A restart resumes after the saved cursor; nothing is fetched or written twice
+        self.follow(subgraph, max_polls=2, commit_every=0)
+        self.assertEqual(subgraph.cursors[1], KeysetCursor(BASE + 24))
+        events = EventStore()
+        self.assertEqual(events.rows, 75)
+        self.assertEqual(events.scan().collect()['id'].n_unique(), 75)
+        trades = TradeStore()
+        self.assertEqual(trades.rows, 75)
+        self.assertEqual(trades.position['raw_rows'], 75)
+        self.assertEqual(trades.scan().collect()['market_id'].null_count(), 0)
+
+    def test_commits_are_batched_and_compacted(self):
+        self.follow(StubSubgraph(per_poll=5), max_polls=4, commit_every=3600, compact_every=0)
+        self.assertEqual(len(EventStore().segments), 1)
+        self.assertEqual(len(TradeStore().segments), 1)
+        self.assertEqual(TradeStore().rows, 20)
+
+        shutil.rmtree('goldsky')
+        shutil.rmtree('processed')
+        self.follow(StubSubgraph(per_poll=5), max_polls=4, commit_every=0, compact_every=1e-9)
+        events = EventStore()
+        self.assertEqual(len(events.segments), 1)
+        self.assertEqual(events.scan().collect()['id'].to_list(), [f"e{i:04d}" for i in range(20)])
+        self.assertEqual(len(TradeStore().segments), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
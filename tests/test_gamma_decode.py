@@ -0,0 +1,68 @@
+"""
+Unit tests for poly_utils.gamma_decode module
+"""
+import json
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from poly_utils.gamma_decode import MARKETS_CSV_COLUMNS, csv_rows, decode_event_markets, decode_markets, iso_to_unix
+
+MARKET = {
+    'id': '12', 'createdAt': '2024-01-01T00:00:00Z', 'question': '', 'title': 'Will it rain?',
+    'outcomes': '["Yes", "No"]', 'clobTokenIds': '["111", "222"]', 'slug': 'rain',
+    'conditionId': '0xc', 'volume': '10.50', 'negRiskOther': True,
+    'events': [{'ticker': 'RAIN', 'id': '9'}], 'description': 'ignored',
+}
+
+
+class TestDecodeMarkets(unittest.TestCase):
+    """Test cases for page decoding"""
+
+    def test_csv_row(self):
+        rows = csv_rows(decode_markets(json.dumps([MARKET]).encode()), MARKETS_CSV_COLUMNS)
+        self.assertEqual(rows, [[
+            '2024-01-01T00:00:00Z', '12', 'Will it rain?', 'Yes', 'No', True, 'rain',
+            '111', '222', '0xc', '10.50', 'RAIN', '',
+        ]])
+
+    def test_bytes_and_list_agree(self):
+        self.assertTrue(decode_markets([MARKET]).equals(decode_markets(json.dumps([MARKET]))))
+
+    def test_malformed_entries(self):
+        # Numbers, unencoded lists and non-objects take the tolerant path
+        page = [MARKET, {'id': 13, 'volume': 5, 'outcomes': ['A', 'B'], 'clobTokenIds': 'not json'},
+                'junk', {'question': 'no id'}]
+        df = decode_markets(page)
+        self.assertEqual(df['id'].to_list(), ['12', '13'])
+        self.assertEqual(df['answer1'].to_list(), ['Yes', 'A'])
+        self.assertEqual(df['token1'].to_list(), ['111', ''])
+        self.assertEqual(df['volume'].to_list(), ['10.50', '5'])
+
+    def test_missing_outcomes_default(self):
+        market = {**MARKET, 'outcomes': None}
+        self.assertEqual(decode_markets([market]).select('answer1', 'answer2').row(0), ('', ''))
+        decoded = decode_markets([market], answers=('YES', 'NO'))
+        self.assertEqual(decoded.select('answer1', 'answer2').row(0), ('YES', 'NO'))
+
+    def test_event_markets(self):
+        events = [{'id': 'e1', 'slug': 's', 'title': 'T', 'markets': []},
+                  {'id': 'e2', 'slug': 's2', 'title': 'T2', 'endDate': '2024-02-01', 'markets': [MARKET]}]
+        df = decode_event_markets(events)
+        self.assertEqual(df.select('event_index', 'event_id', 'id').rows(), [(1, 'e2', '12')])
+
+
+    def test_iso_to_unix(self):
+        dates = pl.DataFrame({'d': ['2025-01-01', '2025-01-01T12:00:00Z', '2025-01-01T12:00:00.5+02:00',
+                                    '2025-01-01T12:00:00', None, 'soon']})
+        self.assertEqual(dates.select(iso_to_unix('d'))['d'].to_list(),
+                         [1735689600, 1735732800, 1735725600, 1735732800, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the cached poly_utils.get_markets loader
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from poly_utils.utils import get_markets, publish_markets, read_markets_pointer, _markets_memo
+
+HEADER = "createdAt,id,question,answer1,answer2,neg_risk,market_slug,token1,token2,condition_id,volume,ticker,closedTime\n"
+
+
+def market_line(market_id, created):
+    return f"{created},{market_id},Q{market_id}?,Yes,No,False,q{market_id},{market_id}1,{market_id}2,0xc,1.0,T,\n"
+
+
+class TestGetMarketsCache(unittest.TestCase):
+    """Test cases for the memo and snapshot layers"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.main = os.path.join(self.tmp, 'markets.csv')
+        self.missing = os.path.join(self.tmp, 'missing_markets.csv')
+        with open(self.main, 'w') as f:
+            f.write(HEADER + market_line(2, '2024-01-02T00:00:00Z') + market_line(1, '2024-01-01T00:00:00Z'))
+        _markets_memo.clear()
+
+    def tearDown(self):
+        _markets_memo.clear()
+        shutil.rmtree(self.tmp)
+
+    def test_repeat_calls_are_memoized(self):
+        first = get_markets(self.main, self.missing)
+        with mock.patch('poly_utils.utils._load_markets', side_effect=AssertionError('re-read')):
+            second = get_markets(self.main, self.missing)
+        self.assertTrue(second.equals(first))
+        self.assertEqual(first['id'].to_list(), [1, 2])
+
+        # Each caller gets its own frame
+        second.drop_in_place('question')
+        self.assertIn('question', get_markets(self.main, self.missing).columns)
+
+    def test_snapshot_survives_memo_loss(self):
+        first = get_markets(self.main, self.missing)
+        _markets_memo.clear()
+        second = get_markets(self.main, self.missing)
+        self.assertIsNot(second, first)
+        self.assertTrue(second.equals(first))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp, '.cache')))
+
+    def test_changed_source_invalidates(self):
+        get_markets(self.main, self.missing)
+        with open(self.missing, 'w') as f:
+            f.write(HEADER + market_line(3, '2024-01-03T00:00:00Z'))
+        self.assertEqual(get_markets(self.main, self.missing)['id'].to_list(), [1, 2, 3])
+
+
+    def test_shared_copy_is_mapped_and_swapped(self):
+        private = get_markets(self.main, self.missing)
+        shared = get_markets(self.main, self.missing, shared=True)
+        self.assertTrue(shared.equals(private))
+        first = read_markets_pointer(self.main, self.missing)
+        self.assertEqual(first['rows'], 2)
+
+        with open(self.missing, 'w') as f:
+            f.write(HEADER + market_line(3, '2024-01-03T00:00:00Z'))
+        self.assertEqual(get_markets(self.main, self.missing, shared=True)['id'].to_list(), [1, 2, 3])
+        second = read_markets_pointer(self.main, self.missing)
+        self.assertNotEqual(second['version'], first['version'])
+        self.assertEqual(second['previous'], first['file'])
+
+        # Only the current and previous versions are kept
+        with open(self.missing, 'a') as f:
+            f.write(market_line(4, '2024-01-04T00:00:00Z'))
+        third = publish_markets(self.main, self.missing)
+        arrow_files = sorted(n for n in os.listdir(os.path.join(self.tmp, '.cache')) if n.endswith('.arrow'))
+        self.assertEqual(arrow_files, sorted([third['file'], second['file']]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for update_utils.goldsky_backfill
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils import goldsky_backfill, update_goldsky
+from update_utils.event_store import EventStore
+from update_utils.goldsky_backfill import ShardCheckpoint, fetch_shard, merge_shards, split_range
+from update_utils.goldsky_pager import KeysetCursor
+
+
+def event(ts, event_id):
+    return {
+        'timestamp': str(ts), 'id': event_id, 'transactionHash': f"0x{event_id}",
+        'maker': '0xm', 'makerAssetId': '0', 'makerAmountFilled': '1',
+        'taker': '0xt', 'takerAssetId': '7', 'takerAmountFilled': '2',
+    }
+
+
+class StubPager:
+    """Pages over fixed events in (timestamp, id) order; can fail once after `fail_after` pages"""
+
+    def __init__(self, events, fail_after=None):
+        self.events = sorted(events, key=lambda e: (int(e['timestamp']), e['id']))
+        self.fail_after = fail_after
+        self.cursors = []
+
+    def pages(self, client, cursor, page_size, end=None, stats=None):
+        self.cursors.append(cursor)
+        after = [e for e in self.events
+                 if int(e['timestamp']) > cursor.timestamp and (end is None or int(e['timestamp']) < end)]
+        for n, i in enumerate(range(0, len(after), page_size)):
+            if self.fail_after is not None and n == self.fail_after:
+                self.fail_after = None
+                raise ConnectionError('subgraph went away')
+            page = after[i:i + page_size]
+            yield page, KeysetCursor(int(page[-1]['timestamp']))
+
+
+class TestBackfill(unittest.TestCase):
+    """Test cases for range splitting, shard resume and merging"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_split_range(self):
+        self.assertEqual(split_range(0, 10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(split_range(5, 7, 8), [(5, 6), (6, 7)])
+        with self.assertRaises(ValueError):
+            split_range(5, 5, 2)
+
+    def test_shard_resumes_from_checkpoint(self):
+        pager = StubPager([event(100 + i, f"e{i:03d}") for i in range(30)], fail_after=2)
+        with mock.patch.object(goldsky_backfill, 'iter_pages', pager.pages), \
+                mock.patch.object(goldsky_backfill, 'SHARD_SEGMENT_ROWS', 10):
+            with self.assertRaises(ConnectionError):
+                fetch_shard(None, 0, 100, 125, at_once=5)
+            shard_dir = os.path.join(goldsky_backfill.BACKFILL_DIR, 'shard_0000')
+            saved = ShardCheckpoint(shard_dir, 100, 125).data
+            self.assertEqual((saved['rows'], saved['done']), (10, False))
+
+            result = fetch_shard(None, 0, 100, 125, at_once=5)
+        self.assertEqual(pager.cursors[1], KeysetCursor(109))
+        self.assertEqual((result['rows'], result['done']), (25, True))
+        with self.assertRaises(ValueError):
+            ShardCheckpoint(shard_dir, 100, 130)
+
+    def test_merge_advances_cursor_and_skips_known(self):
+        ranges = [(100, 200), (200, 300)]
+        for index, events in enumerate([[event(150, 'a'), event(150, 'b')], [event(250, 'c')]]):
+            with EventStore(root=os.path.join(goldsky_backfill.BACKFILL_DIR, f"shard_{index:04d}", 'events')) as shard:
+                shard.append(goldsky_backfill.decode_events(events))
+
+        root = os.path.join('goldsky', 'events')
+        with EventStore(root=root, dedup=True) as target:
+            target.append(goldsky_backfill.decode_events([event(150, 'b')]), cursor={'timestamp': 99, 'id': None})
+
+        self.assertEqual(merge_shards(ranges, root=root), 2)
+        target = EventStore(root=root)
+        self.assertEqual(target.rows, 3)
+        self.assertEqual(target.manifest['cursor'], {'timestamp': 250, 'id': 'c'})
+
+        # A cursor already past the merged range stays where it is
+        with EventStore(root=root) as target:
+            target.append(goldsky_backfill.decode_events([]), cursor={'timestamp': 400, 'id': None})
+        self.assertEqual(merge_shards(ranges, root=root), 0)
+        self.assertEqual(EventStore(root=root).manifest['cursor'], {'timestamp': 400, 'id': None})
+
+
+    def test_merge_after_a_gap_keeps_the_cursor(self):
+        """A backfill that starts past the store's data leaves the gap to the incremental scraper"""
+        ranges = [(2000, 3000)]
+        with EventStore(root=os.path.join(goldsky_backfill.BACKFILL_DIR, 'shard_0000', 'events')) as shard:
+            shard.append(goldsky_backfill.decode_events([event(2500, 'late')]))
+
+        root = os.path.join('goldsky', 'events')
+        with EventStore(root=root, dedup=True) as target:
+            target.append(goldsky_backfill.decode_events([event(1000, 'early')]))
+
+        self.assertEqual(merge_shards(ranges, root=root), 1)
+        self.assertEqual(EventStore(root=root).manifest['cursor'], {'timestamp': 1000, 'id': None})
+
+        # The next incremental run resumes at the gap, and skips the merged event
+        pager = StubPager([event(1000, 'early'), event(1500, 'gap'), event(2500, 'late')])
+        with mock.patch.object(update_goldsky, 'iter_pages', pager.pages):
+            update_goldsky.scrape(output_format='parquet', at_once=10)
+        self.assertEqual(pager.cursors[0], KeysetCursor(1000))
+        self.assertEqual(EventStore(root=root).scan().collect()['id'].to_list(), ['early', 'gap', 'late'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Unit tests for update_utils.goldsky_decode module
+"""
+import io
+import unittest
+import sys
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.event_store import CSV_COLUMNS
+from update_utils.goldsky_decode import decode_events
+
+TOKEN = '21742633143463906290569050155826241533067272736897614950488156847949938836455'
+
+
+def raw_event(n, timestamp, maker_asset='0', taker_asset=TOKEN):
+    """orderFilledEvent as the subgraph sends it: every value a string"""
+    return {
+        'fee': '0',
+        'id': f"0x{n:064x}_0x{n + 1:064x}",
+        'maker': f"0x{n:040x}",
+        'makerAmountFilled': str(123_456_789 * (n + 1)),
+        'makerAssetId': maker_asset,
+        'orderHash': f"0x{n + 7:064x}",
+        'taker': f"0x{n + 3:040x}",
+        'takerAmountFilled': str(9_007_199_254_740_993 + n),  # past float64's exact range
+        'takerAssetId': taker_asset,
+        'timestamp': str(timestamp),
+        'transactionHash': f"0x{n + 5:064x}",
+    }
+
+
+# One page: out of timestamp order, a repeated event, a token on both sides
+PAGE = [
+    raw_event(2, 1704067300),
+    raw_event(0, 1704067200),
+    raw_event(1, 1704067250, maker_asset=TOKEN, taker_asset='0'),
+    raw_event(0, 1704067200),
+    raw_event(3, 1704067400),
+]
+
+
+def flatten_page(records):
+    """The previous scrape path: flatten each record (a no-op on these flat
+    objects), build a pandas frame, sort, drop duplicates and write the columns"""
+    df = pd.DataFrame([dict(r) for r in records]).reset_index(drop=True)
+    df = df.sort_values('timestamp', ascending=True).reset_index(drop=True)
+    df = df.drop_duplicates()
+    buffer = io.StringIO()
+    df[CSV_COLUMNS].to_csv(buffer, index=None)
+    return buffer.getvalue()
+
+
+class TestDecodeEvents(unittest.TestCase):
+    """Test cases for equivalence with the per-record flatten output"""
+
+    def test_csv_matches_flatten_output(self):
+        decoded = decode_events(PAGE)
+        self.assertEqual(decoded.select(CSV_COLUMNS).write_csv(), flatten_page(PAGE))
+
+    def test_types(self):
+        decoded = decode_events(PAGE)
+        self.assertEqual(decoded.columns, CSV_COLUMNS + ['id'])
+        self.assertEqual(decoded['timestamp'].dtype, pl.Int64)
+        self.assertEqual(decoded['makerAmountFilled'].dtype, pl.Int64)
+        self.assertEqual(decoded['takerAmountFilled'][0], 9_007_199_254_740_993)
+        # uint256 token ids stay exact decimal strings
+        self.assertEqual(decoded['makerAssetId'].dtype, pl.Utf8)
+        self.assertEqual(decoded['takerAssetId'].to_list(), [TOKEN, '0', TOKEN, TOKEN])
+
+    def test_empty_page(self):
+        self.assertEqual(decode_events([]).columns, CSV_COLUMNS + ['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Unit tests for update_utils.goldsky_pager module
+"""
+import asyncio
+import re
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.goldsky_pager import KeysetCursor, PagerStats, iter_pages, pipelined_pages, split_page
+
+
+def make_events(timestamps):
+    """Events with unique ids; several share each timestamp"""
+    return [{'id': f"0x{i:06x}", 'timestamp': str(ts)} for i, ts in enumerate(timestamps)]
+
+
+class FakeSubgraph:
+    """Evaluates the subset of the subgraph filter syntax the pager emits"""
+
+    def __init__(self, events):
+        self.events = events
+        self.requests = 0
+
+    def __call__(self, query):
+        self.requests += 1
+        first = int(re.search(r'first: (\d+)', query).group(1))
+
+        def arg(name):
+            match = re.search(name + r': "([^"]*)"', query)
+            return match.group(1) if match else None
+
+        rows = self.events
+        if 'orderBy: id' in query:
+            ts, id_gt = int(arg('timestamp')), arg('id_gt')
+            rows = sorted((r for r in rows if int(r['timestamp']) == ts and r['id'] > id_gt),
+                          key=lambda r: r['id'])
+        else:
+            gt, lt = int(arg('timestamp_gt')), arg('timestamp_lt')
+            rows = [r for r in rows if int(r['timestamp']) > gt and (lt is None or int(r['timestamp']) < int(lt))]
+            # Ties come back in an arbitrary (here: reversed id) order
+            rows = sorted(rows, key=lambda r: (int(r['timestamp']), [-ord(c) for c in r['id']]))
+        return {'orderFilledEvents': rows[:first]}
+
+
+def collect(fetch, cursor, page_size, end=None):
+    rows = []
+    for page, cursor in iter_pages(fetch, cursor, page_size, end=end):
+        rows.extend(page)
+    return rows, cursor
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test cases for lossless (timestamp, id) pagination"""
+
+    def test_no_rows_lost_when_timestamp_spans_pages(self):
+        """A second with more fills than a page holds is fully fetched"""
+        events = make_events([1] * 3 + [2] * 12 + [3] * 2 + [4] * 7)
+        rows, _ = collect(FakeSubgraph(events), KeysetCursor(0), page_size=5)
+        self.assertEqual(sorted(r['id'] for r in rows), sorted(r['id'] for r in events))
+
+    def test_no_duplicates(self):
+        """No event is emitted twice"""
+        events = make_events([5] * 10 + [6] * 10 + [7])
+        rows, _ = collect(FakeSubgraph(events), KeysetCursor(0), page_size=4)
+        ids = [r['id'] for r in rows]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), len(events))
+
+    def test_end_bound_is_exclusive(self):
+        """Backfill shards stop before `end`"""
+        events = make_events([1, 2, 2, 3, 4])
+        rows, _ = collect(FakeSubgraph(events), KeysetCursor(0), page_size=2, end=3)
+        self.assertEqual(sorted(int(r['timestamp']) for r in rows), [1, 2, 2])
+
+    def test_resume_from_cursor_picks_up_late_events(self):
+        """Events arriving later at the last timestamp are not skipped"""
+        events = make_events([1, 2, 2])
+        subgraph = FakeSubgraph(events)
+        rows, cursor = collect(subgraph, KeysetCursor(0), page_size=10)
+        self.assertEqual(cursor, KeysetCursor(2, max(r['id'] for r in events if r['timestamp'] == '2')))
+
+        late = {'id': '0xffffff', 'timestamp': '2'}
+        newer = {'id': '0x000000a', 'timestamp': '3'}
+        subgraph.events = events + [late, newer]
+        more, _ = collect(subgraph, cursor, page_size=10)
+        self.assertEqual([r['id'] for r in more], ['0xffffff', '0x000000a'])
+
+    def test_full_page_holds_back_last_timestamp(self):
+        """Rows at the last timestamp of a full page are deferred to the drain phase"""
+        records = make_events([1, 1, 2, 2])
+        rows, cursor = split_page(records, KeysetCursor(0), page_size=4)
+        self.assertEqual([r['timestamp'] for r in rows], ['1', '1'])
+        self.assertEqual(cursor, KeysetCursor(2, ''))
+
+    def test_stats_count_rows_and_pages(self):
+        """PagerStats reports rows and pages fetched"""
+        events = make_events([1] * 7)
+        stats = PagerStats()
+        list(iter_pages(FakeSubgraph(events), KeysetCursor(0), 3, stats=stats))
+        self.assertEqual(stats.rows, 3 + 3 + 3 + 1)  # held-back page, then drained by id
+        self.assertGreater(stats.pages, 0)
+
+
+class TestPipelinedPages(unittest.TestCase):
+    """Test cases for the async prefetching pager"""
+
+    def test_matches_sync_pager(self):
+        """Prefetching commits the same rows, in the same order, as iter_pages"""
+        events = make_events([1] * 3 + [2] * 9 + [3] * 4)
+        subgraph = FakeSubgraph(events)
+
+        async def fetch(query):
+            await asyncio.sleep(0)
+            return subgraph(query)
+
+        committed = []
+        cursor = asyncio.run(pipelined_pages(fetch, KeysetCursor(0), lambda rows, c: committed.extend(rows), 4))
+
+        expected, expected_cursor = collect(FakeSubgraph(events), KeysetCursor(0), page_size=4)
+        self.assertEqual([r['id'] for r in committed], [r['id'] for r in expected])
+        self.assertEqual(cursor, expected_cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Unit tests for update_utils.ingest_state module
+"""
+import os
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils import update_goldsky
+from update_utils.goldsky_decode import decode_events
+from update_utils.goldsky_pager import KeysetCursor
+from update_utils.ingest_state import (
+    count_lines, state_path, read_state, write_state, validate_state, read_last_line, read_first_line
+)
+
+
+class TestIngestState(unittest.TestCase):
+    """Test cases for sidecar state files"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'orderFilled.csv')
+        with open(self.data_file, 'w') as f:
+            f.write("timestamp,id\n1,a\n2,b\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_path(self):
+        """State lives next to the data file"""
+        self.assertEqual(state_path('goldsky/orderFilled.csv'), 'goldsky/orderFilled.state.json')
+
+    def test_round_trip_records_byte_offset(self):
+        """write_state stores the current file size as the commit offset"""
+        write_state(self.data_file, cursor={'timestamp': 2, 'id': 'b'}, row_count=2)
+        state = read_state(self.data_file)
+        self.assertEqual(state['byte_offset'], os.path.getsize(self.data_file))
+        self.assertEqual(state['cursor'], {'timestamp': 2, 'id': 'b'})
+        self.assertEqual(state['row_count'], 2)
+
+    def test_uncommitted_tail_is_truncated(self):
+        """Bytes appended after the last state write are removed"""
+        state = write_state(self.data_file, row_count=2)
+        with open(self.data_file, 'a') as f:
+            f.write("3,c\n4,")
+        self.assertIsNotNone(validate_state(self.data_file, state))
+        self.assertEqual(read_last_line(self.data_file), "2,b")
+
+    def test_short_file_invalidates_state(self):
+        """A file shorter than the recorded offset is not trusted"""
+        state = write_state(self.data_file, row_count=2)
+        state['byte_offset'] += 100
+        self.assertIsNone(validate_state(self.data_file, state))
+
+    def test_missing_state(self):
+        self.assertIsNone(read_state(self.data_file))
+        self.assertIsNone(validate_state(self.data_file, None))
+
+    def test_read_first_and_last_line(self):
+        """Header and last row are read without scanning the file"""
+        self.assertEqual(read_first_line(self.data_file), "timestamp,id")
+        self.assertEqual(read_last_line(self.data_file, chunk_size=3), "2,b")
+
+
+    def test_count_lines(self):
+        with open(self.data_file, 'a') as f:
+            f.write("3,")
+        self.assertEqual(count_lines(self.data_file, chunk_size=4), (3, len("timestamp,id\n1,a\n2,b\n")))
+
+    def test_writer_counts_rows_of_a_file_without_state(self):
+        """The first commit to a pre-state orderFilled.csv records its full row count"""
+        with mock.patch.object(update_goldsky, 'OUTPUT_FILE', self.data_file):
+            writer = update_goldsky.RawEventWriter('csv')
+            self.assertEqual(writer.row_count, 2)
+            writer.write(decode_events([]), KeysetCursor(2, 'b'))
+        self.assertEqual(read_state(self.data_file)['row_count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Unit tests for update_utils.market_catalog module
+"""
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import polars as pl
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils import market_catalog
+from update_utils.market_catalog import MarketCatalog, market_to_record, records_to_frame, refresh_catalog
+
+
+def gamma_market(market_id, volume='10.5', closed=False, closed_time=None):
+    return {
+        'id': market_id,
+        'createdAt': f"2024-01-0{market_id}T00:00:00Z",
+        'question': f"Question {market_id}?",
+        'outcomes': '["Yes", "No"]',
+        'clobTokenIds': f'["{market_id}1", "{market_id}2"]',
+        'slug': f"question-{market_id}",
+        'conditionId': f"0xc{market_id}",
+        'volume': volume,
+        'closedTime': closed_time,
+        'active': not closed,
+        'closed': closed,
+        'endDate': '2024-02-01T00:00:00Z',
+    }
+
+
+class TestMarketCatalog(unittest.TestCase):
+    """Test cases for the keyed market catalog"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.catalog = MarketCatalog(root=self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def upsert(self, *markets):
+        return self.catalog.upsert(records_to_frame([market_to_record(m) for m in markets]), changed_at='t')
+
+    def test_record_types(self):
+        record = market_to_record(gamma_market('1'))
+        self.assertEqual(record['token1'], '11')
+        self.assertEqual(record['volume'], 10.5)
+        self.assertIsNone(record['closedTime'])
+
+    def test_insert_then_update_records_changes(self):
+        self.assertEqual(self.upsert(gamma_market('1'), gamma_market('2'))['inserted'], 2)
+
+        result = self.upsert(gamma_market('1', volume='99', closed=True, closed_time='2024-01-20 00:00:00+00'),
+                             gamma_market('3'))
+        self.assertEqual(result, {'inserted': 1, 'updated': 1, 'changes': 4})
+        self.assertEqual(self.catalog.rows, 3)
+
+        changes = self.catalog.scan_changes().collect()
+        self.assertEqual(sorted(changes['field'].to_list()), ['active', 'closed', 'closedTime', 'volume'])
+        volume = changes.filter(pl.col('field') == 'volume').row(0, named=True)
+        self.assertEqual((volume['old'], volume['new']), ('10.5', '99.0'))
+
+    def test_unchanged_upsert_records_nothing(self):
+        self.upsert(gamma_market('1'))
+        self.assertEqual(self.upsert(gamma_market('1'))['changes'], 0)
+        self.assertEqual(self.catalog.manifest['change_segments'], [])
+
+    def test_reopen_and_seed(self):
+        """The catalog persists; seeded rows start closed"""
+        csv_rows = pl.DataFrame({
+            'createdAt': ['2024-01-01T00:00:00Z', '2024-01-02T00:00:00Z'],
+            'id': [1, 2], 'question': ['a', 'b'], 'answer1': ['Yes'] * 2, 'answer2': ['No'] * 2,
+            'neg_risk': [False, False], 'market_slug': ['a', 'b'], 'token1': ['11', '21'],
+            'token2': ['12', '22'], 'condition_id': ['0xc1', '0xc2'], 'volume': [1.0, 2.0],
+            'ticker': ['', ''], 'closedTime': ['2024-01-05 00:00:00+00', None],
+        })
+        self.catalog.seed(csv_rows)
+
+        reopened = MarketCatalog(root=self.tmp)
+        self.assertEqual(reopened.rows, 2)
+        self.assertEqual(reopened.df.filter(pl.col('closed'))['id'].to_list(), ['1', '2'])
+
+        # The open listing reopens market 2; nothing is looked up by id
+        def fetch_all(filters, *args):
+            return [gamma_market('2')] if filters['closed'] == 'false' else []
+
+        with mock.patch.object(market_catalog, 'fetch_all', fetch_all), \
+                mock.patch.object(market_catalog, 'fetch_by_ids') as fetch_by_ids:
+            refresh_catalog(catalog=reopened)
+        fetch_by_ids.assert_not_called()
+        self.assertEqual(reopened.df.filter(pl.col('closed').not_())['id'].to_list(), ['2'])
+
+    def test_refresh_rechecks_missing_markets_once_per_interval(self):
+        """A catalog-open market the API stops returning is looked up once per recheck interval"""
+        self.upsert(gamma_market('1'), gamma_market('2'))
+        lookups = []
+
+        def fetch_by_ids(ids, workers, rate):
+            lookups.append(sorted(ids))
+            return [gamma_market('2', closed=True, closed_time='2024-01-20 00:00:00+00')] if '2' in ids else []
+
+        def refresh(**kwargs):
+            with mock.patch.object(market_catalog, 'fetch_all', lambda *args: []), \
+                    mock.patch.object(market_catalog, 'fetch_by_ids', fetch_by_ids):
+                return refresh_catalog(catalog=self.catalog, **kwargs)
+
+        self.assertEqual(refresh()['updated'], 1)
+        refresh()
+        self.assertEqual(lookups, [['1', '2']])
+        self.assertIsNotNone(self.catalog.df.filter(pl.col('id') == '1')['checked_at'][0])
+
+        refresh(recheck_hours=0)
+        self.assertEqual(lookups, [['1', '2'], ['1']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests for poly_utils.utils.update_missing_tokens with a stubbed Gamma API
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import sys
+from pathlib import Path
+
+import polars as pl
+import requests
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from poly_utils.gamma_decode import dumps
+from poly_utils.utils import known_market_ids, update_missing_tokens
+from update_utils.market_catalog import MarketCatalog, market_to_record, records_to_frame
+
+
+def gamma_market(market_id):
+    return {
+        'id': market_id,
+        'createdAt': '2024-01-01T00:00:00Z',
+        'question': f"Question {market_id}?",
+        'outcomes': '["Yes", "No"]',
+        'clobTokenIds': f'["{market_id}1", "{market_id}2"]',
+        'slug': f"question-{market_id}",
+        'conditionId': f"0xc{market_id}",
+        'volume': '10.50',
+    }
+
+
+class StubGamma:
+    """Stands in for the rate controller: answers `clob_token_ids` queries from a fixed market list"""
+
+    def __init__(self, markets, fail=()):
+        self.markets = markets
+        self.fail = set(fail)
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, params=None, max_attempts=None, **kwargs):
+        tokens = set(params['clob_token_ids'])
+        with self.lock:
+            self.batches.append(sorted(tokens))
+        if tokens & self.fail:
+            raise requests.exceptions.ConnectionError('down')
+        response = requests.Response()
+        response.status_code = 200
+        response._content = dumps([m for m in self.markets
+                                   if {f"{m['id']}1", f"{m['id']}2"} & tokens])
+        return response
+
+    def on_error(self):
+        return 0.0
+
+
+class TestUpdateMissingTokens(unittest.TestCase):
+    """Test cases for batching, catalog lookups and known-id dedup"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.tmp, 'missing_markets.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read_ids(self):
+        return pl.read_csv(self.csv_file, schema_overrides={'id': pl.Utf8})['id'].to_list()
+
+    def test_batches_and_dedup(self):
+        gamma = StubGamma([gamma_market(str(i)) for i in range(1, 6)])
+        # Both tokens of markets 1-5, plus repeats and the USDC placeholder
+        tokens = [f"{i}{side}" for i in range(1, 6) for side in (1, 2)] + ['11', '0', '']
+        self.assertEqual(update_missing_tokens(tokens, self.csv_file, batch_size=4, workers=2, rate=gamma), 5)
+        self.assertEqual(sorted(len(b) for b in gamma.batches), [2, 4, 4])
+        self.assertEqual(sorted(self.read_ids()), ['1', '2', '3', '4', '5'])
+
+        # Known ids are not appended again, and failed batches are skipped
+        gamma = StubGamma([gamma_market(str(i)) for i in range(1, 8)], fail={'71'})
+        self.assertEqual(update_missing_tokens(['11', '61', '71'], self.csv_file, batch_size=1, rate=gamma), 1)
+        self.assertEqual(sorted(self.read_ids()), ['1', '2', '3', '4', '5', '6'])
+        self.assertIn('6', known_market_ids(self.csv_file))
+
+    def test_catalog_resolves_without_request(self):
+        catalog = MarketCatalog(root=os.path.join(self.tmp, 'catalog'))
+        catalog.upsert(records_to_frame([market_to_record(gamma_market('8'))]), changed_at='t')
+        gamma = StubGamma([gamma_market('9')])
+
+        self.assertEqual(update_missing_tokens(['81', '91'], self.csv_file, rate=gamma, catalog=catalog), 2)
+        self.assertEqual(gamma.batches, [['91']])
+        self.assertEqual(sorted(self.read_ids()), ['8', '9'])
+        self.assertEqual(catalog.rows, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Unit tests for the lazy raw-event to trade pipeline
+"""
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from update_utils.process_live import TRADE_COLUMNS, process_trades
+
+PROBE = pl.DataFrame({'asset_id': ['11', '22'], 'market_id': [1, 2], 'side': ['token1', 'token2']})
+
+
+def raw_events():
+    return pl.DataFrame({
+        'timestamp': [1704067200, 1704067201, 1704067202],
+        'maker': ['0xm0', '0xm1', '0xm2'],
+        'makerAssetId': ['0', '22', '0'],
+        'makerAmountFilled': [1_000_000, 4_000_000, 1_000_000],
+        'taker': ['0xt0', '0xt1', '0xt2'],
+        'takerAssetId': ['11', '0', '99'],
+        'takerAmountFilled': [2_000_000, 1_000_000, 2_000_000],
+        'transactionHash': ['0xh0', '0xh1', '0xh2'],
+    }).with_columns(pl.from_epoch('timestamp', time_unit='s'))
+
+
+class TestProcessTrades(unittest.TestCase):
+    """Test cases for labelling, directions and prices"""
+
+    def test_trades(self):
+        df = process_trades(raw_events().lazy(), probe=PROBE).collect()
+        self.assertEqual(df.columns, TRADE_COLUMNS)
+        self.assertEqual(df['transactionHash'].to_list(), ['0xh0', '0xh1', '0xh2'])
+        self.assertEqual(df['market_id'].to_list(), [1, 2, None])
+        self.assertEqual(df['nonusdc_side'].to_list()[:2], ['token1', 'token2'])
+        # Maker pays USDC in row 0, so the taker sells; the taker pays USDC in row 1
+        self.assertEqual(df['taker_direction'].to_list()[:2], ['SELL', 'BUY'])
+        self.assertEqual(df['maker_direction'].to_list()[:2], ['BUY', 'SELL'])
+        self.assertEqual(df['price'].to_list()[:2], [0.5, 0.25])
+        self.assertEqual(df['usd_amount'].to_list()[:2], [1.0, 1.0])
+        self.assertEqual(df['token_amount'].to_list()[:2], [2.0, 4.0])
+
+    def test_keep_columns_and_streaming(self):
+        lf = process_trades(raw_events().lazy(), keep_columns=['nonusdc_asset_id'], probe=PROBE)
+        streamed = lf.collect(engine='streaming')
+        self.assertEqual(streamed['nonusdc_asset_id'].to_list(), ['11', '22', '99'])
+        self.assertTrue(streamed.equals(lf.collect()))
+
+
+if __name__ == '__main__':
+    unittest.main()
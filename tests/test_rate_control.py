@@ -0,0 +1,146 @@
+"""
+Unit tests for poly_utils.rate_control module
+"""
+import asyncio
+import time
+import unittest
+import sys
+from email.utils import formatdate
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import requests
+
+from poly_utils.rate_control import RateController, parse_retry_after
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    """Test cases for Retry-After header parsing"""
+
+    def test_delta_seconds(self):
+        self.assertEqual(parse_retry_after('7'), 7.0)
+
+    def test_http_date(self):
+        delay = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+        self.assertTrue(25 <= delay <= 31)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestRateController(unittest.TestCase):
+    """Test cases for AIMD adaptation"""
+
+    def make(self):
+        return RateController('test', rate=10.0, min_rate=1.0, max_rate=12.0,
+                              concurrency=8, max_concurrency=16, additive_step=1.0)
+
+    def test_additive_increase_is_capped(self):
+        rate = self.make()
+        for _ in range(5):
+            rate.on_success(rows=100)
+        self.assertEqual(rate.rate, 12.0)
+        self.assertGreater(rate.concurrency, 8)
+        self.assertEqual(rate.stats.rows, 500)
+
+    def test_throttle_halves_limits_once_per_event(self):
+        """Concurrent 429s within one pause only cut the limits once"""
+        rate = self.make()
+        rate.on_throttle(retry_after=5)
+        rate.on_throttle(retry_after=5)
+        self.assertEqual(rate.rate, 5.0)
+        self.assertEqual(rate.concurrency, 4.0)
+        self.assertEqual(rate.stats.throttles, 2)
+
+    def test_retry_after_blocks_next_request(self):
+        rate = self.make()
+        rate.on_throttle(retry_after=2)
+        wait = rate._reserve()
+        rate.release()
+        self.assertTrue(1.5 < wait <= 2.0)
+
+    def test_requests_are_paced(self):
+        rate = self.make()
+        first = rate._reserve()
+        second = rate._reserve()
+        rate.release()
+        rate.release()
+        self.assertEqual(first, 0)
+        self.assertAlmostEqual(second, 0.1, delta=0.02)
+
+    def test_cancelled_async_wait_frees_slot(self):
+        """A task cancelled while paced does not keep its concurrency slot"""
+        rate = self.make()
+        rate.on_throttle(retry_after=5)
+
+        async def run():
+            async def request():
+                async with rate.slot_async():
+                    pass
+
+            task = asyncio.ensure_future(request())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertEqual(rate._in_flight, 0)
+
+    def test_error_backoff_grows(self):
+        rate = self.make()
+        first = rate.on_error()
+        for _ in range(4):
+            last = rate.on_error()
+        self.assertGreater(last, first)
+        self.assertEqual(rate.stats.errors, 5)
+
+
+class FlakySession:
+    """Stub session answering with queued exceptions or status codes"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else requests.exceptions.ConnectionError('down')
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        return response
+
+
+class TestRequest(unittest.TestCase):
+    """Test cases for RateController.request retries"""
+
+    def make(self):
+        return RateController('test', rate=1000.0, max_rate=1000.0, max_backoff=0.001)
+
+    def test_unreachable_host_raises(self):
+        session = FlakySession([])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.make().request('GET', 'http://x', session=session, max_network_errors=3)
+        self.assertEqual(session.calls, 3)
+
+    def test_network_errors_count_consecutively(self):
+        down = requests.exceptions.ConnectionError('down')
+        session = FlakySession([down, down, 503, down, down, 200])
+        response = self.make().request('GET', 'http://x', session=session, max_network_errors=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 6)
+
+    def test_max_attempts_returns_last_response(self):
+        session = FlakySession([503, 503, 503])
+        response = self.make().request('GET', 'http://x', session=session, max_attempts=2)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(session.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
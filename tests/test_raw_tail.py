@@ -0,0 +1,68 @@
+"""
+Unit tests for the byte-offset raw CSV reader in process_live
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.process_live import raw_extent, raw_offset_matches, read_raw_tail
+
+HEADER = b"timestamp,maker,makerAssetId,makerAmountFilled,taker,takerAssetId,takerAmountFilled,transactionHash\n"
+
+
+def raw_line(i):
+    return f"{1704067200 + i},0xm,0,1000000,0xt,123,2000000,0xh{i}\n".encode()
+
+
+class TestReadRawTail(unittest.TestCase):
+    """Test cases for tail reads and offset validation"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.raw_file = os.path.join(self.tmp, 'orderFilled.csv')
+        with open(self.raw_file, 'wb') as f:
+            f.write(HEADER + raw_line(0) + raw_line(1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_full_read(self):
+        df, end = read_raw_tail(0, self.raw_file)
+        self.assertEqual(df['transactionHash'].to_list(), ['0xh0', '0xh1'])
+        self.assertEqual(df['takerAssetId'].to_list(), ['123', '123'])
+        self.assertEqual(end, os.path.getsize(self.raw_file))
+
+    def test_tail_skips_partial_line(self):
+        _, end = read_raw_tail(0, self.raw_file)
+        with open(self.raw_file, 'ab') as f:
+            f.write(raw_line(2) + b"1704067299,0xm,0,10")
+        df, new_end = read_raw_tail(end, self.raw_file)
+        self.assertEqual(df['transactionHash'].to_list(), ['0xh2'])
+        self.assertEqual(new_end, end + len(raw_line(2)))
+        df, same = read_raw_tail(new_end, self.raw_file)
+        self.assertEqual((len(df), same), (0, new_end))
+
+    def test_extent_counts_complete_rows(self):
+        with open(self.raw_file, 'ab') as f:
+            f.write(b"1704067299,0xm,0,10")
+        _, end = read_raw_tail(0, self.raw_file)
+        self.assertEqual(raw_extent(self.raw_file, chunk_size=7), (2, end))
+        self.assertEqual(end, len(HEADER + raw_line(0) + raw_line(1)))
+
+    def test_offset_matches_last_processed_row(self):
+        _, end = read_raw_tail(0, self.raw_file)
+        state = {'raw_byte_offset': end, 'transactionHash': '0xh1'}
+        self.assertTrue(raw_offset_matches(state, self.raw_file))
+        self.assertFalse(raw_offset_matches({**state, 'transactionHash': '0xh0'}, self.raw_file))
+        self.assertFalse(raw_offset_matches({**state, 'raw_byte_offset': end - 3}, self.raw_file))
+        self.assertFalse(raw_offset_matches({**state, 'raw_byte_offset': end + 100}, self.raw_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Unit tests for chunk planning in the parallel trade rebuild
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from update_utils.rebuild_trades import plan_csv_chunks
+
+HEADER = b"timestamp,maker,makerAssetId,makerAmountFilled,taker,takerAssetId,takerAmountFilled,transactionHash\n"
+
+
+def raw_line(i):
+    return f"{1704067200 + i},0xm,0,1000000,0xt,123,2000000,0xh{i}\n".encode()
+
+
+class TestPlanCsvChunks(unittest.TestCase):
+    """Test cases for line-aligned byte ranges"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.raw_file = os.path.join(self.tmp, 'orderFilled.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_chunks_cover_complete_lines(self):
+        lines = [raw_line(i) for i in range(50)]
+        with open(self.raw_file, 'wb') as f:
+            f.write(HEADER + b''.join(lines) + b'1704067300,0xm,0,10')  # partial last line
+
+        chunks = plan_csv_chunks(self.raw_file, chunk_bytes=100)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], len(HEADER))
+        self.assertEqual(chunks[-1][1], len(HEADER) + sum(len(line) for line in lines))
+        with open(self.raw_file, 'rb') as f:
+            data = f.read()
+        for (start, end), (next_start, _) in zip(chunks, chunks[1:] + [(chunks[-1][1], None)]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_header_only(self):
+        with open(self.raw_file, 'wb') as f:
+            f.write(HEADER)
+        self.assertEqual(plan_csv_chunks(self.raw_file), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
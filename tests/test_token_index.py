@@ -0,0 +1,120 @@
+"""
+Unit tests for the persistent token id index
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from poly_utils.token_index import TokenIndex, get_token_index, token_words, _index_memo
+from poly_utils.utils import _markets_memo
+
+TOKEN_A = '21742633143463906290569050155826241533067272736897614950488156847949938836455'
+TOKEN_B = '48331043336612883890938759509493159234755048973500640148014422747788308965732'
+# Same low 64 bits as TOKEN_A
+TOKEN_A_TWIN = str(int(TOKEN_A) + (1 << 64))
+
+
+def markets(*rows):
+    return pl.DataFrame(
+        [{'id': m, 'token1': t1, 'token2': t2} for m, t1, t2 in rows],
+        schema={'id': pl.Int64, 'token1': pl.Utf8, 'token2': pl.Utf8},
+    )
+
+
+class TestTokenIndex(unittest.TestCase):
+    """Test cases for lookups, collisions and incremental sync"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        _index_memo.clear()
+        _markets_memo.clear()
+
+    def tearDown(self):
+        _index_memo.clear()
+        _markets_memo.clear()
+        shutil.rmtree(self.tmp)
+
+    def test_lookup(self):
+        index = TokenIndex(self.tmp)
+        self.assertEqual(index.add_markets(markets((1, TOKEN_A, TOKEN_B))), 2)
+        self.assertEqual(index.lookup(TOKEN_A), (1, 'token1'))
+        self.assertEqual(index.lookup(TOKEN_B), (1, 'token2'))
+        self.assertIsNone(index.lookup('12345'))
+        self.assertIsNone(index.lookup('not a token'))
+
+    def test_colliding_keys_stay_exact(self):
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((1, TOKEN_A, TOKEN_B)))
+        index.add_markets(markets((1, TOKEN_A, TOKEN_B), (2, TOKEN_A_TWIN, '')))
+        self.assertEqual(len(index.overflow), 2)
+        self.assertEqual(index.lookup(TOKEN_A), (1, 'token1'))
+        self.assertEqual(index.lookup(TOKEN_A_TWIN), (2, 'token1'))
+        self.assertEqual(index.lookup(TOKEN_B), (1, 'token2'))
+
+    def test_unindexed_twin_is_not_matched(self):
+        """A token sharing only the low 64 bits of an indexed one is not indexed"""
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((1, TOKEN_A, TOKEN_B)))
+        self.assertIsNone(index.lookup(TOKEN_A_TWIN))
+        self.assertEqual(index.probe_frame(pl.Series([TOKEN_A_TWIN, TOKEN_A])).rows(), [(TOKEN_A, 1, 'token1')])
+
+    def test_tokens_added_to_indexed_market(self):
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((1, TOKEN_A, '')))
+        self.assertIsNone(index.lookup(TOKEN_B))
+        self.assertEqual(index.add_markets(markets((1, TOKEN_A, TOKEN_B))), 1)
+        self.assertEqual(index.lookup(TOKEN_B), (1, 'token2'))
+        # A token listed again by another market keeps its first market
+        self.assertEqual(index.add_markets(markets((1, TOKEN_A, TOKEN_B), (3, TOKEN_B, ''))), 0)
+        self.assertEqual(index.lookup(TOKEN_B), (1, 'token2'))
+
+    def test_indexed_market_sides_are_not_parsed_again(self):
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((1, TOKEN_A, TOKEN_B)))
+        with mock.patch('poly_utils.token_index.token_words', wraps=token_words) as parse:
+            self.assertEqual(index.add_markets(markets((1, TOKEN_A, TOKEN_B), (2, TOKEN_A_TWIN, ''))), 1)
+        parsed = [c.args[0] for c in parse.call_args_list]
+        self.assertIn(TOKEN_A_TWIN, parsed)
+        self.assertNotIn(TOKEN_B, parsed)
+        self.assertEqual(index.lookup(TOKEN_A_TWIN), (2, 'token1'))
+
+    def test_save_and_reload(self):
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((1, TOKEN_A, TOKEN_B), (2, TOKEN_A_TWIN, '')))
+        index.save()
+        reloaded = TokenIndex(self.tmp)
+        self.assertEqual(len(reloaded), 3)
+        self.assertEqual(reloaded.lookup(TOKEN_A_TWIN), (2, 'token1'))
+
+    def test_probe_frame(self):
+        index = TokenIndex(self.tmp)
+        index.add_markets(markets((7, TOKEN_A, TOKEN_B)))
+        probe = index.probe_frame(pl.Series([TOKEN_B, TOKEN_B, '999', None], dtype=pl.Utf8))
+        self.assertEqual(probe.rows(), [(TOKEN_B, 7, 'token2')])
+
+    def test_syncs_with_markets_files(self):
+        main = os.path.join(self.tmp, 'markets.csv')
+        missing = os.path.join(self.tmp, 'missing_markets.csv')
+        header = "createdAt,id,question,answer1,answer2,neg_risk,market_slug,token1,token2,condition_id,volume,ticker,closedTime\n"
+        with open(main, 'w') as f:
+            f.write(header + f"2024-01-01T00:00:00Z,1,Q?,Yes,No,False,q,{TOKEN_A},{TOKEN_B},0xc,1.0,T,\n")
+        self.assertEqual(get_token_index(main, missing).lookup(TOKEN_A), (1, 'token1'))
+
+        with open(missing, 'w') as f:
+            f.write(header + f"2024-01-02T00:00:00Z,2,Q?,Yes,No,False,q,{TOKEN_A_TWIN},,0xc,1.0,T,\n")
+        index = get_token_index(main, missing)
+        self.assertEqual(index.lookup(TOKEN_A_TWIN), (2, 'token1'))
+        self.assertEqual(index.lookup(TOKEN_A), (1, 'token1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
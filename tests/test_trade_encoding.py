@@ -0,0 +1,88 @@
+"""
+Unit tests for the compact trade encoding and its wallet dictionary
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from update_utils.trade_encoding import WalletDictionary, decode_trades, encode_trades
+from update_utils.trade_store import coerce_trades
+
+WALLET_A = '0x' + 'a' * 40
+WALLET_B = '0x' + 'b' * 40
+
+
+def trades():
+    return coerce_trades(pl.DataFrame({
+        'timestamp': [datetime(2024, 1, 1), datetime(2024, 1, 1, 0, 0, 1)],
+        'market_id': [1, None],
+        'maker': [WALLET_A, WALLET_B],
+        'taker': [WALLET_B, WALLET_A],
+        'nonusdc_side': ['token2', 'USDC'],
+        'maker_direction': ['SELL', 'BUY'],
+        'taker_direction': ['BUY', 'SELL'],
+        'price': [0.25, 2.0],
+        'usd_amount': pl.Series([1_000_000, 3_000_001]) / 10**6,
+        'token_amount': pl.Series([4_000_000, 1_500_000]) / 10**6,
+        'transactionHash': ['0xh0', '0xh1'],
+    }))
+
+
+class TestTradeEncoding(unittest.TestCase):
+    """Test cases for encoding round trips and dictionary persistence"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, '_wallets.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        wallets = WalletDictionary(self.path)
+        encoded = encode_trades(trades(), wallets)
+        self.assertEqual(encoded['maker_id'].to_list(), [0, 1])
+        self.assertEqual(encoded['taker_buys'].to_list(), [True, False])
+        self.assertEqual(encoded['usd_micros'].to_list(), [1_000_000, 3_000_001])
+        self.assertTrue(decode_trades(encoded.lazy(), wallets).collect().equals(trades()))
+
+    def test_dictionary_persists_and_skips_partial_line(self):
+        wallets = WalletDictionary(self.path)
+        self.assertEqual(wallets.add([WALLET_A, WALLET_B, WALLET_A]), 2)
+        self.assertEqual(wallets.add([WALLET_B]), 0)
+        with open(self.path, 'ab') as f:
+            f.write(b'0xcc')  # a writer mid-append, or one that crashed
+
+        # Readers ignore the partial line and leave the file alone
+        size = os.path.getsize(self.path)
+        reopened = WalletDictionary(self.path)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.id_of(WALLET_B), 1)
+        self.assertIsNone(reopened.id_of('0xcc'))
+        with self.assertRaises(ValueError):
+            encode_trades(trades().with_columns(pl.lit('0xcc').alias('taker')), reopened, add=False)
+
+        # The next writer cuts it off before appending
+        self.assertEqual(reopened.add(['0xdd']), 1)
+        self.assertEqual(WalletDictionary(self.path).addresses.to_list(), [WALLET_A, WALLET_B, '0xdd'])
+
+    def test_writers_catch_up_before_appending(self):
+        first, second = WalletDictionary(self.path), WalletDictionary(self.path)
+        first.add([WALLET_A])
+        second.add([WALLET_B, WALLET_A])
+        self.assertEqual(second.addresses.to_list(), [WALLET_A, WALLET_B])
+        self.assertEqual(WalletDictionary(self.path).id_of(WALLET_B), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for the Parquet processed-trade store
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from update_utils.trade_store import TradeStore, scan_trades, stage_segments
+
+DAY = 86400
+BASE = 1704067200  # 2024-01-01 00:00:00 UTC
+
+
+def trades(timestamps, market_ids, start=0):
+    n = len(timestamps)
+    return pl.DataFrame({
+        'timestamp': [datetime.fromtimestamp(t, tz=timezone.utc).replace(tzinfo=None) for t in timestamps],
+        'market_id': market_ids,
+        'maker': ['0xm'] * n,
+        'taker': ['0xt'] * n,
+        'nonusdc_side': ['token1'] * n,
+        'maker_direction': ['BUY'] * n,
+        'taker_direction': ['SELL'] * n,
+        'price': [0.5] * n,
+        'usd_amount': [1.0] * n,
+        'token_amount': [2.0] * n,
+        'transactionHash': [f"0xh{start + i}" for i in range(n)],
+    })
+
+
+class TestTradeStore(unittest.TestCase):
+    """Test cases for appends, pruning, patching and compaction"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'trades')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_append_splits_days_and_keeps_order(self):
+        store = TradeStore(self.root)
+        first = store.append(trades([BASE, BASE + 60, BASE + DAY], [1, 2, 3]), position={'raw_rows': 3})
+        self.assertEqual(first, 0)
+        self.assertEqual(store.append(trades([BASE + DAY + 1], [4], start=3)), 3)
+
+        reopened = TradeStore(self.root)
+        self.assertEqual(reopened.rows, 4)
+        self.assertEqual(len(reopened.segments), 3)
+        self.assertEqual(reopened.position, {'raw_rows': 3})
+        self.assertEqual(reopened.scan().collect()['transactionHash'].to_list(),
+                         ['0xh0', '0xh1', '0xh2', '0xh3'])
+
+    def test_segment_pruning(self):
+        store = TradeStore(self.root)
+        store.append(trades([BASE, BASE + 1, BASE + DAY, BASE + 2 * DAY], [1, 2, 50, 60]))
+
+        self.assertEqual(len(store.segment_paths(start=BASE + DAY)), 2)
+        self.assertEqual(len(store.segment_paths(market_ids=[55])), 0)
+        day2 = store.scan(start=BASE + DAY, end=BASE + 2 * DAY).collect()
+        self.assertEqual(day2['market_id'].to_list(), [50])
+
+    def test_patch_rows_and_compact(self):
+        store = TradeStore(self.root)
+        store.append(trades([BASE, BASE + 1], [None, 1]))
+        store.append(trades([BASE + 2], [None], start=2))
+
+        fix = trades([BASE, BASE + 2], [7, 8]).with_columns(pl.Series('ordinal', [0, 2]))
+        self.assertEqual(store.patch_rows(fix), 2)
+        self.assertEqual(store.scan().collect()['market_id'].to_list(), [7, 1, 8])
+
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(len(store.segments), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'date=2024-01-01'))), 1)
+        self.assertEqual(TradeStore(self.root).scan().collect()['market_id'].to_list(), [7, 1, 8])
+
+    def test_append_staged(self):
+        store = TradeStore(self.root)
+        store.append(trades([BASE], [1]))
+        staged = stage_segments(trades([BASE + 1, BASE + DAY], [2, 3], start=1), os.path.join(self.tmp, 'staging'),
+                                'chunk', wallets=store.wallets)
+        self.assertEqual(store.append_staged(staged, position={'raw_rows': 3}), 1)
+
+        reopened = TradeStore(self.root)
+        self.assertEqual(reopened.rows, 3)
+        self.assertEqual(reopened.position, {'raw_rows': 3})
+        self.assertEqual(reopened.scan().collect()['market_id'].to_list(), [1, 2, 3])
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'staging')), [])
+
+    def test_encodings(self):
+        compact = TradeStore(self.root)
+        compact.append(trades([BASE, BASE + 1], [1, 2]))
+        self.assertEqual(compact.encoding, 'compact')
+        self.assertIn('maker_id', compact.scan(decoded=False).collect_schema().names())
+        self.assertTrue(compact.scan().collect().equals(trades([BASE, BASE + 1], [1, 2])))
+
+        plain = TradeStore(os.path.join(self.tmp, 'plain'), encoding='plain')
+        plain.append(trades([BASE], [1]))
+        self.assertEqual(TradeStore(plain.root).encoding, 'plain')
+        self.assertIsNone(plain.wallets)
+        self.assertEqual(plain.scan(decoded=False).collect()['maker'].to_list(), ['0xm'])
+
+    def test_scan_trades_falls_back_to_csv(self):
+        csv_file = os.path.join(self.tmp, 'trades.csv')
+        trades([BASE, BASE + DAY], [1, 2]).write_csv(csv_file)
+        df = scan_trades(start=BASE + DAY, root=self.root, csv_file=csv_file).collect()
+        self.assertEqual(df['market_id'].to_list(), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Unit tests for the unresolved-trade queue and its journaled patches
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import polars as pl
+
+from update_utils.ingest_state import read_state, write_state
+from update_utils.unresolved_trades import (
+    _write_patched_tail, enqueue, line_offsets, line_starts, queue_path, read_queue, recover_patch,
+)
+
+
+def queued_row(token_id, byte_offset):
+    return {
+        'token_id': token_id, 'byte_offset': byte_offset,
+        'timestamp': datetime(2024, 1, 1), 'maker': '0xm', 'makerAssetId': '0',
+        'makerAmountFilled': 1_000_000, 'taker': '0xt', 'takerAssetId': token_id,
+        'takerAmountFilled': 2_000_000, 'transactionHash': '0xh',
+    }
+
+
+class TestUnresolvedQueue(unittest.TestCase):
+    """Test cases for offsets, the queue and patch recovery"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.op_file = os.path.join(self.tmp, 'trades.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_line_offsets(self):
+        self.assertEqual(line_offsets(b'ab\nc\n\ndef\n', 10).tolist(), [10, 13, 15, 16])
+
+    def test_line_starts(self):
+        with open(self.op_file, 'wb') as f:
+            f.write(b'h\nab\nc\n\ndef\n')
+        self.assertEqual(line_starts(self.op_file, [0, 2, 3, 5], chunk_size=3).tolist(), [0, 5, 7, 12])
+        with self.assertRaises(ValueError):
+            line_starts(self.op_file, [6])
+
+    def test_queue_drops_uncommitted_and_duplicate_entries(self):
+        rows = pl.DataFrame([queued_row('11', 5), queued_row('11', 20), queued_row('22', 40)])
+        enqueue(self.op_file, rows)
+        enqueue(self.op_file, rows[1:2])
+        self.assertTrue(os.path.isfile(queue_path(self.op_file)))
+        self.assertEqual(read_queue(self.op_file, committed=30)['byte_offset'].to_list(), [5, 20])
+
+    def test_write_patched_tail(self):
+        with open(self.op_file, 'wb') as f:
+            f.write(b'h\na\nbb\nccc\ndd\nuncommitted')
+        size, offsets, shifts = _write_patched_tail(self.op_file, 4, 14, {4: b'XXXX\n', 11: b'y\n'}, chunk_size=2)
+        with open(f"{self.op_file}.patch", 'rb') as f:
+            self.assertEqual(f.read(), b'XXXX\nccc\ny\n')
+        self.assertEqual(size, 11)
+        self.assertEqual(offsets.tolist(), [4, 11])
+        self.assertEqual(shifts.tolist(), [2, 1])
+
+    def test_recover_interrupted_patch(self):
+        with open(self.op_file, 'wb') as f:
+            f.write(b'h\nold-1\nold-2\n')
+        with open(f"{self.op_file}.patch", 'wb') as f:
+            f.write(b'new-1\nnew-22\n')
+        # Crash mid-apply: part of the new tail already landed past the committed offset
+        with open(self.op_file, 'r+b') as f:
+            f.seek(2)
+            f.write(b'new-1\nne')
+        write_state(self.op_file, raw_rows=2, byte_offset=14, patch={'offset': 2, 'size': 13})
+
+        self.assertTrue(recover_patch(self.op_file))
+        with open(self.op_file, 'rb') as f:
+            self.assertEqual(f.read(), b'h\nnew-1\nnew-22\n')
+        state = read_state(self.op_file)
+        self.assertNotIn('patch', state)
+        self.assertEqual(state['byte_offset'], 15)
+        self.assertEqual(state['raw_rows'], 2)
+        self.assertFalse(os.path.exists(f"{self.op_file}.patch"))
+        self.assertFalse(recover_patch(self.op_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
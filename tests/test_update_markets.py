@@ -0,0 +1,199 @@
+"""
+Unit tests for update_utils.update_markets module
+"""
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from poly_utils.rate_control import RateController
+from update_utils import update_markets as um
+
+TOTAL = 5
+
+
+def gamma_market(n):
+    return {'id': str(n), 'createdAt': f'2024-01-0{n + 1}T00:00:00Z', 'question': f'Q{n}?',
+            'outcomes': '["Yes", "No"]', 'clobTokenIds': f'["{n}1", "{n}2"]', 'volume': '1.50'}
+
+
+class StubWindows:
+    """fetch_markets_window stand-in; earlier windows answer later, windows past the end block"""
+
+    def __init__(self, total=TOTAL, block_tail=False):
+        self.total = total
+        self.block_tail = block_tail
+        self.release = threading.Event()
+        self.offsets = []
+
+    def __call__(self, offset, limit, rate=None, raw=False, url=None):
+        self.offsets.append(offset)
+        if offset >= self.total and self.block_tail:
+            self.release.wait(10)
+        time.sleep(max(0, 0.03 * (3 - offset // limit)))
+        page = [gamma_market(n) for n in range(offset, min(offset + limit, self.total))]
+        return json.dumps(page).encode()
+
+
+class StubSession:
+    """requests stand-in answering every call with `status` or raising `error`"""
+
+    def __init__(self, status=200, error=None):
+        self.status = status
+        self.error = error
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = b'[]'
+        return response
+
+
+def read_ids(path):
+    with open(path, newline='') as f:
+        return [row[1] for row in list(csv.reader(f))[1:]]
+
+
+class TestUpdateMarkets(unittest.TestCase):
+    """Test cases for the concurrent window fetch"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.csv = os.path.join(self.tmp, 'markets.csv')
+        self.rate = RateController('test', rate=1000, max_rate=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_update(self, stub, **kwargs):
+        with mock.patch.object(um, 'fetch_markets_window', stub), \
+                mock.patch.object(um, 'get_controller', lambda name: self.rate):
+            um.update_markets(self.csv, batch_size=2, workers=3, **kwargs)
+
+    def test_windows_commit_in_offset_order(self):
+        self.run_update(StubWindows())
+        self.assertEqual(read_ids(self.csv), ['0', '1', '2', '3', '4'])
+        self.assertEqual(um.read_state(self.csv)['offset'], TOTAL)
+
+    def test_running_tail_windows_do_not_block(self):
+        stub = StubWindows(block_tail=True)
+        started = time.monotonic()
+        self.run_update(stub)
+        stub.release.set()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(read_ids(self.csv), ['0', '1', '2', '3', '4'])
+
+    def test_failed_window_stops_at_commit_point(self):
+        """A window that keeps failing ends the run without raising; the next run resumes there"""
+        stub = StubWindows()
+
+        def failing(offset, limit, *args, **kwargs):
+            if offset == 2:
+                raise requests.exceptions.ConnectionError("gamma is down")
+            return stub(offset, limit, *args, **kwargs)
+
+        self.run_update(failing)
+        self.assertEqual(read_ids(self.csv), ['0', '1'])
+        self.assertEqual(um.read_state(self.csv)['offset'], 2)
+
+        self.run_update(StubWindows())
+        self.assertEqual(read_ids(self.csv), ['0', '1', '2', '3', '4'])
+
+    def test_malformed_last_entry_keeps_last_id(self):
+        def window(offset, limit, *args, **kwargs):
+            page = [gamma_market(n) for n in range(offset, min(offset + limit, 3))]
+            if offset == 2:
+                page.append({'question': 'no id'})
+            return json.dumps(page).encode()
+
+        self.run_update(window)
+        state = um.read_state(self.csv)
+        self.assertEqual((state['offset'], state['last_id']), (4, '2'))
+
+
+class TestResume(unittest.TestCase):
+    """Test cases for resuming from the state file"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.csv = os.path.join(self.tmp, 'markets.csv')
+        self.rate = RateController('test', rate=1000, max_rate=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_update(self, total):
+        stub = StubWindows(total=total)
+        with mock.patch.object(um, 'fetch_markets_window', stub), \
+                mock.patch.object(um, 'get_controller', lambda name: self.rate):
+            um.update_markets(self.csv, batch_size=2, workers=1)
+        return stub
+
+    def test_half_written_window_is_truncated(self):
+        self.run_update(total=4)
+        committed = um.read_state(self.csv)
+        with open(self.csv, 'a') as f:
+            f.write('2024-01-09T00:00:00Z,99,half written')
+
+        stub = self.run_update(total=6)
+        self.assertEqual(stub.offsets[0], committed['offset'])
+        self.assertEqual(read_ids(self.csv), ['0', '1', '2', '3', '4', '5'])
+        self.assertEqual(um.read_state(self.csv)['offset'], 6)
+
+    def test_counts_lines_without_state_file(self):
+        with open(self.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(um.MARKET_HEADERS)
+            for n in range(3):
+                writer.writerow([f'2024-01-0{n + 1}T00:00:00Z', str(n)] + [''] * 11)
+        self.assertIsNone(um.read_state(self.csv))
+
+        with mock.patch.object(um, 'count_csv_lines', wraps=um.count_csv_lines) as counted:
+            stub = self.run_update(total=5)
+        counted.assert_called_once_with(self.csv)
+        self.assertEqual(stub.offsets[0], 3)
+        self.assertEqual(read_ids(self.csv), ['0', '1', '2', '3', '4'])
+
+
+class TestFetchMarketsWindow(unittest.TestCase):
+    """Test cases for bounded window retries"""
+
+    def setUp(self):
+        self.rate = RateController('test', rate=1000, max_rate=1000)
+        self.rate.on_error = lambda: 0.0
+
+    def fetch(self, session):
+        with mock.patch.object(requests, 'request', session.request):
+            return um.fetch_markets_window(0, 2, self.rate, max_retries=3)
+
+    def test_network_errors_are_bounded(self):
+        session = StubSession(error=requests.exceptions.ConnectionError('down'))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.fetch(session)
+        self.assertEqual(session.calls, 3)
+
+    def test_client_error_is_not_retried(self):
+        session = StubSession(status=400)
+        with self.assertRaises(RuntimeError):
+            self.fetch(session)
+        self.assertEqual(session.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,50 @@
+import argparse
+
 from update_utils.update_markets import update_markets
 from update_utils.update_goldsky import update_goldsky
 from update_utils.process_live import process_live
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update markets, Goldsky fills and processed trades")
+    parser.add_argument('--follow', action='store_true',
+                        help="after the batch update, keep polling Goldsky and process new fills as they arrive")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="raw Goldsky storage format")
+    parser.add_argument('--trades-format', choices=['csv', 'parquet'], default='csv',
+                        help="processed trades storage: processed/trades.csv or processed/trades/ segments")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="rebuild processed trades from the whole raw history instead of appending")
+    parser.add_argument('--workers', type=int, help="worker processes for --rebuild (default: one per core)")
+    parser.add_argument('--refresh-catalog', action='store_true',
+                        help="after updating markets, re-pull open and recently closed markets into catalog/")
+    parser.add_argument('--fetch-missing', action='store_true',
+                        help="look up tokens of still unresolved trades on the Gamma API and patch their rows")
+    args = parser.parse_args()
+
     print("Updating markets")
     update_markets()
+    if args.refresh_catalog:
+        from update_utils.market_catalog import refresh_catalog
+        print("Refreshing market catalog")
+        refresh_catalog()
     print("Updating goldsky")
-    update_goldsky()
-    print("Processing live")
-    process_live()
\ No newline at end of file
+    update_goldsky(output_format=args.format)
+    if args.rebuild:
+        from update_utils.rebuild_trades import rebuild_trades
+        print("Rebuilding processed trades")
+        rebuild_trades(source=args.format, trades_format=args.trades_format, workers=args.workers)
+    else:
+        print("Processing live")
+        process_live(source=args.format, trades_format=args.trades_format)
+
+    if args.fetch_missing:
+        from update_utils.process_live import PROCESSED_FILE
+        from update_utils.trade_store import TRADES_DIR
+        from update_utils.unresolved_trades import resolve_unresolved
+        print("Fetching missing markets")
+        resolve_unresolved(TRADES_DIR if args.trades_format == 'parquet' else PROCESSED_FILE, fetch=True)
+
+    if args.follow:
+        from update_utils.follow_live import follow
+        print("Following goldsky")
+        follow(output_format=args.format, trades_format=args.trades_format)
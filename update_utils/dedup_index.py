@@ -0,0 +1,325 @@
+"""
+Persistent membership index over Goldsky event ids.
+
+The Parquet event store (scrape, follow mode and backfill merges) asks the
+index which events it has already stored before appending a batch, so
+restarts and overlapping ranges do not write the same fill twice.
+
+Each id is reduced to a 64-bit blake2b fingerprint. Lookups go through two
+tiers:
+
+- a Bloom filter answers "definitely new" for almost every fresh id without
+  touching the fingerprint runs;
+- ids the filter flags are checked against sorted fingerprint runs with a
+  binary search (memory-mapped, so the runs are never loaded whole).
+
+Fingerprints can collide, so a fingerprint hit is only a candidate
+duplicate. filter_new() hands candidates to a caller-supplied check against
+the full ids it stores (EventStore reads the id column of the segments
+covering the candidates' timestamps), and keeps the rows that check clears.
+
+On disk the index is a directory next to the data it guards:
+
+    goldsky/events/_dedup/
+        meta.json
+        bloom.npy
+        run-000000.npy
+        run-000001.npy
+
+New fingerprints are kept in memory and written as a new sorted run on
+flush(); runs are merged once there are more than MAX_RUNS of them. With
+64-bit fingerprints the chance that any candidate is a collision stays below
+1e-3 up to ~190M events, so the exact check almost only sees real repeats.
+"""
+import hashlib
+import json
+import math
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import polars as pl
+
+from update_utils.ingest_state import write_json_atomic
+
+META_NAME = 'meta.json'
+BLOOM_NAME = 'bloom.npy'
+INDEX_VERSION = 1
+
+# The Bloom filter is sized for twice the ids it holds (at least MIN_CAPACITY,
+# ~180 KB) and doubles when it fills up
+MIN_CAPACITY = 100_000
+DEFAULT_FP_RATE = 0.001
+
+# Pending fingerprints kept in memory before maybe_flush() writes a run
+DEFAULT_FLUSH_ROWS = 50_000
+
+# Sorted runs allowed before they are compacted into one
+MAX_RUNS = 8
+
+
+def bloom_capacity(count: int) -> int:
+    """Bloom filter capacity for `count` ids, with headroom to grow into"""
+    return max(MIN_CAPACITY, 2 * count)
+
+
+def fingerprint(ids: Iterable[str]) -> np.ndarray:
+    """Stable 64-bit fingerprints (blake2b) for a sequence of ids"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(i.encode(), digest_size=8).digest(), 'little') for i in ids),
+        dtype=np.uint64,
+    )
+
+
+def _save_array(path: str, arr: np.ndarray) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over uint64 fingerprints (double hashing, numpy bit array)"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(64, int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, fps: np.ndarray) -> np.ndarray:
+        h1 = fps & np.uint64(0xFFFFFFFF)
+        h2 = (fps >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, fps: np.ndarray) -> None:
+        if len(fps) == 0:
+            return
+        pos = self._positions(fps).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), (1 << (pos & np.uint64(7))).astype(np.uint8))
+
+    def might_contain(self, fps: np.ndarray) -> np.ndarray:
+        if len(fps) == 0:
+            return np.zeros(0, dtype=bool)
+        pos = self._positions(fps)
+        hits = (self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+        return hits.all(axis=1)
+
+
+class DedupIndex:
+    """Bloom filter plus sorted fingerprint runs, persisted under one directory"""
+
+    def __init__(self, root: str, capacity: Optional[int] = None, fp_rate: float = DEFAULT_FP_RATE,
+                 flush_rows: int = DEFAULT_FLUSH_ROWS):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.meta_path = os.path.join(root, META_NAME)
+        self._pending: List[np.ndarray] = []
+        self._pending_count = 0
+
+        os.makedirs(root, exist_ok=True)
+        self.meta = self._load_meta(capacity or MIN_CAPACITY, fp_rate)
+        self._runs = [np.load(os.path.join(root, name), mmap_mode='r') for name in self.meta['runs']]
+
+        bloom_file = os.path.join(root, BLOOM_NAME)
+        bits = np.load(bloom_file) if os.path.isfile(bloom_file) else None
+        self.bloom = BloomFilter(self.meta['capacity'], self.meta['fp_rate'])
+        if bits is not None and bits.shape == self.bloom.bits.shape:
+            self.bloom.bits = bits
+        elif self.meta['count']:
+            # Missing or from an interrupted resize: re-derive it from the runs
+            self._rebuild_bloom(self.meta['capacity'])
+        if capacity is None and self.meta['capacity'] > 4 * bloom_capacity(self.meta['count']):
+            # Far larger than the ids need (an index sized up front): shrink it
+            self._rebuild_bloom(bloom_capacity(self.meta['count']))
+            _save_array(bloom_file, self.bloom.bits)
+            write_json_atomic(self.meta_path, self.meta)
+
+    def _load_meta(self, capacity: int, fp_rate: float) -> Dict:
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        return {
+            'version': INDEX_VERSION,
+            'count': 0,
+            'capacity': capacity,
+            'fp_rate': fp_rate,
+            'runs': [],
+            'next_run': 0,
+            'checkpoint': {},
+        }
+
+    @property
+    def count(self) -> int:
+        """Fingerprints in the index, including ones not yet flushed"""
+        return self.meta['count'] + self._pending_count
+
+    @property
+    def checkpoint(self) -> Dict:
+        """Caller-defined marker saved with the last flush (e.g. data rows covered)"""
+        return self.meta.get('checkpoint', {})
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def contains(self, fps: np.ndarray) -> np.ndarray:
+        """Membership of an array of fingerprints (exact for fingerprints; ids may collide)"""
+        found = np.zeros(len(fps), dtype=bool)
+        candidates = np.flatnonzero(self.bloom.might_contain(fps))
+        if len(candidates) == 0:
+            return found
+
+        cand = fps[candidates]
+        hit = np.zeros(len(cand), dtype=bool)
+        for run in self._runs:
+            idx = np.searchsorted(run, cand)
+            inside = idx < len(run)
+            hit[inside] |= run[idx[inside]] == cand[inside]
+        if self._pending:
+            hit |= np.isin(cand, np.concatenate(self._pending))
+        found[candidates] = hit
+        return found
+
+    def filter_new(self, df: pl.DataFrame, column: str = 'id',
+                   stored: Optional[Callable[[pl.DataFrame], np.ndarray]] = None) -> pl.DataFrame:
+        """
+        Drop rows whose id is already indexed (or repeated within df) and index the rest
+
+        Rows with a null id cannot be checked and are passed through.
+
+        Args:
+            df: Rows to filter
+            column: Id column
+            stored: Exact fallback for fingerprint hits: takes the candidate
+                    rows and returns a boolean mask of those whose full id is
+                    stored. Without it every hit counts as a duplicate.
+        """
+        if len(df) == 0:
+            return df
+
+        has_id = df[column].is_not_null().to_numpy()
+        with_id = df.filter(pl.Series(has_id))
+        fps = fingerprint(with_id[column].to_list())
+
+        # Repeats within df are matched on the ids themselves
+        is_first = with_id[column].is_first_distinct().to_numpy()
+        seen = is_first & self.contains(fps)
+        if stored is not None and seen.any():
+            seen[seen] = np.asarray(stored(with_id.filter(pl.Series(seen))), dtype=bool)
+        new = is_first & ~seen
+
+        self._add(fps[new])
+        keep = np.ones(len(df), dtype=bool)
+        keep[has_id] = new
+        return df.filter(pl.Series(keep))
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _add(self, fps: np.ndarray) -> None:
+        if len(fps) == 0:
+            return
+        if self.count + len(fps) > self.bloom.capacity:
+            self._rebuild_bloom(max(2 * self.bloom.capacity, 2 * (self.count + len(fps))), extra=fps)
+        else:
+            self.bloom.add(fps)
+        self._pending.append(fps)
+        self._pending_count += len(fps)
+
+    def _all_fingerprints(self) -> Iterable[np.ndarray]:
+        yield from self._runs
+        yield from self._pending
+
+    def _rebuild_bloom(self, capacity: int, extra: Optional[np.ndarray] = None) -> None:
+        """Resize the Bloom filter and re-insert every known fingerprint"""
+        self.bloom = BloomFilter(capacity, self.meta['fp_rate'])
+        for fps in self._all_fingerprints():
+            self.bloom.add(np.asarray(fps))
+        if extra is not None:
+            self.bloom.add(extra)
+        self.meta['capacity'] = capacity
+
+    def flush(self, checkpoint: Optional[Dict] = None) -> None:
+        """
+        Write pending fingerprints as a new sorted run, then the Bloom filter and meta
+
+        Args:
+            checkpoint: Marker describing the data this flush covers; compare
+                        it on open to detect an index that fell behind its data
+        """
+        if not self._pending and checkpoint in (None, self.checkpoint):
+            return
+        if self._pending:
+            run = np.unique(np.concatenate(self._pending))
+            name = f"run-{self.meta['next_run']:06d}.npy"
+            _save_array(os.path.join(self.root, name), run)
+            self.meta['runs'].append(name)
+            self.meta['next_run'] += 1
+            self.meta['count'] += len(run)
+            self._runs.append(np.load(os.path.join(self.root, name), mmap_mode='r'))
+            self._pending = []
+            self._pending_count = 0
+
+        if checkpoint is not None:
+            self.meta['checkpoint'] = checkpoint
+
+        if len(self._runs) > MAX_RUNS:
+            self._compact()
+        else:
+            _save_array(os.path.join(self.root, BLOOM_NAME), self.bloom.bits)
+            write_json_atomic(self.meta_path, self.meta)
+
+    def maybe_flush(self, checkpoint: Optional[Dict] = None) -> bool:
+        """Flush once enough fingerprints are pending; returns True if it flushed"""
+        if self._pending_count < self.flush_rows:
+            return False
+        self.flush(checkpoint)
+        return True
+
+    def _compact(self) -> None:
+        """Merge every run into one; old run files are removed after meta points at the new one"""
+        merged = np.unique(np.concatenate([np.asarray(run) for run in self._runs]))
+        old = list(self.meta['runs'])
+        name = f"run-{self.meta['next_run']:06d}.npy"
+        _save_array(os.path.join(self.root, name), merged)
+        _save_array(os.path.join(self.root, BLOOM_NAME), self.bloom.bits)
+
+        self.meta.update(runs=[name], next_run=self.meta['next_run'] + 1, count=len(merged))
+        write_json_atomic(self.meta_path, self.meta)
+        self._runs = [np.load(os.path.join(self.root, name), mmap_mode='r')]
+        for stale in old:
+            os.remove(os.path.join(self.root, stale))
+
+    def rebuild(self, id_batches: Iterable[pl.Series], checkpoint: Optional[Dict] = None,
+                expected: int = 0) -> int:
+        """
+        Discard the index and rebuild it from batches of ids; returns the number indexed
+
+        Args:
+            id_batches: Ids to index
+            checkpoint: Marker saved with the final flush
+            expected: Number of ids, to size the Bloom filter up front
+        """
+        for name in self.meta['runs']:
+            os.remove(os.path.join(self.root, name))
+        self.meta.update(count=0, runs=[], checkpoint={}, capacity=bloom_capacity(expected))
+        self._runs = []
+        self._pending = []
+        self._pending_count = 0
+        self.bloom = BloomFilter(self.meta['capacity'], self.meta['fp_rate'])
+
+        for ids in id_batches:
+            self.filter_new(pl.DataFrame({'id': ids}))
+            self.maybe_flush()
+        self.flush(checkpoint)
+        return self.count
+
+    def summary(self) -> str:
+        return (f"{self.count:,} ids in {len(self._runs)} runs, "
+                f"bloom {self.bloom.bits.nbytes / 1e6:.1f} MB ({self.bloom.num_hashes} hashes)")
@@ -0,0 +1,327 @@
+"""
+Partitioned Parquet store for Goldsky orderFilled events.
+
+Events are written as zstd-compressed Parquet segments under one directory
+per UTC day, with a small JSON manifest describing every segment:
+
+    goldsky/events/
+        _manifest.json
+        date=2024-01-05/part-1704412800-1704499199-000000.parquet
+        date=2024-01-06/...
+
+Columns are typed (int64 timestamps and amounts, asset ids kept as decimal
+strings because they are uint256 values) so readers never re-parse text.
+
+Segments are read in (min_timestamp, path) order. compact() merges runs of
+small segments left by frequent flushes (follow mode) without changing
+that order, so row positions in the scan stay the same.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import polars as pl
+
+from update_utils.ingest_state import write_json_atomic
+from update_utils.dedup_index import DedupIndex
+
+EVENTS_DIR = 'goldsky/events'
+MANIFEST_NAME = '_manifest.json'
+DEDUP_NAME = '_dedup'
+MANIFEST_VERSION = 1
+
+# Column order matches goldsky/orderFilled.csv, plus the subgraph event id
+EVENT_SCHEMA = {
+    'timestamp': pl.Int64,
+    'maker': pl.Utf8,
+    'makerAssetId': pl.Utf8,         # uint256 → decimal string
+    'makerAmountFilled': pl.Int64,   # raw 6-decimal units
+    'taker': pl.Utf8,
+    'takerAssetId': pl.Utf8,
+    'takerAmountFilled': pl.Int64,
+    'transactionHash': pl.Utf8,
+    'id': pl.Utf8,
+}
+
+CSV_COLUMNS = [c for c in EVENT_SCHEMA if c != 'id']
+
+# Rows buffered in memory before a segment is written
+DEFAULT_SEGMENT_ROWS = 250_000
+
+
+def _scan_order(seg: Dict):
+    """Sort key of a segment; a merged segment keeps the place of the first one it replaced"""
+    return seg['min_timestamp'], seg.get('order', seg['path'])
+
+
+def coerce_events(df: pl.DataFrame) -> pl.DataFrame:
+    """Cast a frame of raw events to EVENT_SCHEMA (missing id → null)"""
+    if 'id' not in df.columns:
+        df = df.with_columns(pl.lit(None, dtype=pl.Utf8).alias('id'))
+    return df.select([pl.col(name).cast(dtype, strict=True) for name, dtype in EVENT_SCHEMA.items()])
+
+
+class EventStore:
+    """Append-only, day-partitioned Parquet store for orderFilled events"""
+
+    def __init__(self, root: str = EVENTS_DIR, segment_rows: int = DEFAULT_SEGMENT_ROWS,
+                 compression_level: int = 3, dedup: bool = False):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.compression_level = compression_level
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self._buffer: List[pl.DataFrame] = []
+        self._buffered_rows = 0
+        self._pending_cursor: Optional[Dict] = None
+
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+        # Optional id index under <root>/_dedup; append() then drops events already stored
+        self.dedup: Optional[DedupIndex] = None
+        if dedup:
+            self.dedup = DedupIndex(os.path.join(root, DEDUP_NAME))
+            if self.dedup.checkpoint.get('rows', 0) != self.rows:
+                print(f"Rebuilding dedup index for {self.rows:,} events in {root}...")
+                self.dedup.rebuild(
+                    (pl.read_parquet(path, columns=['id'])['id'] for path in self.segment_paths()),
+                    checkpoint={'rows': self.rows},
+                    expected=self.rows,
+                )
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self) -> Dict:
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {
+            'version': MANIFEST_VERSION,
+            'schema': {name: str(dtype) for name, dtype in EVENT_SCHEMA.items()},
+            'rows': 0,
+            'max_timestamp': None,
+            'segments': [],
+        }
+
+    def _save_manifest(self) -> None:
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    @property
+    def segments(self) -> List[Dict]:
+        return self.manifest['segments']
+
+    @property
+    def rows(self) -> int:
+        return self.manifest['rows']
+
+    def latest_timestamp(self) -> int:
+        """Largest committed timestamp, or 0 for an empty store"""
+        return self.manifest['max_timestamp'] or 0
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, df: pl.DataFrame, cursor: Optional[Dict] = None) -> pl.DataFrame:
+        """
+        Buffer a batch of events; a segment is written once the buffer is full
+
+        Args:
+            df: Events to append
+            cursor: Scraper cursor after this batch, saved in the manifest
+                    when the batch is flushed so resumes are exact
+
+        Returns:
+            The events buffered (known ids dropped when dedup is on)
+        """
+        if cursor is not None:
+            self._pending_cursor = cursor
+        if len(df) == 0:
+            return df
+        df = coerce_events(df)
+        if self.dedup is not None:
+            df = self.dedup.filter_new(df, stored=self._stored)
+            if len(df) == 0:
+                return df
+        self._buffer.append(df)
+        self._buffered_rows += len(df)
+        if self._buffered_rows >= self.segment_rows:
+            self.flush()
+        return df
+
+    def _stored(self, candidates: pl.DataFrame) -> np.ndarray:
+        """Which candidate events (id fingerprint already indexed) are buffered or committed, by full id"""
+        lo, hi = int(candidates['timestamp'].min()), int(candidates['timestamp'].max()) + 1
+        found = (
+            pl.concat([self.scan(lo, hi).select('id'), *(b.lazy().select('id') for b in self._buffer)])
+            .join(candidates.lazy().select('id'), on='id', how='semi')
+            .unique()
+            .with_columns(pl.lit(True).alias('stored'))
+        )
+        return (candidates.lazy().select('id').join(found, on='id', how='left', maintain_order='left')
+                .collect()['stored'].fill_null(False).to_numpy())
+
+    def flush(self) -> int:
+        """Write buffered events as one segment per UTC day; returns rows written"""
+        if not self._buffer:
+            if self._pending_cursor is not None:
+                self.manifest['cursor'] = self._pending_cursor
+                self._pending_cursor = None
+                self._save_manifest()
+            return 0
+
+        batch = pl.concat(self._buffer).sort(['timestamp', 'id'])
+        self._buffer = []
+        self._buffered_rows = 0
+
+        batch = batch.with_columns(
+            pl.from_epoch(pl.col('timestamp'), time_unit='s').dt.strftime('%Y-%m-%d').alias('_date')
+        )
+
+        written = 0
+        for (date,), part in batch.group_by(['_date'], maintain_order=True):
+            part = part.drop('_date')
+            written += self._write_segment(date, part)
+
+        if self._pending_cursor is not None:
+            self.manifest['cursor'] = self._pending_cursor
+            self._pending_cursor = None
+        self._save_manifest()
+        # After the manifest: a crash in between leaves the index behind, which
+        # the row-count check on open repairs
+        if self.dedup is not None:
+            self.dedup.flush(checkpoint={'rows': self.rows})
+        return written
+
+    def _write_file(self, partition: str, df: pl.DataFrame) -> Dict:
+        """Write one segment file (not yet committed) and return its manifest entry"""
+        min_ts = int(df['timestamp'].min())
+        max_ts = int(df['timestamp'].max())
+        seq = self.manifest.get('next_segment', len(self.segments))
+        self.manifest['next_segment'] = seq + 1
+        rel_path = os.path.join(partition, f"part-{min_ts}-{max_ts}-{seq:06d}.parquet")
+        abs_path = os.path.join(self.root, rel_path)
+
+        os.makedirs(os.path.join(self.root, partition), exist_ok=True)
+        tmp_path = f"{abs_path}.tmp"
+        df.write_parquet(
+            tmp_path,
+            compression='zstd',
+            compression_level=self.compression_level,
+            statistics=True,
+        )
+        os.replace(tmp_path, abs_path)
+
+        return {
+            'path': rel_path,
+            'partition': partition,
+            'rows': len(df),
+            'min_timestamp': min_ts,
+            'max_timestamp': max_ts,
+            'bytes': os.path.getsize(abs_path),
+        }
+
+    def _write_segment(self, date: str, df: pl.DataFrame) -> int:
+        entry = self._write_file(f"date={date}", df)
+        self.segments.append(entry)
+        self.manifest['rows'] += len(df)
+        if self.manifest['max_timestamp'] is None or entry['max_timestamp'] > self.manifest['max_timestamp']:
+            self.manifest['max_timestamp'] = entry['max_timestamp']
+        return len(df)
+
+    def compact(self, target_rows: Optional[int] = None) -> int:
+        """
+        Merge runs of small adjacent segments in the same partition
+
+        Buffered events are not touched. Scan order is unchanged.
+
+        Args:
+            target_rows: Largest merged segment (default: segment_rows)
+
+        Returns:
+            Number of segments removed
+        """
+        target_rows = target_rows or self.segment_rows
+        ordered = sorted(self.segments, key=_scan_order)
+        groups: List[List[Dict]] = []
+        for seg in ordered:
+            last = groups[-1] if groups else None
+            if (last and last[-1]['partition'] == seg['partition']
+                    and sum(s['rows'] for s in last) + seg['rows'] <= target_rows):
+                last.append(seg)
+            else:
+                groups.append([seg])
+
+        if all(len(group) == 1 for group in groups):
+            return 0
+        new_segments = []
+        old_paths = []
+        for group in groups:
+            if len(group) == 1:
+                new_segments.append(group[0])
+                continue
+            paths = [os.path.join(self.root, seg['path']) for seg in group]
+            entry = self._write_file(group[0]['partition'], pl.read_parquet(paths))
+            entry['order'] = _scan_order(group[0])[1]
+            new_segments.append(entry)
+            old_paths.extend(paths)
+
+        removed = len(self.segments) - len(new_segments)
+        self.manifest['segments'] = new_segments
+        self._save_manifest()
+        for path in old_paths:
+            os.remove(path)
+        return removed
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def segment_paths(self, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """Segment files overlapping [start, end), ordered by timestamp"""
+        selected = []
+        for seg in sorted(self.segments, key=_scan_order):
+            if start is not None and seg['max_timestamp'] < start:
+                continue
+            if end is not None and seg['min_timestamp'] >= end:
+                continue
+            selected.append(os.path.join(self.root, seg['path']))
+        return selected
+
+    def scan(self, start: Optional[int] = None, end: Optional[int] = None) -> pl.LazyFrame:
+        """Lazy scan of committed events, pruned to [start, end) via the manifest"""
+        paths = self.segment_paths(start, end)
+        if not paths:
+            return pl.DataFrame(schema=EVENT_SCHEMA).lazy()
+
+        lf = pl.scan_parquet(paths)
+        if start is not None:
+            lf = lf.filter(pl.col('timestamp') >= start)
+        if end is not None:
+            lf = lf.filter(pl.col('timestamp') < end)
+        return lf
+
+    def export_csv(self, output_file: str = 'goldsky/orderFilled.csv') -> int:
+        """Export the store in the legacy orderFilled.csv layout"""
+        self.scan().select(CSV_COLUMNS).sink_csv(output_file)
+        return self.rows
+
+    def summary(self) -> str:
+        total_bytes = sum(seg['bytes'] for seg in self.segments)
+        latest = self.latest_timestamp()
+        readable = datetime.fromtimestamp(latest, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC') if latest else 'n/a'
+        return (f"{self.rows:,} events in {len(self.segments)} segments "
+                f"({total_bytes / 1e6:.1f} MB), latest {readable}")
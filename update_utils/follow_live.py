@@ -0,0 +1,176 @@
+"""
+Continuous tail-follow ingestion: Goldsky → raw store → processed trades.
+
+Instead of running update_goldsky() to completion and then re-reading the
+raw file in process_live(), follow() keeps one client open, polls the
+subgraph from the saved cursor and hands each batch of new fills straight to
+get_processed_df() in memory. Raw rows are committed first and processed rows
+second, each with its own state file, so a restart (of follow or of the batch
+pipeline) picks up exactly where the other left off.
+
+The poll interval adapts: it resets to `min_interval` whenever a poll finds
+new fills and doubles (up to `max_interval`) while the subgraph is idle.
+
+New fills are committed once `batch_rows` are pending or the oldest has
+waited `commit_every` seconds, not on every poll. Each commit of the Parquet
+stores writes at least one segment, so the stores are also compacted every
+`compact_every` seconds.
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+import polars as pl
+
+from update_utils.event_store import CSV_COLUMNS
+from update_utils.goldsky_client import GoldskyClient
+from update_utils.goldsky_decode import decode_events
+from update_utils.goldsky_pager import PagerStats, iter_pages, MAX_PAGE_SIZE
+from update_utils.ingest_state import read_state, validate_state
+from update_utils.trade_store import TradeStore
+from update_utils.process_live import PROCESSED_FILE, append_processed, load_raw_events, process_live
+from update_utils.update_goldsky import RawEventWriter, get_resume_cursor
+from update_utils.update_markets import update_markets
+from update_utils.unresolved_trades import resolve_unresolved
+
+# New fills accumulated before they are committed and processed mid-poll
+DEFAULT_BATCH_ROWS = 50_000
+
+# Seconds a fetched fill may wait before it is committed and processed
+DEFAULT_COMMIT_EVERY = 60.0
+
+# Seconds between compactions of the Parquet event and trade stores
+DEFAULT_COMPACT_EVERY = 3600.0
+
+
+def _processed_position(source, store=None):
+    """(raw_rows, row_count) already covered by processed/trades.csv or the trade store"""
+    if store is not None:
+        state, row_count = store.position, store.rows
+    else:
+        state = validate_state(PROCESSED_FILE, read_state(PROCESSED_FILE))
+        row_count = state.get('row_count') if state else None
+    if state and state.get('source', 'csv') == source:
+        return state['raw_rows'], row_count
+    # process_live() just caught up, so every raw row is processed
+    raw_rows = load_raw_events(source).select(pl.len()).collect().item()
+    return raw_rows, store.rows if store is not None else None
+
+
+def follow(output_format='csv', min_interval=2.0, max_interval=60.0, markets_every=600,
+           at_once=MAX_PAGE_SIZE, batch_rows=DEFAULT_BATCH_ROWS, max_polls=None, trades_format='csv',
+           commit_every=DEFAULT_COMMIT_EVERY, compact_every=DEFAULT_COMPACT_EVERY):
+    """
+    Poll Goldsky continuously and process new fills in memory
+
+    Args:
+        output_format: Raw store to append to ('csv' or 'parquet')
+        min_interval: Seconds between polls while fills are arriving
+        max_interval: Upper bound for the idle back-off
+        markets_every: Seconds between update_markets() refreshes, each followed by a
+            resolve_unresolved() pass (0 disables)
+        at_once: Page size for each GraphQL request
+        batch_rows: Commit and process once this many new fills are pending
+        max_polls: Stop after this many polls (None = run until interrupted)
+        trades_format: Processed trades storage ('csv' or 'parquet', see process_live)
+        commit_every: Commit and process pending fills once the oldest has waited this long
+            (0 = after every poll)
+        compact_every: Seconds between compactions of the Parquet stores (0 disables)
+    """
+    print("=" * 60)
+    print("📡 Following Goldsky orderFilledEvents")
+    print("=" * 60)
+
+    # Bring the processed trades level with the raw store once; from then on
+    # both advance together in memory
+    process_live(source=output_format, trades_format=trades_format)
+    store = TradeStore() if trades_format == 'parquet' else None
+    processed = store.root if store is not None else PROCESSED_FILE
+    raw_rows, row_count = _processed_position(output_format, store)
+
+    writer = RawEventWriter(output_format)
+    cursor = get_resume_cursor(output_format)
+    stats = PagerStats()
+    interval = min_interval
+    last_markets = time.time() if markets_every else None
+    last_compact = time.time()
+    polls = 0
+    pending = []
+    pending_since = None
+
+    def commit():
+        nonlocal raw_rows, row_count, pending_since
+        pending_since = None
+        if not pending:
+            return 0
+        # Raw rows must be durable before processed rows refer to them
+        writer.commit()
+        df = pl.concat(pending).select(CSV_COLUMNS).with_columns(
+            pl.from_epoch(pl.col('timestamp'), time_unit='s').alias('timestamp')
+        )
+        # The committed raw CSV ends exactly at this batch, so its size is the next read offset
+        raw_offset = os.path.getsize(writer.output_file) if output_format == 'csv' else None
+        row_count = append_processed(df, source=output_format, start_row=raw_rows, row_count=row_count,
+                                     raw_offset=raw_offset, store=store)
+        raw_rows += len(df)
+        pending.clear()
+        return len(df)
+
+    def compact():
+        removed = 0
+        for target in (writer.store, store):
+            if target is not None:
+                removed += target.compact()
+        if removed:
+            print(f"🗜  Compacted {removed:,} small segments")
+
+    try:
+        with GoldskyClient() as client:
+            while max_polls is None or polls < max_polls:
+                polls += 1
+                if markets_every and time.time() - last_markets >= markets_every:
+                    update_markets()
+                    # New markets may resolve fills written without one
+                    resolve_unresolved(processed)
+                    last_markets = time.time()
+
+                new_rows = 0
+                committed = 0
+                for records, cursor in iter_pages(client, cursor, at_once, stats=stats):
+                    new = writer.write(decode_events(records), cursor)
+                    if len(new):
+                        pending.append(new)
+                        new_rows += len(new)
+                        pending_since = pending_since or time.time()
+                    if sum(len(df) for df in pending) >= batch_rows:
+                        committed += commit()
+                if pending and time.time() - pending_since >= commit_every:
+                    committed += commit()
+                if compact_every and not pending and time.time() - last_compact >= compact_every:
+                    compact()
+                    last_compact = time.time()
+
+                interval = min_interval if new_rows else min(max_interval, interval * 2)
+                now = datetime.now(tz=timezone.utc).strftime('%H:%M:%S UTC')
+                print(f"[{now}] Poll {polls}: {new_rows:,} new fills ({committed:,} committed), "
+                      f"cursor {cursor.timestamp}, next poll in {interval:.0f}s")
+
+                if max_polls is None or polls < max_polls:
+                    time.sleep(interval)
+        commit()
+    except KeyboardInterrupt:
+        # Fills not yet processed are picked up by process_live() on the next start
+        print("\n⏹  Stopping follow mode")
+    finally:
+        writer.close()
+
+    print(f"Pagination: {stats.summary()}")
+    if writer.duplicates:
+        print(f"Skipped {writer.duplicates:,} events already stored")
+    print("=" * 60)
+    print("✅ Follow mode stopped")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    follow()
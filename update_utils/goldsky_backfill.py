@@ -0,0 +1,201 @@
+"""
+Parallel, time-sharded backfill of Goldsky orderFilled events.
+
+The [start, end) timestamp range is split into shards. Each shard is fetched
+by a worker thread with its own cursor, written to its own staging event
+store under goldsky/backfill/, and checkpointed so an interrupted backfill
+resumes per shard. Once every shard is complete the staging stores are
+merged into the main event store in timestamp order, and the store's scrape
+cursor is moved past the merged events so the next incremental scrape does
+not page through the backfilled range again.
+"""
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+from update_utils.event_store import EventStore, EVENT_SCHEMA, EVENTS_DIR
+from update_utils.goldsky_decode import decode_events
+from update_utils.ingest_state import write_json_atomic
+from update_utils.goldsky_pager import KeysetCursor, PagerStats, iter_pages, MAX_PAGE_SIZE
+from update_utils.goldsky_client import GoldskyClient, QUERY_URL
+
+BACKFILL_DIR = 'goldsky/backfill'
+
+# Smaller segments for staging stores so checkpoints advance often
+SHARD_SEGMENT_ROWS = 50_000
+
+
+def split_range(start: int, end: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [start, end) into contiguous, non-overlapping shard ranges"""
+    if end <= start:
+        raise ValueError(f"Empty backfill range: [{start}, {end})")
+    shards = max(1, min(shards, end - start))
+    step = (end - start) // shards
+    bounds = [start + i * step for i in range(shards)] + [end]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards)]
+
+
+def _fmt(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+
+class ShardCheckpoint:
+    """JSON checkpoint for a single shard: its range, cursor, row count and status"""
+
+    def __init__(self, shard_dir: str, start: int, end: int):
+        self.path = os.path.join(shard_dir, 'checkpoint.json')
+        self.data = {
+            'start': start,
+            'end': end,
+            'cursor': KeysetCursor(start - 1).to_dict(),
+            'rows': 0,
+            'done': False,
+        }
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+            if (saved.get('start'), saved.get('end')) != (start, end):
+                raise ValueError(f"Checkpoint {self.path} covers a different range; clear {BACKFILL_DIR} first")
+            self.data = saved
+
+    def save(self) -> None:
+        write_json_atomic(self.path, self.data)
+
+
+def fetch_shard(client: GoldskyClient, index: int, start: int, end: int, at_once: int = MAX_PAGE_SIZE) -> Dict:
+    """Fetch every event with start <= timestamp < end into the shard's staging store"""
+    shard_dir = os.path.join(BACKFILL_DIR, f"shard_{index:04d}")
+    store = EventStore(root=os.path.join(shard_dir, 'events'), segment_rows=SHARD_SEGMENT_ROWS)
+    checkpoint = ShardCheckpoint(shard_dir, start, end)
+
+    if checkpoint.data['done']:
+        return checkpoint.data
+
+    # The checkpoint only advances when a segment is flushed, so it never
+    # points past durable data
+    cursor = KeysetCursor.from_dict(checkpoint.data['cursor'])
+    stats = PagerStats()
+
+    for records, cursor in iter_pages(client, cursor, at_once, end=end, stats=stats):
+        store.append(decode_events(records), cursor=cursor.to_dict())
+
+        if store.rows > checkpoint.data['rows']:
+            checkpoint.data.update(cursor=store.manifest['cursor'], rows=store.rows)
+            checkpoint.save()
+
+    store.close()
+    checkpoint.data.update(cursor=store.manifest.get('cursor', checkpoint.data['cursor']), rows=store.rows, done=True)
+    checkpoint.save()
+    print(f"[shard {index}] Done: {store.rows:,} events in [{_fmt(start)}, {_fmt(end)}) - {stats.summary()}")
+    return checkpoint.data
+
+
+def _is_after(cursor: Dict, timestamp: int, event_id: str) -> bool:
+    """Whether event (timestamp, id) lies past a saved KeysetCursor"""
+    if timestamp != cursor['timestamp']:
+        return timestamp > cursor['timestamp']
+    return cursor.get('id') is not None and event_id > cursor['id']
+
+
+def merge_shards(ranges: List[Tuple[int, int]], root: str = EVENTS_DIR) -> int:
+    """
+    Append completed shard stores to the main event store in timestamp order, skipping known ids
+
+    The store's cursor moves to the last merged (timestamp, id) if that is
+    past the saved one and the merged range starts no later than the
+    scraper's resume point. A range that leaves a gap after the store's data
+    keeps the cursor before the gap, so the next incremental run fetches the
+    gap (and skips the merged events as known ids).
+    """
+    target = EventStore(root=root, dedup=True)
+    cursor = target.manifest.get('cursor')
+    if cursor is None and target.rows:
+        # The scraper would resume from the latest timestamp, which the merge is about to move
+        cursor = KeysetCursor(target.latest_timestamp()).to_dict()
+    start = min(s for s, _ in ranges)
+    contiguous = cursor is None or start <= cursor['timestamp'] + 1
+    merged = 0
+    skipped = 0
+    last = None
+    for index, _ in sorted(enumerate(ranges), key=lambda item: item[1][0]):
+        shard_store = EventStore(root=os.path.join(BACKFILL_DIR, f"shard_{index:04d}", 'events'))
+        for path in shard_store.segment_paths():
+            df = pl.read_parquet(path)
+            kept = len(target.append(df))
+            merged += kept
+            skipped += len(df) - kept
+            if len(df):
+                # Segments are sorted by (timestamp, id)
+                last = max(last or (0, ''), tuple(df.select('timestamp', 'id').row(-1)))
+    if not contiguous:
+        print(f"Backfill starts at {_fmt(start)}, after the resume point {_fmt(cursor['timestamp'])}; "
+              f"keeping the cursor so the gap is scraped next")
+        target.append(pl.DataFrame(schema=EVENT_SCHEMA), cursor=cursor)
+    elif last is not None and (cursor is None or _is_after(cursor, *last)):
+        target.append(pl.DataFrame(schema=EVENT_SCHEMA), cursor=KeysetCursor(*last).to_dict())
+    target.close()
+    if skipped:
+        print(f"Skipped {skipped:,} events already in {root}")
+    return merged
+
+
+def backfill(start: int = 0, end: Optional[int] = None, workers: int = 8,
+             shards: Optional[int] = None, at_once: int = MAX_PAGE_SIZE, root: str = EVENTS_DIR,
+             url: str = QUERY_URL) -> int:
+    """
+    Backfill orderFilled events for [start, end) into the event store
+
+    Args:
+        start: First timestamp (inclusive)
+        end: Last timestamp (exclusive), defaults to now
+        workers: Number of concurrent fetch workers
+        shards: Number of time shards, defaults to 4x workers so that
+                dense periods do not leave the other workers idle
+        at_once: Page size for each GraphQL request
+        root: Target event store directory
+        url: Subgraph endpoint
+
+    Returns:
+        Number of events merged into the event store
+    """
+    end = end if end is not None else int(time.time())
+    shards = shards or workers * 4
+
+    target = EventStore(root=root)
+    if target.rows and target.latest_timestamp() >= start:
+        raise ValueError(
+            f"Event store already has data up to {_fmt(target.latest_timestamp())}; "
+            f"backfill start must be later or target a fresh store"
+        )
+
+    ranges = split_range(start, end, shards)
+
+    print(f"\n{'='*50}")
+    print(f"Backfilling orderFilledEvents [{_fmt(start)}, {_fmt(end)})")
+    print(f"Shards: {len(ranges)}, workers: {workers}")
+    print(f"{'='*50}")
+
+    started = time.time()
+    total_rows = 0
+    # One pooled client shared by all workers: one keep-alive connection each
+    with GoldskyClient(url, pool_size=workers) as client, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_shard, client, i, s, e, at_once): i for i, (s, e) in enumerate(ranges)}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            total_rows += result['rows']
+            elapsed = time.time() - started
+            print(f"Shards complete: {done}/{len(ranges)}, events: {total_rows:,} "
+                  f"({total_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    print(f"\nMerging {len(ranges)} shards into {root}...")
+    merged = merge_shards(ranges, root=root)
+    shutil.rmtree(BACKFILL_DIR, ignore_errors=True)
+
+    print(f"Backfill complete: {merged:,} events in {time.time() - started:.0f}s")
+    print(f"Event store: {EventStore(root=root).summary()}")
+    return merged
@@ -0,0 +1,151 @@
+"""
+Persistent HTTP clients for the Goldsky orderbook subgraph.
+
+GoldskyClient keeps one requests.Session (keep-alive, gzip, connection pool)
+for the lifetime of a scrape instead of building a new transport per page.
+AsyncGoldskyClient is the aiohttp equivalent used by the pipelined scraper,
+which fetches page k+1 while page k is decoded and written. Both are paced
+by the shared 'goldsky' RateController.
+
+aiohttp is optional (`pip install poly-data[async]`); only the async client
+needs it.
+"""
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from poly_utils.rate_control import RETRY_STATUSES, RateController, get_controller, parse_retry_after
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+QUERY_URL = "https://api.goldsky.com/api/public/project_cl6mb8i9h0003e201j6li0diw/subgraphs/orderbook-subgraph/0.0.1/gn"
+
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+
+class GoldskyQueryError(Exception):
+    """The subgraph answered with GraphQL errors"""
+
+
+class GoldskyRateLimited(GoldskyQueryError):
+    """The subgraph answered 429; the controller has already scheduled the pause"""
+
+
+def _unwrap(payload: Dict) -> Dict:
+    if payload.get('errors'):
+        raise GoldskyQueryError(payload['errors'])
+    return payload['data']
+
+
+def _count_rows(data: Dict) -> int:
+    return sum(len(v) for v in data.values() if isinstance(v, list))
+
+
+class GoldskyClient:
+    """Pooled, keep-alive GraphQL client; thread-safe for concurrent shard workers"""
+
+    def __init__(self, url: str = QUERY_URL, pool_size: int = 8, timeout: float = 30,
+                 rate: Optional[RateController] = None):
+        self.url = url
+        self.timeout = timeout
+        self.rate = rate or get_controller('goldsky')
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def execute(self, query: str) -> Dict:
+        """Run one query and return its `data` object"""
+        response = self.rate.request('POST', self.url, session=self.session,
+                                     json={'query': query}, timeout=self.timeout)
+        response.raise_for_status()
+        data = _unwrap(response.json())
+        self.rate.record_rows(_count_rows(data))
+        return data
+
+    def execute_with_retry(self, query: str) -> Dict:
+        """Run a query, retrying until it succeeds"""
+        while True:
+            try:
+                return self.execute(query)
+            except Exception as e:
+                delay = self.rate.on_error()
+                print(f"Query error: {e}")
+                print(f"Retrying in {delay:.1f} seconds...")
+
+    # iter_pages() takes any callable query → data
+    __call__ = execute_with_retry
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncGoldskyClient:
+    """aiohttp-based client sharing one connection pool across in-flight requests"""
+
+    def __init__(self, url: str = QUERY_URL, pool_size: int = 8, timeout: float = 30,
+                 rate: Optional[RateController] = None):
+        if aiohttp is None:
+            raise ImportError("AsyncGoldskyClient requires aiohttp: pip install 'poly-data[async]'")
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate = rate or get_controller('goldsky')
+        self.session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            auto_decompress=True,
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def execute(self, query: str) -> Dict:
+        async with self.rate.slot_async():
+            async with self.session.post(self.url, json={'query': query}) as response:
+                if response.status == 429:
+                    delay = self.rate.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+                    raise GoldskyRateLimited(f"Rate limited (429), backing off {delay:.1f}s")
+                if response.status in RETRY_STATUSES:
+                    raise GoldskyQueryError(f"Server error ({response.status})")
+                response.raise_for_status()
+                data = _unwrap(await response.json())
+
+        self.rate.on_success(_count_rows(data))
+        return data
+
+    async def execute_with_retry(self, query: str) -> Dict:
+        while True:
+            try:
+                return await self.execute(query)
+            except GoldskyRateLimited as e:
+                # The pause is enforced by the controller on the next attempt
+                print(f"Query error: {e}")
+            except Exception as e:
+                delay = self.rate.on_error()
+                print(f"Query error: {e}")
+                print(f"Retrying in {delay:.1f} seconds...")
+
+    __call__ = execute_with_retry
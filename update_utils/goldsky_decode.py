@@ -0,0 +1,35 @@
+"""
+Columnar decoding of Goldsky orderFilledEvents pages.
+
+A page arrives as a list of JSON objects whose values are all strings.
+Instead of flattening each record and building a pandas frame, each target
+column is pulled out in a single list comprehension and handed to polars,
+which casts it to the event schema. Sorting and deduplication then run
+vectorized on those columns.
+"""
+from typing import Dict, List
+
+import polars as pl
+
+from update_utils.event_store import EVENT_SCHEMA
+
+# Columns as delivered by the subgraph, before casting
+_RAW_SCHEMA = {name: pl.Utf8 for name in EVENT_SCHEMA}
+
+
+def decode_events(records: List[Dict]) -> pl.DataFrame:
+    """
+    Decode one page of orderFilledEvents into a typed, sorted, deduplicated frame
+
+    Fields not in EVENT_SCHEMA (fee, orderHash) are never materialized.
+    """
+    if not records:
+        return pl.DataFrame(schema=EVENT_SCHEMA)
+
+    columns = {name: [r.get(name) for r in records] for name in _RAW_SCHEMA}
+    return (
+        pl.DataFrame(columns, schema=_RAW_SCHEMA)
+        .cast(EVENT_SCHEMA, strict=True)
+        .sort(['timestamp', 'id'])
+        .unique(subset=['id'], keep='first', maintain_order=True)
+    )
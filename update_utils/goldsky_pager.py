@@ -0,0 +1,230 @@
+"""
+Lossless keyset pagination over Goldsky orderFilledEvents.
+
+Paging on `timestamp_gt` alone skips rows whenever a page boundary falls
+inside a second that holds more fills than fit on the page. The pager keeps
+a composite (timestamp, id) cursor instead:
+
+- Normal pages are ordered by timestamp. When a page is full, the rows of
+  its last timestamp may be incomplete, so they are held back and that
+  timestamp is drained separately.
+- Drain pages select a single timestamp ordered by id (`id_gt` cursor),
+  which is a total order, so nothing is dropped or fetched twice.
+
+Every yielded page comes with the cursor that is safe to persist once the
+page has been committed.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+# graph-node caps `first` at 1000 by default
+MAX_PAGE_SIZE = 1000
+
+ORDER_FILLED_FIELDS = '''
+                            fee
+                            id
+                            maker
+                            makerAmountFilled
+                            makerAssetId
+                            orderHash
+                            taker
+                            takerAmountFilled
+                            takerAssetId
+                            timestamp
+                            transactionHash'''
+
+
+@dataclass
+class KeysetCursor:
+    """
+    Position in the (timestamp, id) ordering of orderFilledEvents
+
+    id=None means every event at `timestamp` has been consumed; an id
+    string means events at `timestamp` up to and including that id have
+    been consumed ('' = none of them yet).
+    """
+    timestamp: int
+    id: Optional[str] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.id is not None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'KeysetCursor':
+        return cls(timestamp=int(data['timestamp']), id=data.get('id'))
+
+
+def build_keyset_query(cursor: KeysetCursor, page_size: int = MAX_PAGE_SIZE, end: Optional[int] = None) -> str:
+    """GraphQL query for the page following `cursor`, bounded by timestamp < end"""
+    if cursor.draining:
+        order = 'orderBy: id orderDirection: asc'
+        where = f'timestamp: "{cursor.timestamp}" id_gt: "{cursor.id}"'
+    else:
+        order = 'orderBy: timestamp orderDirection: asc'
+        where = f'timestamp_gt: "{cursor.timestamp}"'
+        if end is not None:
+            where += f' timestamp_lt: "{end}"'
+
+    return '''query MyQuery {
+                        orderFilledEvents(''' + order + '''
+                                             first: ''' + str(page_size) + '''
+                                             where: {''' + where + '''}) {''' + ORDER_FILLED_FIELDS + '''
+                        }
+                    }
+                '''
+
+
+class PagerStats:
+    """Per-page fetch timings for tuning page size"""
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.fetch_seconds = 0.0
+        self.started = time.time()
+        self.last_page_rows = 0
+        self.last_page_seconds = 0.0
+
+    def record(self, rows: int, seconds: float) -> None:
+        self.pages += 1
+        self.rows += rows
+        self.fetch_seconds += seconds
+        self.last_page_rows = rows
+        self.last_page_seconds = seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        """Rows fetched per second of wall time since the pager started"""
+        elapsed = time.time() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def fetch_rows_per_second(self) -> float:
+        """Rows fetched per second spent waiting on the subgraph"""
+        return self.rows / self.fetch_seconds if self.fetch_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        avg_latency = self.fetch_seconds / self.pages if self.pages else 0.0
+        return (f"{self.rows:,} rows in {self.pages:,} pages, "
+                f"{self.rows_per_second:,.0f} rows/s overall, "
+                f"{self.fetch_rows_per_second:,.0f} rows/s fetching, "
+                f"{avg_latency * 1000:.0f} ms/page")
+
+
+def split_page(records: List[Dict], cursor: KeysetCursor, page_size: int) -> Tuple[List[Dict], KeysetCursor]:
+    """
+    Decide which rows of a fetched page are final and where to continue
+
+    Returns:
+        (rows to commit, cursor after those rows)
+    """
+    full = len(records) >= page_size
+
+    if cursor.draining:
+        if not records:
+            return [], KeysetCursor(cursor.timestamp)
+        last_id = max(r['id'] for r in records)
+        if full:
+            return records, KeysetCursor(cursor.timestamp, last_id)
+        # Timestamp fully drained
+        return records, KeysetCursor(cursor.timestamp)
+
+    if not records:
+        return [], cursor
+
+    last_ts = max(int(r['timestamp']) for r in records)
+    if not full:
+        # End of available data: remember the last id so a later run can
+        # still pick up late events at the same timestamp
+        last_id = max(r['id'] for r in records if int(r['timestamp']) == last_ts)
+        return records, KeysetCursor(last_ts, last_id)
+
+    # Full page: rows at last_ts may continue on the next page, so hold
+    # them back and drain that timestamp by id
+    complete = [r for r in records if int(r['timestamp']) < last_ts]
+    return complete, KeysetCursor(last_ts, '')
+
+
+def iter_pages(fetch: Callable[[str], Dict], cursor: KeysetCursor, page_size: int = MAX_PAGE_SIZE,
+               end: Optional[int] = None, stats: Optional[PagerStats] = None
+               ) -> Iterator[Tuple[List[Dict], KeysetCursor]]:
+    """
+    Yield (records, cursor) pages until the subgraph has nothing newer
+
+    Args:
+        fetch: Executes a query string and returns the GraphQL result dict
+        cursor: Position to continue after
+        page_size: Rows per request (at most MAX_PAGE_SIZE)
+        end: Optional exclusive upper timestamp bound
+        stats: Optional PagerStats updated after every request
+    """
+    if page_size > MAX_PAGE_SIZE:
+        raise ValueError(f"page_size {page_size} exceeds subgraph maximum {MAX_PAGE_SIZE}")
+
+    while True:
+        query = build_keyset_query(cursor, page_size, end)
+        started = time.time()
+        records = fetch(query)['orderFilledEvents'] or []
+        if stats is not None:
+            stats.record(len(records), time.time() - started)
+
+        was_draining = cursor.draining
+        rows, cursor = split_page(records, cursor, page_size)
+        if rows or cursor.draining:
+            yield rows, cursor
+
+        # A finished drain continues with the next timestamps
+        if was_draining:
+            continue
+        if len(records) < page_size:
+            return
+
+
+async def pipelined_pages(fetch: Callable[[str], Awaitable[Dict]], cursor: KeysetCursor,
+                          on_page: Callable[[List[Dict], KeysetCursor], None],
+                          page_size: int = MAX_PAGE_SIZE, end: Optional[int] = None,
+                          stats: Optional[PagerStats] = None) -> KeysetCursor:
+    """
+    Async counterpart of iter_pages that overlaps fetching with persisting
+
+    The next cursor is known as soon as a page arrives, so the request for
+    page k+1 is started before on_page(records, cursor) decodes and writes
+    page k in a worker thread. Pages are still committed strictly in order.
+
+    Returns:
+        Cursor after the last committed page
+    """
+    if page_size > MAX_PAGE_SIZE:
+        raise ValueError(f"page_size {page_size} exceeds subgraph maximum {MAX_PAGE_SIZE}")
+
+    loop = asyncio.get_running_loop()
+
+    def request(c: KeysetCursor):
+        return asyncio.ensure_future(fetch(build_keyset_query(c, page_size, end))), time.time()
+
+    committed = cursor
+    pending, started = request(cursor)
+    while pending is not None:
+        records = (await pending)['orderFilledEvents'] or []
+        if stats is not None:
+            stats.record(len(records), time.time() - started)
+
+        was_draining = cursor.draining
+        rows, next_cursor = split_page(records, cursor, page_size)
+        finished = not was_draining and len(records) < page_size
+
+        # Prefetch the next page before handing this one off
+        pending, started = (None, None) if finished else request(next_cursor)
+
+        if rows or next_cursor.draining:
+            await loop.run_in_executor(None, on_page, rows, next_cursor)
+            committed = next_cursor
+        cursor = next_cursor
+
+    return committed
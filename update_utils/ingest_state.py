@@ -0,0 +1,115 @@
+"""
+Atomic sidecar state files for incremental pipeline stages.
+
+Each append-only output (goldsky/orderFilled.csv, processed/trades.csv, ...)
+gets a small JSON file next to it that is rewritten after every committed
+batch, so a stage can find where to resume without reading the data file:
+
+    goldsky/orderFilled.csv  →  goldsky/orderFilled.state.json
+
+Byte offsets recorded in the state double as a crash check: if the data
+file is longer than the recorded offset, the tail was written by a batch
+whose state update never landed and can be truncated away.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+# Re-exported: the pipeline stages import it from here
+from poly_utils.file_io import write_json_atomic
+
+
+def state_path(data_file: str) -> str:
+    """Sidecar state path for a data file"""
+    base, _ = os.path.splitext(data_file)
+    return f"{base}.state.json"
+
+
+def count_lines(path: str, chunk_size: int = 64 << 20) -> Tuple[int, int]:
+    """
+    Count the newline-terminated lines of a file in fixed-size chunks
+
+    Returns:
+        (complete lines, byte offset just past the last one)
+    """
+    lines, end, base = 0, 0, 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            newlines = chunk.count(b'\n')
+            if newlines:
+                lines += newlines
+                end = base + chunk.rfind(b'\n') + 1
+            base += len(chunk)
+    return lines, end
+
+
+def read_state(data_file: str) -> Optional[Dict[str, Any]]:
+    """Load the sidecar state for a data file, or None if there is none"""
+    path = state_path(data_file)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable state file {path}: {e}")
+        return None
+
+
+def write_state(data_file: str, **fields: Any) -> Dict[str, Any]:
+    """Record a committed batch; byte_offset defaults to the data file's current size"""
+    state = dict(fields)
+    if 'byte_offset' not in state and os.path.isfile(data_file):
+        state['byte_offset'] = os.path.getsize(data_file)
+    state['updated_at'] = datetime.now(timezone.utc).isoformat()
+    write_json_atomic(state_path(data_file), state)
+    return state
+
+
+def validate_state(data_file: str, state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Check a state against its data file and repair an interrupted append
+
+    Returns:
+        The state if it can be trusted, else None (caller falls back to probing)
+    """
+    if not state or 'byte_offset' not in state or not os.path.isfile(data_file):
+        return None
+
+    size = os.path.getsize(data_file)
+    offset = state['byte_offset']
+    if size < offset:
+        print(f"State for {data_file} expects {offset:,} bytes but file has {size:,} - ignoring state")
+        return None
+    if size > offset:
+        print(f"Truncating {size - offset:,} uncommitted bytes from {data_file}")
+        with open(data_file, 'r+b') as f:
+            f.truncate(offset)
+    return state
+
+
+def read_last_line(path: str, chunk_size: int = 64 * 1024) -> str:
+    """Last non-empty line of a text file, read backwards from the end"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        pos = end
+        while pos > 0:
+            read = min(chunk_size, pos)
+            pos -= read
+            f.seek(pos)
+            data = f.read(read) + data
+            lines = data.rstrip(b'\r\n').split(b'\n')
+            if len(lines) > 1 or pos == 0:
+                return lines[-1].decode('utf-8').rstrip('\r')
+    return ''
+
+
+def read_first_line(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline().rstrip('\r\n')
@@ -0,0 +1,358 @@
+"""
+Keyed, refreshable market catalog.
+
+markets.csv is append-only: `volume`, `closedTime` and the open/closed flags
+are frozen at the first fetch. The catalog keeps one current row per market
+`id` in a Parquet table and refreshes it incrementally:
+
+    catalog/
+        _manifest.json                 # rows, refresh history, change segments
+        markets.parquet                # one row per market id, sorted by createdAt
+        changes/changes-000000.parquet # (id, field, old, new, changed_at) per refresh
+
+refresh_catalog() only re-pulls markets whose data can still change: every
+open market, markets that ended within `lookback_days`, and markets the
+catalog still has as open that the API no longer lists as open. Fetched rows
+are upserted by id and every changed field is recorded in the change log.
+Each row's `checked_at` records its last lookup, so markets the API stops
+returning are re-checked once per `recheck_hours` rather than on every run.
+
+The catalog is standalone: markets.csv, get_markets() and the token index do
+not read it. Read `MarketCatalog().df` for current volumes and close times.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import polars as pl
+
+from poly_utils.rate_control import get_controller
+from update_utils.ingest_state import write_json_atomic
+from poly_utils.gamma_decode import decode_markets
+from update_utils.update_markets import fetch_markets_window
+
+CATALOG_DIR = 'catalog'
+MANIFEST_NAME = '_manifest.json'
+TABLE_NAME = 'markets.parquet'
+CHANGES_DIR = 'changes'
+CATALOG_VERSION = 1
+
+CATALOG_SCHEMA = {
+    'createdAt': pl.Utf8,
+    'id': pl.Utf8,
+    'question': pl.Utf8,
+    'answer1': pl.Utf8,
+    'answer2': pl.Utf8,
+    'neg_risk': pl.Boolean,
+    'market_slug': pl.Utf8,
+    'token1': pl.Utf8,
+    'token2': pl.Utf8,
+    'condition_id': pl.Utf8,
+    'volume': pl.Float64,
+    'ticker': pl.Utf8,
+    'closedTime': pl.Utf8,
+    'active': pl.Boolean,
+    'closed': pl.Boolean,
+    'end_date': pl.Utf8,
+    'refreshed_at': pl.Utf8,
+    'checked_at': pl.Utf8,
+}
+
+CHANGE_SCHEMA = {
+    'id': pl.Utf8,
+    'field': pl.Utf8,
+    'old': pl.Utf8,
+    'new': pl.Utf8,
+    'changed_at': pl.Utf8,
+}
+
+# Fields compared on upsert; the refresh timestamps change on every refresh by design
+TRACKED_FIELDS = [c for c in CATALOG_SCHEMA if c not in ('id', 'refreshed_at', 'checked_at')]
+
+# Markets requested per `id=` lookup
+ID_CHUNK = 100
+
+
+def markets_to_frame(markets: List[Dict], refreshed_at: Optional[str] = None) -> pl.DataFrame:
+    """Gamma market payloads as catalog rows, decoded in one pass"""
+    return decode_markets(markets).with_columns(
+        pl.col('closedTime').replace('', None),
+        pl.col('volume').cast(pl.Float64, strict=False),
+        pl.lit(refreshed_at, dtype=pl.Utf8).alias('refreshed_at'),
+        pl.lit(refreshed_at, dtype=pl.Utf8).alias('checked_at'),
+    ).select(list(CATALOG_SCHEMA))
+
+
+def market_to_record(market: Dict, refreshed_at: Optional[str] = None) -> Dict:
+    """One Gamma market as a catalog row"""
+    return markets_to_frame([market], refreshed_at).row(0, named=True)
+
+
+def records_to_frame(records: List[Dict]) -> pl.DataFrame:
+    if not records:
+        return pl.DataFrame(schema=CATALOG_SCHEMA)
+    return pl.DataFrame(records, schema=CATALOG_SCHEMA, strict=False)
+
+
+class MarketCatalog:
+    """One current row per market id, upserted from Gamma API payloads"""
+
+    def __init__(self, root: str = CATALOG_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.table_path = os.path.join(root, TABLE_NAME)
+        os.makedirs(os.path.join(root, CHANGES_DIR), exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._df: Optional[pl.DataFrame] = None
+
+    def _load_manifest(self) -> Dict:
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {
+            'version': CATALOG_VERSION,
+            'schema': {name: str(dtype) for name, dtype in CATALOG_SCHEMA.items()},
+            'rows': 0,
+            'updated_at': None,
+            'change_segments': [],
+            'refreshes': [],
+        }
+
+    @property
+    def rows(self) -> int:
+        return self.manifest['rows']
+
+    @property
+    def df(self) -> pl.DataFrame:
+        """The whole catalog, loaded on first use"""
+        if self._df is None:
+            if os.path.isfile(self.table_path):
+                self._df = pl.read_parquet(self.table_path)
+                if 'checked_at' not in self._df.columns:
+                    # Catalogs written before checked_at was tracked
+                    self._df = self._df.with_columns(pl.col('refreshed_at').alias('checked_at'))
+            else:
+                self._df = pl.DataFrame(schema=CATALOG_SCHEMA)
+        return self._df
+
+    def markets_for_tokens(self, token_ids: Iterable[str]) -> pl.DataFrame:
+        """Catalog rows listing any of `token_ids` as token1 or token2"""
+        token_ids = list(token_ids)
+        return self.df.filter(pl.col('token1').is_in(token_ids) | pl.col('token2').is_in(token_ids))
+
+    def scan_changes(self) -> pl.LazyFrame:
+        """Lazy scan over the whole change log"""
+        paths = [os.path.join(self.root, CHANGES_DIR, name) for name in self.manifest['change_segments']]
+        if not paths:
+            return pl.DataFrame(schema=CHANGE_SCHEMA).lazy()
+        return pl.scan_parquet(paths)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def seed(self, markets: pl.DataFrame) -> int:
+        """
+        Load an existing markets.csv-style frame into an empty catalog
+
+        The CSV has no open/closed flags, and its closedTime is the one seen at
+        first fetch, so seeded rows start closed: the next refresh's open
+        listing reopens the markets that are still open, instead of every
+        historical market being looked up by id as a stale open one.
+        """
+        df = markets.with_columns(
+            pl.col('closedTime').cast(pl.Utf8).replace('', None).alias('closedTime'),
+        ).with_columns(
+            pl.lit(True).alias('closed'),
+            pl.lit(None, dtype=pl.Boolean).alias('active'),
+            pl.lit(None, dtype=pl.Utf8).alias('end_date'),
+            pl.lit(None, dtype=pl.Utf8).alias('refreshed_at'),
+            pl.lit(None, dtype=pl.Utf8).alias('checked_at'),
+        )
+        df = df.select([pl.col(name).cast(dtype, strict=False) for name, dtype in CATALOG_SCHEMA.items()])
+        self._write(df.unique(subset=['id'], keep='last').sort(['createdAt', 'id']))
+        return len(df)
+
+    def diff(self, updates: pl.DataFrame, changed_at: str) -> pl.DataFrame:
+        """Field-level changes that upserting `updates` would make to existing rows"""
+        joined = self.df.join(updates, on='id', how='inner', suffix='_new')
+        frames = []
+        for field in TRACKED_FIELDS:
+            old = pl.col(field).cast(pl.Utf8)
+            new = pl.col(f"{field}_new").cast(pl.Utf8)
+            frames.append(
+                joined.filter(old.ne_missing(new)).select(
+                    pl.col('id'),
+                    pl.lit(field).alias('field'),
+                    old.alias('old'),
+                    new.alias('new'),
+                    pl.lit(changed_at).alias('changed_at'),
+                )
+            )
+        return pl.concat(frames) if frames else pl.DataFrame(schema=CHANGE_SCHEMA)
+
+    def upsert(self, updates: pl.DataFrame, changed_at: Optional[str] = None) -> Dict[str, int]:
+        """
+        Insert or replace rows by id and append the changed fields to the change log
+
+        Returns:
+            Counts of inserted rows, updated rows and field changes
+        """
+        changed_at = changed_at or datetime.now(timezone.utc).isoformat()
+        updates = updates.unique(subset=['id'], keep='last')
+        changes = self.diff(updates, changed_at)
+        existing = updates.join(self.df.select('id'), on='id', how='semi')
+
+        merged = pl.concat([self.df.join(updates.select('id'), on='id', how='anti'), updates])
+        self._write(merged.sort(['createdAt', 'id'], nulls_last=True), changes)
+        return {
+            'inserted': len(updates) - len(existing),
+            'updated': changes['id'].n_unique() if len(changes) else 0,
+            'changes': len(changes),
+        }
+
+    def upsert_markets(self, markets: List[Dict], refreshed_at: Optional[str] = None) -> Dict[str, int]:
+        """Upsert raw Gamma market payloads; entries without an id are skipped"""
+        refreshed_at = refreshed_at or datetime.now(timezone.utc).isoformat()
+        updates = markets_to_frame(markets, refreshed_at)
+        result = self.upsert(updates, changed_at=refreshed_at)
+        result['fetched'] = len(updates)
+        return result
+
+    def mark_checked(self, ids: Iterable[str], checked_at: str) -> None:
+        """Record a lookup of `ids` that returned nothing, so they are not re-checked on every refresh"""
+        ids = list(ids)
+        if not ids:
+            return
+        checked = pl.when(pl.col('id').is_in(ids)).then(pl.lit(checked_at)).otherwise(pl.col('checked_at'))
+        self._write(self.df.with_columns(checked.alias('checked_at')))
+
+    def _write(self, df: pl.DataFrame, changes: Optional[pl.DataFrame] = None) -> None:
+        if changes is not None and len(changes):
+            name = f"changes-{len(self.manifest['change_segments']):06d}.parquet"
+            path = os.path.join(self.root, CHANGES_DIR, name)
+            changes.write_parquet(f"{path}.tmp", compression='zstd')
+            os.replace(f"{path}.tmp", path)
+            self.manifest['change_segments'].append(name)
+
+        df.write_parquet(f"{self.table_path}.tmp", compression='zstd', statistics=True)
+        os.replace(f"{self.table_path}.tmp", self.table_path)
+        self._df = df
+        self.manifest['rows'] = len(df)
+        self.manifest['updated_at'] = datetime.now(timezone.utc).isoformat()
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    def record_refresh(self, summary: Dict) -> None:
+        # Keep the manifest small: the last 100 refreshes are enough to spot trends
+        self.manifest['refreshes'] = (self.manifest['refreshes'] + [summary])[-100:]
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    def summary(self) -> str:
+        df = self.df
+        open_markets = df.filter(pl.col('closed').not_()).height if len(df) else 0
+        return (f"{self.rows:,} markets ({open_markets:,} open), "
+                f"{len(self.manifest['change_segments'])} change segments")
+
+
+# ----------------------------------------------------------------------
+# Refresh
+# ----------------------------------------------------------------------
+
+def fetch_all(filters: Dict, batch_size: int = 500, workers: int = 4, rate=None) -> List[Dict]:
+    """All markets matching `filters`, fetching `workers` offset windows per round"""
+    rate = rate or get_controller('gamma')
+    markets = []
+    offset = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            futures = [pool.submit(fetch_markets_window, offset + i * batch_size, batch_size, rate, filters)
+                       for i in range(max(1, workers))]
+            windows = [f.result() for f in futures]
+            for window in windows:
+                markets.extend(window)
+            offset += len(windows) * batch_size
+            if any(len(window) < batch_size for window in windows):
+                return markets
+
+
+def fetch_by_ids(ids: Iterable[str], workers: int = 4, rate=None) -> List[Dict]:
+    """Markets looked up by id, ID_CHUNK ids per request"""
+    rate = rate or get_controller('gamma')
+    ids = list(ids)
+    chunks = [ids[i:i + ID_CHUNK] for i in range(0, len(ids), ID_CHUNK)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        windows = pool.map(lambda chunk: fetch_markets_window(0, len(chunk), rate, {'id': chunk}), chunks)
+        return [market for window in windows for market in window]
+
+
+def refresh_catalog(lookback_days: int = 7, batch_size: int = 500, workers: int = 4,
+                    catalog: Optional[MarketCatalog] = None, recheck_hours: float = 24) -> Dict:
+    """
+    Re-pull open and recently closed markets and upsert them into the catalog
+
+    Args:
+        lookback_days: Also refresh markets whose end date is this recent
+        recheck_hours: Look up a catalog-open market missing from the open list
+            again only once its last check is this old
+        batch_size: Markets per request
+        workers: Concurrent requests (paced by the shared 'gamma' controller)
+        catalog: Catalog to refresh (defaults to catalog/)
+
+    Returns:
+        Refresh summary (requests, fetched, inserted, updated, changes)
+    """
+    catalog = catalog or MarketCatalog()
+    rate = get_controller('gamma')
+    requests_before = rate.stats.requests
+    now = datetime.now(timezone.utc)
+
+    print("=" * 60)
+    print("🔁 Refreshing market catalog")
+    print("=" * 60)
+
+    if catalog.rows == 0 and os.path.exists('markets.csv'):
+        from poly_utils.utils import get_markets
+        seeded = catalog.seed(get_markets())
+        print(f"✓ Seeded catalog with {seeded:,} markets from markets.csv")
+
+    open_markets = fetch_all({'closed': 'false'}, batch_size, workers, rate)
+    print(f"✓ {len(open_markets):,} open markets")
+
+    since = (now - timedelta(days=lookback_days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    recent = fetch_all({'closed': 'true', 'end_date_min': since}, batch_size, workers, rate)
+    print(f"✓ {len(recent):,} markets closed since {since}")
+
+    # Open in the catalog but no longer listed as open: closed or archived since the last refresh
+    seen = {str(m.get('id')) for m in open_markets + recent}
+    recheck_before = (now - timedelta(hours=recheck_hours)).isoformat()
+    stale = catalog.df.filter(
+        pl.col('closed').not_()
+        & ~pl.col('id').is_in(list(seen))
+        & (pl.col('checked_at').is_null() | (pl.col('checked_at') <= recheck_before))
+    )['id'].to_list()
+    looked_up = fetch_by_ids(stale, workers, rate) if stale else []
+    if stale:
+        print(f"✓ Re-checked {len(stale):,} markets that left the open list")
+
+    refreshed_at = now.isoformat()
+    result = catalog.upsert_markets(open_markets + recent + looked_up, refreshed_at)
+    catalog.mark_checked(set(stale) - {str(m.get('id')) for m in looked_up}, refreshed_at)
+    summary = {
+        'at': refreshed_at,
+        'requests': rate.stats.requests - requests_before,
+        'fetched': result.pop('fetched'),
+        **result,
+    }
+    catalog.record_refresh(summary)
+
+    print(f"✓ {summary['requests']:,} requests, {summary['fetched']:,} markets fetched: "
+          f"{summary['inserted']:,} new, {summary['updated']:,} updated ({summary['changes']:,} field changes)")
+    print(f"Catalog: {catalog.summary()}")
+    print("=" * 60)
+    return summary
+
+
+if __name__ == "__main__":
+    refresh_catalog()
@@ -5,115 +5,446 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import io
+import numpy as np
 import polars as pl
-from poly_utils.utils import get_markets, update_missing_tokens
-
-import subprocess
+from poly_utils.token_index import get_token_index
+from update_utils.event_store import EventStore, CSV_COLUMNS, EVENT_SCHEMA
+from update_utils.trade_store import TradeStore
+from update_utils.ingest_state import (
+    count_lines, read_state, write_state, validate_state, read_last_line, state_path,
+)
+from update_utils.unresolved_trades import (
+    enqueue, line_offsets, line_starts, queue_path, recover_patch, resolve_unresolved,
+)
 
 import pandas as pd
 
-def get_processed_df(df):
-    markets_df = get_markets()
-    markets_df = markets_df.rename({'id': 'market_id'})
+TRADE_COLUMNS = ['timestamp', 'market_id', 'maker', 'taker', 'nonusdc_side', 'maker_direction',
+                 'taker_direction', 'price', 'usd_amount', 'token_amount', 'transactionHash']
 
-    # 1) Make markets long: (market_id, side, asset_id) where side ∈ {"token1", "token2"}
-    markets_long = (
-        markets_df
-        .select(["market_id", "token1", "token2"])
-        .melt(id_vars="market_id", value_vars=["token1", "token2"],
-            variable_name="side", value_name="asset_id")
-    )
+# The non-USDC asset of each trade (the one that isn't 0)
+NONUSDC_ASSET = (
+    pl.when(pl.col("makerAssetId") != "0")
+    .then(pl.col("makerAssetId"))
+    .otherwise(pl.col("takerAssetId"))
+    .alias("nonusdc_asset_id")
+)
 
-    # 2) Identify the non-USDC asset for each trade (the one that isn't 0)
-    df = df.with_columns(
-        pl.when(pl.col("makerAssetId") != "0")
-        .then(pl.col("makerAssetId"))
-        .otherwise(pl.col("takerAssetId"))
-        .alias("nonusdc_asset_id")
-    )
 
-    # 3) Join once on that non-USDC asset to recover the market + side ("token1" or "token2")
-    df = df.join(
-        markets_long,
-        left_on="nonusdc_asset_id",
-        right_on="asset_id",
-        how="left",
-    )
+def probe_assets(lf, token_index=None):
+    """
+    Token index rows for the distinct non-USDC assets of raw events
 
-    # 4) label columns and keep market_id
-    df = df.with_columns([
-        pl.when(pl.col("makerAssetId") == "0").then(pl.lit("USDC")).otherwise(pl.col("side")).alias("makerAsset"),
-        pl.when(pl.col("takerAssetId") == "0").then(pl.lit("USDC")).otherwise(pl.col("side")).alias("takerAsset"),
-        pl.col("market_id"),
-    ])
+    Only the distinct asset ids are collected (in the streaming engine), so
+    this stays small however many events lf holds.
 
-    df = df[['timestamp', 'market_id', 'maker', 'makerAsset', 'makerAmountFilled', 'taker', 'takerAsset', 'takerAmountFilled', 'transactionHash']]
+    Args:
+        lf: Raw events (LazyFrame)
+        token_index: TokenIndex to probe (default: get_token_index())
 
-    df = df.with_columns([
-        (pl.col("makerAmountFilled") / 10**6).alias("makerAmountFilled"),
-        (pl.col("takerAmountFilled") / 10**6).alias("takerAmountFilled"),
-    ])
+    Returns:
+        (asset_id, market_id, side) frame for the assets with a known market
+    """
+    # Categorical copies each id once; plain strings would pin every scanned buffer they point into
+    assets = lf.select(NONUSDC_ASSET.cast(pl.Categorical).unique()).collect(engine='streaming')
+    return (token_index or get_token_index()).probe_frame(assets['nonusdc_asset_id'].cast(pl.Utf8))
 
-    df = df.with_columns(
-        pl.when(pl.col("takerAsset") == "USDC")
-        .then(pl.lit("BUY"))
-        .otherwise(pl.lit("SELL"))
-        .alias("taker_direction")
-    )
 
-    df = df.with_columns([
-        pl.when(pl.col("takerAsset") == "USDC")
-        .then(pl.lit("BUY"))
-        .otherwise(pl.lit("SELL"))
-        .alias("taker_direction"),
+def process_trades(lf, keep_columns=(), probe=None):
+    """
+    Lazily turn raw orderFilled events into trades
+
+    A single projection over the events joined to the (small) token index
+    probe, with no intermediate frames, so the streaming engine can sink the
+    result to disk in bounded memory. Row order is preserved.
+
+    Args:
+        lf: Raw events (LazyFrame, orderFilled columns, timestamp as datetime)
+        keep_columns: Extra columns of lf to carry through to the output
+        probe: probe_assets(lf), if already computed
+
+    Returns:
+        LazyFrame with TRADE_COLUMNS + keep_columns
+    """
+    if probe is None:
+        probe = probe_assets(lf)
 
-        # reverse of taker_direction
-        pl.when(pl.col("takerAsset") == "USDC")
-        .then(pl.lit("SELL"))
-        .otherwise(pl.lit("BUY"))
-        .alias("maker_direction"),
-    ])
+    # Join the market + side ("token1" or "token2") of the non-USDC asset, then label both legs
+    lf = lf.with_columns(NONUSDC_ASSET).join(
+        probe.lazy(), left_on="nonusdc_asset_id", right_on="asset_id", how="left", maintain_order="left",
+    ).with_columns(
+        pl.when(pl.col("makerAssetId") == "0").then(pl.lit("USDC")).otherwise(pl.col("side")).alias("makerAsset"),
+        pl.when(pl.col("takerAssetId") == "0").then(pl.lit("USDC")).otherwise(pl.col("side")).alias("takerAsset"),
+        (pl.col("makerAmountFilled") / 10**6).alias("makerAmountFilled"),
+        (pl.col("takerAmountFilled") / 10**6).alias("takerAmountFilled"),
+    )
 
-    df = df.with_columns([
+    taker_buys = pl.col("takerAsset") == "USDC"
+    return lf.select(
+        "timestamp",
+        "market_id",
+        "maker",
+        "taker",
         pl.when(pl.col("makerAsset") != "USDC")
         .then(pl.col("makerAsset"))
         .otherwise(pl.col("takerAsset"))
         .alias("nonusdc_side"),
-
-        pl.when(pl.col("takerAsset") == "USDC")
-        .then(pl.col("takerAmountFilled"))
-        .otherwise(pl.col("makerAmountFilled"))
-        .alias("usd_amount"),
+        # maker_direction is the reverse of taker_direction
+        pl.when(taker_buys).then(pl.lit("SELL")).otherwise(pl.lit("BUY")).alias("maker_direction"),
+        pl.when(taker_buys).then(pl.lit("BUY")).otherwise(pl.lit("SELL")).alias("taker_direction"),
+        pl.when(taker_buys)
+        .then(pl.col("takerAmountFilled") / pl.col("makerAmountFilled"))
+        .otherwise(pl.col("makerAmountFilled") / pl.col("takerAmountFilled"))
+        .cast(pl.Float64)
+        .alias("price"),
+        pl.when(taker_buys).then(pl.col("takerAmountFilled")).otherwise(pl.col("makerAmountFilled")).alias("usd_amount"),
         pl.when(pl.col("takerAsset") != "USDC")
         .then(pl.col("takerAmountFilled"))
         .otherwise(pl.col("makerAmountFilled"))
         .alias("token_amount"),
-        pl.when(pl.col("takerAsset") == "USDC")
-        .then(pl.col("takerAmountFilled") / pl.col("makerAmountFilled"))
-        .otherwise(pl.col("makerAmountFilled") / pl.col("takerAmountFilled"))
-        .cast(pl.Float64)
-        .alias("price")
-    ])
+        "transactionHash",
+        *keep_columns,
+    )
+
 
+def get_processed_df(df, keep_columns=()):
+    """
+    Turn raw orderFilled events into trades
 
-    df = df[['timestamp', 'market_id', 'maker', 'taker', 'nonusdc_side', 'maker_direction', 'taker_direction', 'price', 'usd_amount', 'token_amount', 'transactionHash']]
-    return df
+    Args:
+        df: Raw events (orderFilled columns, timestamp as datetime)
+        keep_columns: Extra columns of df to carry through to the output
+    """
+    return process_trades(df.lazy(), keep_columns).collect()
+
+
+def sink_processed(lf, output_file):
+    """
+    Stream trades to a CSV or Parquet file (by extension) in bounded memory
+
+    Written to a temporary file and renamed, so readers never see a partial output.
+    """
+    tmp_file = f"{output_file}.tmp"
+    if output_file.endswith('.parquet'):
+        lf.sink_parquet(tmp_file, compression='zstd')
+    else:
+        lf.sink_csv(tmp_file)
+    os.replace(tmp_file, output_file)
 
 
+RAW_FILE = 'goldsky/orderFilled.csv'
 
-def process_live():
-    processed_file = 'processed/trades.csv'
+
+def load_raw_events(source='csv'):
+    """
+    Lazily load raw orderFilled events
+
+    Args:
+        source: 'csv' for goldsky/orderFilled.csv, 'parquet' for the goldsky/events/ store
+    """
+    if source == 'parquet':
+        return EventStore().scan().select(CSV_COLUMNS)
+
+    schema_overrides = {
+        "takerAssetId": pl.Utf8,
+        "makerAssetId": pl.Utf8,
+    }
+    return pl.scan_csv(RAW_FILE, schema_overrides=schema_overrides)
+
+
+def _complete_end(f, start, stop, block=1 << 16):
+    """Offset just past the last newline in [start, stop) of a binary file (start if there is none)"""
+    pos = stop
+    while pos > start:
+        size = min(block, pos - start)
+        f.seek(pos - size)
+        i = f.read(size).rfind(b'\n')
+        if i >= 0:
+            return pos - size + i + 1
+        pos -= size
+    return start
+
+
+def read_raw_tail(offset=0, raw_file=RAW_FILE, end=None):
+    """
+    Read raw CSV rows from a byte offset to the last complete line
+
+    Only the bytes past `offset` are read, so an incremental run costs time
+    proportional to the rows appended since the last one. A line still being
+    written by a concurrent scraper is left for the next run.
+
+    Args:
+        offset: Byte offset of the first unread line (0 = start of the file)
+        raw_file: Raw orderFilled CSV
+        end: Stop reading at this byte offset (None = end of the file)
+
+    Returns:
+        (events with CSV_COLUMNS, byte offset just past the last row read)
+    """
+    with open(raw_file, 'rb') as f:
+        header = f.readline()
+        offset = max(offset, len(header))
+        stop = os.fstat(f.fileno()).st_size if end is None else end
+        # Find the last complete line first so only those bytes are read
+        stop = _complete_end(f, offset, stop)
+        f.seek(offset)
+        data = f.read(stop - offset)
+
+    columns = header.decode('utf-8').strip().split(',')
+    schema = {name: EVENT_SCHEMA.get(name, pl.Utf8) for name in columns}
+    if not data:
+        return pl.DataFrame(schema=schema).select(CSV_COLUMNS), offset
+    df = pl.read_csv(io.BytesIO(data), has_header=False, new_columns=columns, schema=schema)
+    return df.select(CSV_COLUMNS), offset + len(data)
+
+
+def raw_extent(raw_file=RAW_FILE, chunk_size=64 << 20):
+    """
+    Count the complete rows of the raw CSV with a chunked newline scan
+
+    Memory stays at one chunk however large the file is. Rows appended by a
+    concurrent scraper after the scan are not counted, so the count and
+    offset always describe the same prefix of the file.
+
+    Returns:
+        (complete data rows, byte offset just past the last one)
+    """
+    lines, end = count_lines(raw_file, chunk_size)
+    # The first line is the header
+    return max(0, lines - 1), end
+
+
+def raw_offset_matches(state, raw_file=RAW_FILE):
+    """
+    Check that a state's raw byte offset still ends at its last processed row
+
+    The raw file may have been rebuilt since (re-scrape, export from the event
+    store), in which case the offset means nothing and the caller re-reads it.
+    """
+    offset = state.get('raw_byte_offset')
+    if offset is None or not os.path.isfile(raw_file) or os.path.getsize(raw_file) < offset:
+        return False
+    with open(raw_file, 'rb') as f:
+        f.seek(max(0, offset - 4096))
+        chunk = f.read(offset - max(0, offset - 4096))
+    if not chunk.endswith(b'\n'):
+        return False
+    last_line = chunk[:-1].rsplit(b'\n', 1)[-1].rstrip(b'\r')
+    return last_line.endswith(str(state.get('transactionHash')).encode())
+
+
+PROCESSED_FILE = 'processed/trades.csv'
+
+
+def _queue_unresolved(op_file, new_df, df_process, offsets):
+    """Queue processed rows without a market, with their raw events and output positions"""
+    unresolved = new_df['market_id'].is_null()
+    if not unresolved.any():
+        return
+    queued = enqueue(op_file, new_df.select(
+        'raw_row',
+        pl.col('nonusdc_asset_id').alias('token_id'),
+        pl.Series('byte_offset', offsets),
+    ).filter(unresolved).join(df_process.select(['raw_row'] + CSV_COLUMNS), on='raw_row'))
+    print(f"⚠ {queued:,} rows with unknown markets queued for re-resolution")
+
+
+def append_processed(df_process, source='csv', start_row=0, row_count=None, op_file=PROCESSED_FILE,
+                     raw_offset=None, store=None):
+    """
+    Process raw events in memory, append them to processed/trades.csv and commit the state
+
+    Args:
+        df_process: Raw events (orderFilled columns, timestamp as datetime)
+        source: Raw source the rows came from ('csv' or 'parquet')
+        start_row: Raw row index of the first row in df_process
+        row_count: Processed rows before this batch (None if unknown)
+        op_file: Processed output file
+        raw_offset: Byte offset in the raw CSV just past the batch (None if unknown)
+        store: TradeStore to append to instead of op_file
+
+    Returns:
+        Processed row count after the batch (None if unknown)
+    """
+    if len(df_process) == 0:
+        return row_count
+
+    # The raw row index and asset id ride along so unresolved rows can be queued with their raw event
+    df_process = df_process.with_row_index('raw_row')
+    new_df = get_processed_df(df_process, keep_columns=['raw_row', 'nonusdc_asset_id'])
+
+    last_row = df_process.row(-1, named=True)
+    raw_position = {'raw_byte_offset': raw_offset} if raw_offset is not None else {}
+    position = dict(
+        source=source,
+        raw_rows=start_row + len(df_process),
+        **raw_position,
+        last_timestamp=str(last_row['timestamp']),
+        transactionHash=last_row['transactionHash'],
+    )
+
+    if store is not None:
+        # Queued before the manifest commit; entries past the committed rows are dropped if it never lands
+        _queue_unresolved(store.root, new_df, df_process, np.arange(store.rows, store.rows + len(new_df)))
+        store.append(new_df.drop('raw_row', 'nonusdc_asset_id'), position=position)
+        print(f"✓ Appended {len(new_df):,} rows to {store.root} ({store.summary()})")
+        return store.rows
+
+    if not os.path.isdir(os.path.dirname(op_file)):
+        os.makedirs(os.path.dirname(op_file))
+
+    # Serialize once so the byte offset of every line is known for the unresolved queue
+    created = not os.path.isfile(op_file)
+    data = new_df.drop('raw_row', 'nonusdc_asset_id').write_csv(include_header=created).encode()
+    base = 0 if created else os.path.getsize(op_file)
+    with open(op_file, mode='wb' if created else 'ab') as f:
+        f.write(data)
+    if created:
+        row_count = 0
+        print(f"✓ Created new file: {op_file}")
+    else:
+        print(f"✓ Appending {len(new_df):,} rows to {op_file}")
+
+    _queue_unresolved(op_file, new_df, df_process, line_offsets(data, base)[1 if created else 0:])
+
+    if row_count is not None:
+        row_count += len(new_df)
+
+    write_state(op_file, **position, row_count=row_count)
+    return row_count
+
+
+def rebuild_processed(source='csv', op_file=PROCESSED_FILE):
+    """
+    Rebuild processed trades from the whole raw history in bounded memory
+
+    The raw events are streamed through process_trades() straight to op_file,
+    so only the distinct asset ids and the unresolved rows are ever held in
+    memory. For a CSV output the state file and unresolved queue are rewritten
+    as append_processed() would leave them, and later runs resume incrementally.
+    Run it while the scraper is stopped, as update_all.py does.
+
+    Args:
+        source: Raw store to read ('csv' or 'parquet')
+        op_file: Output file; a .parquet path gets a plain Parquet file without state
+
+    Returns:
+        Number of trades written
+    """
+    if os.path.dirname(op_file):
+        os.makedirs(os.path.dirname(op_file), exist_ok=True)
+
+    raw = load_raw_events(source)
+    if source == 'csv':
+        # A partial last line (scraper killed mid-write) is left for the next run
+        raw_rows, raw_end = raw_extent()
+        raw = raw.head(raw_rows)
+    raw = raw.with_columns(pl.from_epoch(pl.col('timestamp'), time_unit='s'))
+    probe = probe_assets(raw)
+    if os.path.exists(state_path(op_file)):
+        # validate_state would otherwise truncate the new file to the old offset if we stop early
+        os.remove(state_path(op_file))
+    print(f"⚙️  Streaming {'goldsky/events/' if source == 'parquet' else RAW_FILE} → {op_file}")
+    sink_processed(process_trades(raw, probe=probe), op_file)
+    if op_file.endswith('.parquet'):
+        row_count = pl.scan_parquet(op_file).select(pl.len()).collect().item()
+        print(f"✓ Wrote {row_count:,} trades")
+        return row_count
+
+    # Every raw row yields one trade, so output line i + 1 holds raw row i
+    row_count = pl.scan_csv(op_file).select(pl.len()).collect().item()
+    for stale in (queue_path(op_file), f"{op_file}.patch"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    # Spooled through a scratch file for the same reason as in probe_assets
+    scratch = f"{op_file}.unresolved.tmp"
+    (
+        raw.with_row_index('raw_row')
+        .head(row_count)
+        .with_columns(NONUSDC_ASSET.alias('token_id'))
+        .join(probe.lazy(), left_on='token_id', right_on='asset_id', how='anti', maintain_order='left')
+        .select(['raw_row', 'token_id'] + CSV_COLUMNS)
+        .sink_csv(scratch)
+    )
+    schema = {'raw_row': pl.Int64, 'token_id': pl.Utf8, **{name: EVENT_SCHEMA[name] for name in CSV_COLUMNS}}
+    unresolved = pl.read_csv(scratch, schema={**schema, 'timestamp': raw.collect_schema()['timestamp']})
+    os.remove(scratch)
+    if len(unresolved):
+        queued = enqueue(op_file, unresolved.with_columns(
+            pl.Series('byte_offset', line_starts(op_file, unresolved['raw_row'].to_numpy() + 1))
+        ))
+        print(f"⚠ {queued:,} rows with unknown markets queued for re-resolution")
+
+    last_line = read_last_line(op_file).split(',')
+    raw_position = {}
+    if source == 'csv' and row_count:
+        raw_position['raw_byte_offset'] = raw_end
+    write_state(op_file, source=source, raw_rows=row_count, **raw_position,
+                last_timestamp=str(pd.to_datetime(last_line[0])) if row_count else None,
+                transactionHash=last_line[-1] if row_count else None, row_count=row_count)
+    print(f"✓ Wrote {row_count:,} trades")
+    return row_count
+
+
+def process_live(source='csv', trades_format='csv', export_csv=None):
+    """
+    Process raw events appended since the last run
+
+    Args:
+        source: Raw store to read ('csv' or 'parquet')
+        trades_format: 'csv' appends to processed/trades.csv, 'parquet' to the
+            processed/trades/ segment store
+        export_csv: With trades_format='parquet', also export the store to this CSV path
+    """
+    processed_file = PROCESSED_FILE
+    store = TradeStore() if trades_format == 'parquet' else None
 
     print("=" * 60)
     print("🔄 Processing Live Trades")
     print("=" * 60)
 
     last_processed = {}
-
-    if os.path.exists(processed_file):
+    start_row = None
+    raw_offset = None
+    state = None
+
+    if store is not None:
+        # The manifest is the commit point; its position covers exactly the committed segments
+        print(f"✓ Trade store: {store.summary()}")
+        state = store.position
+        if state and state.get('source', 'csv') != source:
+            if store.rows:
+                print(f"❌ {store.root} was not built from the {source} source - not appending to it")
+                return
+            state = None
+    elif not os.path.exists(processed_file):
+        # From scratch: stream the whole history to disk instead of loading it
+        print("⚠ No existing processed file found - rebuilding from the whole raw history")
+        rebuild_processed(source, processed_file)
+        resolve_unresolved(processed_file)
+        print("=" * 60)
+        print("✅ Processing complete!")
+        print("=" * 60)
+        return
+    else:
         print(f"✓ Found existing processed file: {processed_file}")
-        result = subprocess.run(['tail', '-n', '1', processed_file], capture_output=True, text=True)
-        last_line = result.stdout.strip()
+        # A half-applied patch would otherwise look like an uncommitted tail to validate_state
+        recover_patch(processed_file)
+        state = validate_state(processed_file, read_state(processed_file))
+
+    if state and state.get('source', 'csv') == source:
+        # O(1) resume: the state records how many raw rows are already processed
+        start_row = state['raw_rows']
+        print(f"📍 Resuming from raw row {start_row:,} (state file)")
+        print(f"   Last timestamp: {state.get('last_timestamp')}")
+        if source == 'csv' and 'raw_byte_offset' in state:
+            if raw_offset_matches(state):
+                raw_offset = state['raw_byte_offset']
+            else:
+                print("⚠ Raw file changed since the last run - re-reading it from the start")
+    elif store is None and os.path.exists(processed_file):
+        last_line = read_last_line(processed_file)
         splitted = last_line.split(',')
 
         last_processed['timestamp'] = pd.to_datetime(splitted[0])
@@ -125,53 +456,63 @@ def process_live():
         print(f"   Last hash: {last_processed['transactionHash'][:16]}...")
     else:
         print("⚠ No existing processed file found - processing from beginning")
-
-    print(f"\n📂 Reading: goldsky/orderFilled.csv")
-
-    schema_overrides = {
-        "takerAssetId": pl.Utf8,
-        "makerAssetId": pl.Utf8,
-    }
-
-    df = pl.scan_csv("goldsky/orderFilled.csv", schema_overrides=schema_overrides).collect(streaming=True)
-    df = df.with_columns(
+        start_row = 0
+
+    print(f"\n📂 Reading: {'goldsky/events/' if source == 'parquet' else RAW_FILE}")
+
+    # Raw events still to slice at start_row, unless only the unprocessed ones were read
+    df = None
+    raw_end = None
+    if raw_offset is not None:
+        # Only the bytes appended since the last commit are read
+        df_process, raw_end = read_raw_tail(raw_offset)
+        print(f"✓ Read {raw_end - raw_offset:,} new bytes from offset {raw_offset:,}")
+    elif source == 'csv':
+        # Full read, limited to the complete rows so the next run resumes from their end
+        raw_rows, raw_end = raw_extent()
+        raw = load_raw_events(source).head(raw_rows)
+        if start_row is not None:
+            df_process = raw.slice(start_row).collect(engine='streaming')
+        else:
+            df = raw.collect(engine='streaming')
+            print(f"✓ Loaded {len(df):,} rows")
+    elif start_row is not None:
+        df_process = load_raw_events(source).slice(start_row).collect(engine='streaming')
+    else:
+        df = load_raw_events(source).collect(engine='streaming')
+        print(f"✓ Loaded {len(df):,} rows")
+
+    if df is not None:
+        if start_row is None:
+            # No state: find the last processed row by its timestamp, hash, maker and taker
+            df = df.with_row_index()
+            last_ts = int(last_processed['timestamp'].timestamp())
+            same_timestamp = df.filter(pl.col('timestamp') == last_ts)
+            same_timestamp = same_timestamp.filter(
+                (pl.col("transactionHash") == last_processed['transactionHash']) & (pl.col("maker") == last_processed['maker']) & (pl.col("taker") == last_processed['taker'])
+            )
+            start_row = same_timestamp.row(0)[0] + 1
+            df = df.drop('index')
+        df_process = df.slice(start_row)
+
+    df_process = df_process.with_columns(
         pl.from_epoch(pl.col('timestamp'), time_unit='s').alias('timestamp')
     )
 
-    print(f"✓ Loaded {len(df):,} rows")
-
-    df = df.with_row_index()
-
-    same_timestamp = df.filter(pl.col('timestamp') == last_processed['timestamp'])
-    same_timestamp = same_timestamp.filter(
-        (pl.col("transactionHash") == last_processed['transactionHash']) & (pl.col("maker") == last_processed['maker']) & (pl.col("taker") == last_processed['taker'])
-    )
-
-    df_process = df.filter(pl.col('index') > same_timestamp.row(0)[0])
-    df_process = df_process.drop('index')
-
     print(f"⚙️  Processing {len(df_process):,} new rows...")
 
-    new_df = get_processed_df(df_process)
-    
-    if not os.path.isdir('processed'):
-        os.makedirs('processed')
-
+    row_count = state.get('row_count') if state else None
+    append_processed(df_process, source=source, start_row=start_row, row_count=row_count, op_file=processed_file,
+                     raw_offset=raw_end, store=store)
+    resolve_unresolved(store.root if store is not None else processed_file)
 
-    op_file = 'processed/trades.csv'
+    if store is not None and export_csv:
+        print(f"📤 Exporting {store.rows:,} trades to {export_csv}")
+        store.export_csv(export_csv)
 
-    if not os.path.isfile(op_file):
-        new_df.write_csv(op_file)
-        print(f"✓ Created new file: processed/trades.csv")
-    else:
-        print(f"✓ Appending {len(new_df):,} rows to processed/trades.csv")
-        with open(op_file, mode="a") as f:
-            new_df.write_csv(f, include_header=False)
-
-    
     print("=" * 60)
     print("✅ Processing complete!")
     print("=" * 60)
     
 if __name__ == "__main__":
-    process_live()
\ No newline at end of file
+    process_live()
@@ -0,0 +1,281 @@
+"""
+Parallel full rebuild of processed trades from the raw history.
+
+Needed when the market catalog or the trade derivation changes. The raw
+events are split into chunks (line-aligned byte ranges of
+goldsky/orderFilled.csv, or runs of goldsky/events/ segments), and a
+process pool turns each chunk into trades with process_trades(). Every
+worker opens the same on-disk token index read-only, so the market lookup is
+built once by the parent and never rebuilt per worker.
+
+A compact trade store also needs every wallet in its dictionary up front.
+The parent collects the raw makers and takers in one streaming pass, and
+workers encode against that dictionary read-only.
+
+Workers write their output to a staging directory. The parent commits chunks
+strictly in raw order as they come back: CSV parts are appended to the new
+processed/trades.csv, and Parquet segments are adopted into a fresh
+TradeStore. The result (state file, unresolved queue, raw position) is the
+same as a single-pass process_live() run. The new output replaces the old
+one only after the last chunk is committed.
+"""
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from poly_utils.token_index import TokenIndex, get_token_index
+from update_utils.event_store import EventStore, CSV_COLUMNS
+from update_utils.ingest_state import state_path, write_state
+from update_utils.process_live import (
+    NONUSDC_ASSET, PROCESSED_FILE, RAW_FILE, TRADE_COLUMNS, probe_assets, process_trades, read_raw_tail,
+)
+from update_utils.trade_encoding import WalletDictionary
+from update_utils.trade_store import TRADES_DIR, TradeStore, stage_segments
+from update_utils.unresolved_trades import enqueue, line_offsets, queue_path
+
+DEFAULT_CHUNK_BYTES = 64 << 20
+# Roughly the same number of events as DEFAULT_CHUNK_BYTES of raw CSV
+DEFAULT_CHUNK_ROWS = 500_000
+
+# Set in each worker by _init_worker
+_index: Optional[TokenIndex] = None
+_wallets: Optional[WalletDictionary] = None
+
+
+def plan_csv_chunks(raw_file: str = RAW_FILE, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """
+    Split the raw CSV into line-aligned [start, end) byte ranges
+
+    The header is skipped, and so is a trailing line the scraper is still
+    writing.
+    """
+    size = os.path.getsize(raw_file)
+    with open(raw_file, 'rb') as f:
+        start = len(f.readline())
+        # End of the last complete line
+        f.seek(max(start, size - 64 * 1024))
+        tail = f.read()
+        end = size - len(tail) + tail.rfind(b'\n') + 1 if b'\n' in tail else start
+
+        chunks = []
+        while start < end:
+            f.seek(min(start + chunk_bytes, end) - 1)
+            stop = min(f.tell() + len(f.readline()), end)
+            chunks.append((start, stop))
+            start = stop
+    return chunks
+
+
+def plan_store_chunks(store: EventStore, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> List[List[str]]:
+    """Group event store segments, in scan order, into runs of about chunk_rows events"""
+    rows = {os.path.join(store.root, seg['path']): seg['rows'] for seg in store.segments}
+    chunks, current, current_rows = [], [], 0
+    for path in store.segment_paths():
+        current.append(path)
+        current_rows += rows[path]
+        if current_rows >= chunk_rows:
+            chunks.append(current)
+            current, current_rows = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def raw_wallets(source: str = 'csv', raw_file: str = RAW_FILE) -> pl.Series:
+    """Distinct maker and taker addresses of the raw history, sorted"""
+    lf = pl.scan_csv(raw_file) if source == 'csv' else EventStore().scan()
+    wallets = pl.concat([lf.select(pl.col('maker').alias('address')), lf.select(pl.col('taker').alias('address'))])
+    # Categorical for the same reason as in probe_assets
+    unique = wallets.select(pl.col('address').cast(pl.Categorical).unique()).collect(engine='streaming')
+    return unique['address'].cast(pl.Utf8).sort()
+
+
+def _init_worker(index_root: str, wallets_path: Optional[str]) -> None:
+    global _index, _wallets
+    _index = TokenIndex(index_root)
+    _wallets = WalletDictionary(wallets_path) if wallets_path else None
+
+
+def process_chunk(task: Dict) -> Dict:
+    """
+    Turn one chunk of raw events into trades in a worker process
+
+    Args:
+        task: Chunk description built by rebuild_trades()
+
+    Returns:
+        Row count, last raw row, staged output and the chunk's unresolved rows
+        (with `byte_offset` relative to the chunk's output)
+    """
+    if task['source'] == 'csv':
+        raw, _ = read_raw_tail(task['start'], task['raw_file'], end=task['end'])
+    else:
+        raw = pl.read_parquet(task['paths']).select(CSV_COLUMNS)
+    raw = raw.with_columns(pl.from_epoch(pl.col('timestamp'), time_unit='s'))
+
+    lf = raw.lazy()
+    trades = process_trades(lf, keep_columns=['nonusdc_asset_id'], probe=probe_assets(lf, _index)).collect()
+    unresolved = trades['market_id'].is_null().to_numpy()
+    trades = trades.drop('nonusdc_asset_id')
+
+    name = f"chunk-{task['index']:06d}"
+    if task['trades_format'] == 'csv':
+        data = trades.write_csv(include_header=False).encode()
+        output = os.path.join(task['staging'], f"{name}.csv")
+        with open(output, 'wb') as f:
+            f.write(data)
+        positions = line_offsets(data)[unresolved]
+    else:
+        output = stage_segments(trades, task['staging'], name, wallets=_wallets)
+        positions = np.flatnonzero(unresolved)
+
+    queued = raw.filter(pl.Series(unresolved)).with_columns(
+        NONUSDC_ASSET.alias('token_id'),
+        pl.Series('byte_offset', positions, dtype=pl.Int64),
+    )
+
+    last = raw.row(-1, named=True) if len(raw) else None
+    return {
+        'index': task['index'],
+        'rows': len(raw),
+        'end': task.get('end'),
+        'last_timestamp': str(last['timestamp']) if last else None,
+        'transactionHash': last['transactionHash'] if last else None,
+        'output': output,
+        'unresolved': queued,
+    }
+
+
+def _position(source: str, raw_rows: int, result: Dict) -> Dict:
+    raw_position = {'raw_byte_offset': result['end']} if source == 'csv' else {}
+    return dict(source=source, raw_rows=raw_rows, **raw_position,
+                last_timestamp=result['last_timestamp'], transactionHash=result['transactionHash'])
+
+
+def rebuild_trades(source: str = 'csv', trades_format: str = 'csv', workers: Optional[int] = None,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                   op_file: str = PROCESSED_FILE, trades_dir: str = TRADES_DIR,
+                   raw_file: str = RAW_FILE) -> int:
+    """
+    Rebuild processed trades from the whole raw history on a process pool
+
+    Run it while the scraper is stopped, as update_all.py does.
+
+    Args:
+        source: Raw store to read ('csv' or 'parquet')
+        trades_format: 'csv' rebuilds op_file, 'parquet' the trade store at trades_dir
+        workers: Worker processes (default: one per core)
+        chunk_bytes: Raw CSV bytes per chunk
+        chunk_rows: Events per chunk when reading the event store
+        op_file: Processed trades CSV
+        trades_dir: Trade store directory
+        raw_file: Raw orderFilled CSV
+
+    Returns:
+        Number of trades written
+    """
+    workers = workers or os.cpu_count() or 1
+    # Sync and save the token index once; workers only ever read it
+    index_root = os.path.dirname(get_token_index().path)
+
+    if source == 'csv':
+        tasks = [{'start': s, 'end': e, 'raw_file': raw_file} for s, e in plan_csv_chunks(raw_file, chunk_bytes)]
+    else:
+        tasks = [{'paths': paths} for paths in plan_store_chunks(EventStore(), chunk_rows)]
+
+    target = op_file if trades_format == 'csv' else trades_dir
+    build = f"{target.rstrip(os.sep)}.rebuild"
+    staging = os.path.join(build, '_staging')
+    shutil.rmtree(build, ignore_errors=True)
+    os.makedirs(staging)
+    for i, task in enumerate(tasks):
+        task.update(index=i, source=source, trades_format=trades_format, staging=staging)
+
+    print(f"\n{'='*50}")
+    print(f"Rebuilding {target} from {'goldsky/events/' if source == 'parquet' else raw_file}")
+    print(f"Chunks: {len(tasks)}, workers: {workers}")
+    print(f"{'='*50}")
+
+    started = time.time()
+    raw_rows = 0
+    queued_rows = 0
+    last = None
+    store = None
+    if trades_format == 'csv':
+        build_file = os.path.join(build, os.path.basename(op_file))
+        out = open(build_file, 'wb')
+        out.write((','.join(TRADE_COLUMNS) + '\n').encode())
+    else:
+        store = TradeStore(build)
+        if store.wallets is not None:
+            added = store.wallets.add(raw_wallets(source, raw_file))
+            print(f"Wallet dictionary: {added:,} wallets")
+    wallets_path = store.wallets.path if store is not None and store.wallets is not None else None
+    unresolved = []
+
+    try:
+        # Spawned, not forked: a fork would inherit polars' thread pool mid-use and can deadlock
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(index_root, wallets_path)) as pool:
+            # map() yields in submission order, so chunks are committed in raw order
+            for result in pool.map(process_chunk, tasks):
+                queued = result['unresolved']
+                if store is None:
+                    base = out.tell()
+                    with open(result['output'], 'rb') as part:
+                        shutil.copyfileobj(part, out)
+                    os.remove(result['output'])
+                else:
+                    base = store.rows
+                if len(queued):
+                    queued_rows += len(queued)
+                    queued = queued.with_columns(pl.col('byte_offset') + base)
+                    if store is None:
+                        unresolved.append(queued)
+                    else:
+                        enqueue(store.root, queued)
+                raw_rows += result['rows']
+                if result['rows']:
+                    last = result
+                if store is not None:
+                    store.append_staged(result['output'], position=_position(source, raw_rows, last or result))
+
+                elapsed = time.time() - started
+                print(f"Chunks committed: {result['index'] + 1}/{len(tasks)}, trades: {raw_rows:,} "
+                      f"({raw_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    finally:
+        if store is None:
+            out.close()
+
+    shutil.rmtree(staging, ignore_errors=True)
+    if store is None:
+        # Drop the old state first: validate_state would otherwise truncate the new file to the old offset
+        for stale in (state_path(op_file), queue_path(op_file), f"{op_file}.patch"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        os.replace(build_file, op_file)
+        shutil.rmtree(build, ignore_errors=True)
+        if unresolved:
+            enqueue(op_file, pl.concat(unresolved))
+        position = _position(source, raw_rows, last) if last else dict(source=source, raw_rows=0)
+        write_state(op_file, **position, row_count=raw_rows)
+    else:
+        old = f"{trades_dir.rstrip(os.sep)}.old"
+        if os.path.isdir(trades_dir):
+            os.replace(trades_dir, old)
+        os.replace(build, trades_dir)
+        shutil.rmtree(old, ignore_errors=True)
+
+    print(f"Rebuild complete: {raw_rows:,} trades in {time.time() - started:.0f}s")
+    if queued_rows:
+        print(f"{queued_rows:,} rows with unknown markets queued for re-resolution")
+    if store is not None:
+        print(f"Trade store: {TradeStore(trades_dir).summary()}")
+    return raw_rows
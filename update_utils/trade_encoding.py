@@ -0,0 +1,174 @@
+"""
+Compact encoding for processed trades in the Parquet trade store.
+
+processed/trades.csv repeats the same 42-char wallet addresses millions of
+times. It also spells out BUY/SELL and token1/token2 on every row, and keeps
+USDC amounts as floats even though they are exact integer micro-units
+divided by 1e6. The compact schema stores instead:
+
+- maker_id / taker_id: UInt32 ids from a persisted, append-only wallet
+  dictionary (WalletDictionary, `_wallets.csv` next to the store manifest)
+- nonusdc_side: an Enum
+- taker_buys: one boolean for both directions (the maker is always the
+  opposite side)
+- usd_micros / token_micros: int64 micro-units
+
+decode_trades() turns a compact frame back into the processed/trades.csv
+columns, value for value. Analytics can also group by the integer ids
+directly and decode only the result.
+"""
+import io
+import os
+from typing import Iterable, Optional
+
+import polars as pl
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked
+    fcntl = None
+
+WALLETS_NAME = '_wallets.csv'
+
+# 'USDC' only appears on unresolved rows, whose market side is not known yet
+SIDE = pl.Enum(['token1', 'token2', 'USDC'])
+
+COMPACT_SCHEMA = {
+    'timestamp': pl.Datetime('us'),
+    'market_id': pl.Int64,
+    'maker_id': pl.UInt32,
+    'taker_id': pl.UInt32,
+    'nonusdc_side': SIDE,
+    'taker_buys': pl.Boolean,
+    'price': pl.Float64,
+    'usd_micros': pl.Int64,
+    'token_micros': pl.Int64,
+    'transactionHash': pl.Utf8,
+}
+
+MICROS = 10**6
+
+
+class WalletDictionary:
+    """
+    Append-only wallet address <-> dense UInt32 id mapping, persisted as one address per line
+
+    Any number of processes may read the file while one appends to it: a
+    reader only loads complete lines and never modifies the file. add()
+    appends under an exclusive lock, first catching up with lines other
+    writers appended and cutting off a line left partial by a crashed writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.addresses = pl.Series('address', [], dtype=pl.Utf8)
+        # Bytes of complete lines loaded into `addresses` so far
+        self._loaded = 0
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                self._load(f)
+        self._table: Optional[pl.DataFrame] = None
+
+    def _load(self, f, repair: bool = False) -> None:
+        """Load the complete lines appended past what is loaded; with `repair`, truncate a partial last line"""
+        f.seek(self._loaded)
+        data = f.read()
+        complete = data.rfind(b'\n') + 1
+        if repair and complete < len(data):
+            # A line cut short by a crash; its id was never committed to a segment
+            f.truncate(self._loaded + complete)
+        if complete:
+            new = pl.read_csv(io.BytesIO(memoryview(data)[:complete]), has_header=self._loaded == 0,
+                              new_columns=['address'], schema={'address': pl.Utf8})['address']
+            self.addresses = pl.concat([self.addresses, new])
+            self._loaded += complete
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    @property
+    def table(self) -> pl.DataFrame:
+        """(address, wallet_id) frame for joins"""
+        if self._table is None or len(self._table) != len(self.addresses):
+            self._table = self.addresses.to_frame().with_row_index('wallet_id').select('address', 'wallet_id')
+        return self._table
+
+    def add(self, addresses: Iterable[str]) -> int:
+        """
+        Assign ids to addresses not yet in the dictionary and persist them
+
+        Returns:
+            Number of new addresses
+        """
+        addresses = pl.Series('address', addresses, dtype=pl.Utf8).drop_nulls()
+        with open(self.path, 'a+b') as f:
+            if fcntl is not None:
+                # Released when the file is closed
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            self._load(f, repair=True)
+            new = addresses.unique(maintain_order=True).to_frame().join(self.table, on='address', how='anti')['address']
+            if len(new) == 0:
+                return 0
+            data = (b'' if self._loaded else b'address\n') + '\n'.join(new.to_list()).encode() + b'\n'
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.addresses = pl.concat([self.addresses, new])
+        self._loaded += len(data)
+        return len(new)
+
+    def ids(self, addresses: pl.Series) -> pl.Series:
+        """Ids of addresses, in order (null for unknown addresses)"""
+        return (addresses.rename('address').to_frame()
+                .join(self.table, on='address', how='left', maintain_order='left')['wallet_id'])
+
+    def id_of(self, address: str) -> Optional[int]:
+        """Id of one address, or None"""
+        return self.ids(pl.Series([address]))[0]
+
+
+def encode_trades(df: pl.DataFrame, wallets: WalletDictionary, add: bool = True) -> pl.DataFrame:
+    """
+    Encode processed trades (TRADE_SCHEMA) in the compact schema
+
+    Args:
+        df: Processed trades
+        wallets: Dictionary to map makers and takers through
+        add: Add unseen wallets to the dictionary; if False they must already be there
+    """
+    if add:
+        wallets.add(pl.concat([df['maker'], df['taker']]))
+    maker_ids, taker_ids = wallets.ids(df['maker']), wallets.ids(df['taker'])
+    if maker_ids.null_count() or taker_ids.null_count():
+        raise ValueError(f"{maker_ids.null_count() + taker_ids.null_count():,} wallets missing from {wallets.path}")
+
+    # Amounts were exact micro-unit integers divided by 1e6, so rounding recovers them exactly
+    return df.select(
+        'timestamp',
+        'market_id',
+        maker_ids.alias('maker_id'),
+        taker_ids.alias('taker_id'),
+        pl.col('nonusdc_side').cast(SIDE),
+        (pl.col('taker_direction') == 'BUY').alias('taker_buys'),
+        'price',
+        (pl.col('usd_amount') * MICROS).round().cast(pl.Int64).alias('usd_micros'),
+        (pl.col('token_amount') * MICROS).round().cast(pl.Int64).alias('token_micros'),
+        'transactionHash',
+    )
+
+
+def decode_trades(lf: pl.LazyFrame, wallets: WalletDictionary) -> pl.LazyFrame:
+    """Lazily decode compact trades back to the processed/trades.csv columns"""
+    return lf.select(
+        'timestamp',
+        'market_id',
+        pl.lit(wallets.addresses).gather(pl.col('maker_id')).alias('maker'),
+        pl.lit(wallets.addresses).gather(pl.col('taker_id')).alias('taker'),
+        pl.col('nonusdc_side').cast(pl.Utf8),
+        pl.when(pl.col('taker_buys')).then(pl.lit('SELL')).otherwise(pl.lit('BUY')).alias('maker_direction'),
+        pl.when(pl.col('taker_buys')).then(pl.lit('BUY')).otherwise(pl.lit('SELL')).alias('taker_direction'),
+        'price',
+        (pl.col('usd_micros') / MICROS).alias('usd_amount'),
+        (pl.col('token_micros') / MICROS).alias('token_amount'),
+        'transactionHash',
+    )
@@ -0,0 +1,448 @@
+"""
+Partitioned Parquet store for processed trades.
+
+The columnar counterpart of processed/trades.csv: process_live(trades_format='parquet')
+appends each processed batch as immutable, time-ordered zstd Parquet segments
+(one per UTC day touched), and a JSON manifest lists every segment with its
+row count and min/max timestamp and market_id:
+
+    processed/trades/
+        _manifest.json
+        date=2024-01-05/part-1704412800-1704499199-000000.parquet
+        date=2024-01-06/...
+
+Readers prune segments through the manifest before Parquet row-group
+statistics are even consulted, and polars decodes the remaining segments in
+parallel. Timestamps and amounts stay typed, so nothing is re-parsed from text.
+
+The manifest is the commit point: it also records the raw-input position
+(raw rows, raw byte offset, last transaction) that process_live resumes
+from, so a segment written without its manifest update is simply ignored.
+Rows keep their ordinal position for the life of the store; unresolved
+trades are queued by ordinal and patched copy-on-write by patch_rows().
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import polars as pl
+
+from update_utils.ingest_state import write_json_atomic
+from update_utils.trade_encoding import (
+    COMPACT_SCHEMA, WALLETS_NAME, WalletDictionary, decode_trades, encode_trades,
+)
+
+TRADES_DIR = 'processed/trades'
+MANIFEST_NAME = '_manifest.json'
+MANIFEST_VERSION = 1
+
+# Column order matches processed/trades.csv
+TRADE_SCHEMA = {
+    'timestamp': pl.Datetime('us'),
+    'market_id': pl.Int64,
+    'maker': pl.Utf8,
+    'taker': pl.Utf8,
+    'nonusdc_side': pl.Utf8,
+    'maker_direction': pl.Utf8,
+    'taker_direction': pl.Utf8,
+    'price': pl.Float64,
+    'usd_amount': pl.Float64,
+    'token_amount': pl.Float64,
+    'transactionHash': pl.Utf8,
+}
+
+# Encoding of new stores: 'compact' (see trade_encoding) or 'plain' (TRADE_SCHEMA as is)
+DEFAULT_ENCODING = 'compact'
+
+# Segments smaller than this are merged with their neighbours by compact()
+DEFAULT_COMPACT_ROWS = 250_000
+
+
+def coerce_trades(df: pl.DataFrame) -> pl.DataFrame:
+    """Cast a frame of processed trades to TRADE_SCHEMA"""
+    return df.select([pl.col(name).cast(dtype) for name, dtype in TRADE_SCHEMA.items()])
+
+
+def _filter_bounds(lf: pl.LazyFrame, start: Optional[int], end: Optional[int],
+                   market_ids: Optional[List[int]]) -> pl.LazyFrame:
+    """Row filters matching segment_paths() pruning"""
+    if start is not None:
+        lf = lf.filter(pl.col('timestamp') >= datetime.fromtimestamp(start, tz=timezone.utc).replace(tzinfo=None))
+    if end is not None:
+        lf = lf.filter(pl.col('timestamp') < datetime.fromtimestamp(end, tz=timezone.utc).replace(tzinfo=None))
+    if market_ids is not None:
+        lf = lf.filter(pl.col('market_id').is_in(market_ids))
+    return lf
+
+
+def _segment_stats(df: pl.DataFrame) -> Dict:
+    """Manifest statistics for one segment's rows"""
+    epoch = df['timestamp'].dt.epoch('s')
+    market_ids = df['market_id'].drop_nulls()
+    return {
+        'rows': len(df),
+        'min_timestamp': int(epoch.min()),
+        'max_timestamp': int(epoch.max()),
+        'min_market_id': int(market_ids.min()) if len(market_ids) else None,
+        'max_market_id': int(market_ids.max()) if len(market_ids) else None,
+        'null_market_ids': len(df) - len(market_ids),
+    }
+
+
+def _write_segment(df: pl.DataFrame, path: str, compression_level: int) -> None:
+    df.write_parquet(path, compression='zstd', compression_level=compression_level, statistics=True)
+
+
+def day_runs(df: pl.DataFrame) -> List[Tuple[str, pl.DataFrame]]:
+    """
+    Split processed trades into (partition, rows) runs of the same UTC day
+
+    Runs rather than a group-by, so rows keep their order (and ordinals).
+    """
+    if len(df) == 0:
+        return []
+    df = coerce_trades(df)
+    dates = df['timestamp'].dt.strftime('%Y-%m-%d')
+    runs = df.with_columns(dates.alias('_date'), dates.rle_id().alias('_run'))
+    return [(f"date={part['_date'][0]}", part.drop('_date', '_run'))
+            for part in runs.partition_by('_run', maintain_order=True)]
+
+
+def stage_segments(df: pl.DataFrame, directory: str, prefix: str, compression_level: int = 3,
+                   wallets: Optional[WalletDictionary] = None) -> List[Dict]:
+    """
+    Write processed trades as segment files outside a store, for TradeStore.append_staged()
+
+    Lets worker processes do the encoding while one process owns the manifest.
+
+    Args:
+        df: Processed trades
+        directory: Staging directory
+        prefix: File name prefix, unique per batch
+        compression_level: zstd level
+        wallets: The target store's wallet dictionary if it is compact; every
+            maker and taker must already be in it
+
+    Returns:
+        One {'partition', 'path', 'stats'} entry per day run, in row order
+    """
+    os.makedirs(directory, exist_ok=True)
+    staged = []
+    for i, (partition, part) in enumerate(day_runs(df)):
+        path = os.path.join(directory, f"{prefix}-{i:04d}.parquet")
+        if wallets is not None:
+            part = encode_trades(part, wallets, add=False)
+        _write_segment(part, path, compression_level)
+        staged.append({'partition': partition, 'path': path, 'stats': _segment_stats(part)})
+    return staged
+
+
+class TradeStore:
+    """Append-only, day-partitioned Parquet store for processed trades"""
+
+    def __init__(self, root: str = TRADES_DIR, compression_level: int = 3, encoding: str = DEFAULT_ENCODING):
+        self.root = root
+        self.compression_level = compression_level
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._load_manifest(encoding)
+        self._wallets: Optional[WalletDictionary] = None
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self, encoding: str) -> Dict:
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        schema = COMPACT_SCHEMA if encoding == 'compact' else TRADE_SCHEMA
+        return {
+            'version': MANIFEST_VERSION,
+            'encoding': encoding,
+            'schema': {name: str(dtype) for name, dtype in schema.items()},
+            'rows': 0,
+            'max_timestamp': None,
+            'next_segment': 0,
+            'position': None,
+            'segments': [],
+        }
+
+    def _save_manifest(self) -> None:
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    @property
+    def segments(self) -> List[Dict]:
+        return self.manifest['segments']
+
+    @property
+    def rows(self) -> int:
+        return self.manifest['rows']
+
+    @property
+    def encoding(self) -> str:
+        # Stores written before the compact encoding have no 'encoding' key
+        return self.manifest.get('encoding', 'plain')
+
+    @property
+    def schema(self) -> Dict:
+        """Schema of the segment files"""
+        return COMPACT_SCHEMA if self.encoding == 'compact' else TRADE_SCHEMA
+
+    @property
+    def wallets(self) -> Optional[WalletDictionary]:
+        """Wallet dictionary of a compact store (None for a plain one)"""
+        if self._wallets is None and self.encoding == 'compact':
+            self._wallets = WalletDictionary(os.path.join(self.root, WALLETS_NAME))
+        return self._wallets
+
+    def _encode(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Processed trades in the segment schema (wallets are added to the dictionary first)"""
+        return encode_trades(df, self.wallets) if self.encoding == 'compact' else df
+
+    @property
+    def position(self) -> Optional[Dict]:
+        """Raw-input position of the last committed batch (source, raw_rows, ...), or None"""
+        return self.manifest.get('position')
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, partition: str, stats: Dict) -> str:
+        """Relative path for a new segment, numbered by the manifest"""
+        seq = self.manifest['next_segment']
+        self.manifest['next_segment'] = seq + 1
+        os.makedirs(os.path.join(self.root, partition), exist_ok=True)
+        return os.path.join(partition, f"part-{stats['min_timestamp']}-{stats['max_timestamp']}-{seq:06d}.parquet")
+
+    def _write_file(self, partition: str, df: pl.DataFrame) -> Dict:
+        """Write one segment file (not yet committed) and return its manifest entry"""
+        stats = _segment_stats(df)
+        rel_path = self._segment_path(partition, stats)
+        abs_path = os.path.join(self.root, rel_path)
+        _write_segment(df, f"{abs_path}.tmp", self.compression_level)
+        os.replace(f"{abs_path}.tmp", abs_path)
+        return {'path': rel_path, 'partition': partition, **stats, 'bytes': os.path.getsize(abs_path)}
+
+    def _adopt_file(self, staged: Dict) -> Dict:
+        """Move a stage_segments() file into the store (not yet committed) and return its manifest entry"""
+        rel_path = self._segment_path(staged['partition'], staged['stats'])
+        abs_path = os.path.join(self.root, rel_path)
+        os.replace(staged['path'], abs_path)
+        return {'path': rel_path, 'partition': staged['partition'], **staged['stats'],
+                'bytes': os.path.getsize(abs_path)}
+
+    def _commit(self, entries: List[Dict], position: Optional[Dict]) -> None:
+        for entry in entries:
+            self.segments.append(entry)
+            self.manifest['rows'] += entry['rows']
+            if self.manifest['max_timestamp'] is None or entry['max_timestamp'] > self.manifest['max_timestamp']:
+                self.manifest['max_timestamp'] = entry['max_timestamp']
+        if position is not None:
+            self.manifest['position'] = position
+        self._save_manifest()
+
+    def append(self, df: pl.DataFrame, position: Optional[Dict] = None) -> int:
+        """
+        Write a batch of processed trades as new segments and commit them
+
+        Args:
+            df: Processed trades, in timestamp order (get_processed_df output)
+            position: Raw-input position after this batch, saved with the segments
+
+        Returns:
+            Ordinal of the batch's first row in the store
+        """
+        first = self.rows
+        entries = [self._write_file(partition, self._encode(part)) for partition, part in day_runs(df)]
+        self._commit(entries, position)
+        return first
+
+    def append_staged(self, staged: List[Dict], position: Optional[Dict] = None) -> int:
+        """
+        Commit segments written elsewhere by stage_segments(), e.g. by a worker process
+
+        Args:
+            staged: stage_segments() output for one batch, in order
+            position: Raw-input position after this batch, saved with the segments
+
+        Returns:
+            Ordinal of the batch's first row in the store
+        """
+        first = self.rows
+        self._commit([self._adopt_file(entry) for entry in staged], position)
+        return first
+
+    def _replace_segments(self, replaced: Dict[int, Dict]) -> None:
+        """Swap manifest entries (by index) for rewritten files, then delete the old files"""
+        old_paths = [self.segments[i]['path'] for i in replaced]
+        for i, entry in replaced.items():
+            self.segments[i] = entry
+        self._save_manifest()
+        for path in old_paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except OSError:
+                pass
+
+    def patch_rows(self, rows: pl.DataFrame) -> int:
+        """
+        Replace rows by ordinal, rewriting each affected segment copy-on-write
+
+        Args:
+            rows: Processed trades plus an `ordinal` column (position in the store)
+
+        Returns:
+            Number of rows replaced
+        """
+        if len(rows) == 0:
+            return 0
+        starts = self.segment_starts()
+        rows = rows.with_columns(pl.col('ordinal').cast(pl.Int64))
+        replaced = {}
+        for i, seg in enumerate(self.segments):
+            local = rows.filter(
+                (pl.col('ordinal') >= starts[i]) & (pl.col('ordinal') < starts[i] + seg['rows'])
+            ).with_columns((pl.col('ordinal') - starts[i]).alias('_row'))
+            if len(local) == 0:
+                continue
+            current = pl.read_parquet(os.path.join(self.root, seg['path'])).with_row_index('_row')
+            patched = pl.concat([
+                current.filter(~pl.col('_row').is_in(local['_row'].to_list())),
+                self._encode(coerce_trades(local)).with_columns(local['_row'].cast(pl.UInt32)).select(current.columns),
+            ]).sort('_row').drop('_row')
+            replaced[i] = self._write_file(seg['partition'], patched)
+        self._replace_segments(replaced)
+        return len(rows)
+
+    def compact(self, target_rows: int = DEFAULT_COMPACT_ROWS) -> int:
+        """
+        Merge runs of small adjacent segments in the same partition
+
+        Incremental runs write one small segment per batch; merging them keeps
+        the file count (and per-file decode overhead) down. Row order and
+        ordinals are unchanged.
+
+        Returns:
+            Number of segments removed
+        """
+        groups: List[List[int]] = []
+        for i, seg in enumerate(self.segments):
+            last = groups[-1] if groups else None
+            if (last and self.segments[last[-1]]['partition'] == seg['partition']
+                    and sum(self.segments[j]['rows'] for j in last) + seg['rows'] <= target_rows):
+                last.append(i)
+            else:
+                groups.append([i])
+
+        merged = [g for g in groups if len(g) > 1]
+        if not merged:
+            return 0
+        new_segments = []
+        old_paths = []
+        for group in groups:
+            if len(group) == 1:
+                new_segments.append(self.segments[group[0]])
+                continue
+            paths = [os.path.join(self.root, self.segments[i]['path']) for i in group]
+            df = pl.concat([pl.read_parquet(p) for p in paths])
+            new_segments.append(self._write_file(self.segments[group[0]]['partition'], df))
+            old_paths.extend(paths)
+
+        removed = len(self.segments) - len(new_segments)
+        self.manifest['segments'] = new_segments
+        self._save_manifest()
+        for path in old_paths:
+            os.remove(path)
+        return removed
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def segment_starts(self) -> List[int]:
+        """Ordinal of the first row of every segment, in manifest order"""
+        starts, total = [], 0
+        for seg in self.segments:
+            starts.append(total)
+            total += seg['rows']
+        return starts
+
+    def segment_paths(self, start: Optional[int] = None, end: Optional[int] = None,
+                      market_ids: Optional[Iterable[int]] = None) -> List[str]:
+        """
+        Segment files that can hold trades in [start, end) for `market_ids`
+
+        Args:
+            start: Inclusive lower bound, Unix seconds
+            end: Exclusive upper bound, Unix seconds
+            market_ids: Markets of interest (None = all)
+        """
+        wanted = sorted(set(market_ids)) if market_ids is not None else None
+        selected = []
+        for seg in self.segments:
+            if start is not None and seg['max_timestamp'] < start:
+                continue
+            if end is not None and seg['min_timestamp'] >= end:
+                continue
+            if wanted is not None:
+                lo, hi = seg['min_market_id'], seg['max_market_id']
+                if lo is None or not any(lo <= m <= hi for m in wanted):
+                    continue
+            selected.append(os.path.join(self.root, seg['path']))
+        return selected
+
+    def scan(self, start: Optional[int] = None, end: Optional[int] = None,
+             market_ids: Optional[Iterable[int]] = None, decoded: bool = True) -> pl.LazyFrame:
+        """
+        Lazy scan of committed trades, pruned via the manifest and filtered to the bounds
+
+        Args:
+            start: Inclusive lower bound, Unix seconds
+            end: Exclusive upper bound, Unix seconds
+            market_ids: Markets of interest (None = all)
+            decoded: For a compact store, decode to the processed/trades.csv
+                columns; False keeps the compact columns (wallet ids, micro-units)
+        """
+        market_ids = list(market_ids) if market_ids is not None else None
+        paths = self.segment_paths(start, end, market_ids)
+        if paths:
+            lf = _filter_bounds(pl.scan_parquet(paths), start, end, market_ids)
+        else:
+            lf = pl.DataFrame(schema=self.schema).lazy()
+        if decoded and self.encoding == 'compact':
+            lf = decode_trades(lf, self.wallets)
+        return lf
+
+    def export_csv(self, output_file: str = 'processed/trades.csv') -> int:
+        """Export the store in the processed/trades.csv layout"""
+        self.scan().sink_csv(output_file)
+        return self.rows
+
+    def summary(self) -> str:
+        total_bytes = sum(seg['bytes'] for seg in self.segments)
+        latest = self.manifest['max_timestamp']
+        readable = datetime.fromtimestamp(latest, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC') if latest else 'n/a'
+        return (f"{self.rows:,} trades in {len(self.segments)} segments "
+                f"({total_bytes / 1e6:.1f} MB), latest {readable}")
+
+
+def scan_trades(start: Optional[int] = None, end: Optional[int] = None,
+                market_ids: Optional[Iterable[int]] = None, decoded: bool = True,
+                root: str = TRADES_DIR, csv_file: str = 'processed/trades.csv') -> pl.LazyFrame:
+    """
+    Processed trades from the Parquet store if there is one, else from the CSV
+
+    Args:
+        start: Inclusive lower bound, Unix seconds
+        end: Exclusive upper bound, Unix seconds
+        market_ids: Markets of interest (None = all)
+        decoded: False keeps a compact store's encoded columns (the CSV is always plain)
+    """
+    if os.path.isfile(os.path.join(root, MANIFEST_NAME)):
+        return TradeStore(root).scan(start, end, market_ids, decoded=decoded)
+
+    lf = pl.scan_csv(csv_file, schema_overrides={'timestamp': pl.Datetime('us')})
+    return _filter_bounds(lf, start, end, list(market_ids) if market_ids is not None else None)
@@ -0,0 +1,317 @@
+"""
+Deferred re-resolution of trades whose token had no known market.
+
+get_processed_df() left-joins fills to markets through the token index; a
+fill whose token is not in markets.csv yet is written with a null market_id
+(and without its outcome side). append_processed() records each such row in
+a queue next to the output, keyed by token id:
+
+    processed/trades.csv  →  processed/trades.unresolved.csv
+                             (token_id, byte_offset, raw event columns)
+
+resolve_unresolved() later looks the queued tokens up in the token index
+(and, only when asked with fetch=True, the catalog or the Gamma
+missing-token fetch), re-processes just the queued raw events and rewrites
+the affected lines of trades.csv. Only the file tail from the first patched
+line onwards is rewritten. The tail is streamed in bounded chunks, so a
+rebuild that queues rows far back in a large file costs disk I/O, not
+memory.
+
+The rewrite is journaled: the new tail and the new queue are written to
+`<output>.patch` / `<queue>.next` and recorded in the output's state file
+before trades.csv is touched, so recover_patch() can finish an interrupted
+patch before the next run validates the file.
+
+For the Parquet trade store (processed/trades/) the queue lives at
+processed/trades/_unresolved.csv and `byte_offset` holds the row's ordinal
+in the store instead; the affected segments are rewritten copy-on-write and
+swapped in with one manifest write.
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from poly_utils.token_index import get_token_index
+from poly_utils.utils import update_missing_tokens
+from update_utils.event_store import CSV_COLUMNS, EVENT_SCHEMA
+from update_utils.ingest_state import read_state, write_state
+from update_utils.trade_store import TradeStore
+
+QUEUE_SCHEMA = {
+    'token_id': pl.Utf8,
+    'byte_offset': pl.Int64,
+    **{name: EVENT_SCHEMA[name] for name in CSV_COLUMNS},
+}
+
+
+def queue_path(op_file: str) -> str:
+    """Unresolved-row queue for a processed output file or trade store directory"""
+    if os.path.isdir(op_file):
+        return os.path.join(op_file, '_unresolved.csv')
+    base, _ = os.path.splitext(op_file)
+    return f"{base}.unresolved.csv"
+
+
+def line_offsets(data: bytes, base: int = 0) -> np.ndarray:
+    """Start offset of every newline-terminated line in `data`, shifted by `base`"""
+    ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+    return base + np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+
+
+def line_starts(path: str, lines: np.ndarray, chunk_size: int = 64 << 20) -> np.ndarray:
+    """
+    Start offset of the given lines of a file, found with a chunked newline scan
+
+    Args:
+        path: Text file
+        lines: Sorted 0-based line numbers; the file's line count maps to its end
+        chunk_size: Bytes read at a time (bounds memory)
+    """
+    lines = np.asarray(lines, dtype=np.int64)
+    offsets = np.zeros(len(lines), dtype=np.int64)
+    i = int(np.searchsorted(lines, 1))
+    seen, base = 0, 0
+    with open(path, 'rb') as f:
+        while i < len(lines):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"{path} has {seen:,} lines, line {lines[i]:,} requested")
+            # Line seen + k starts just past the k-th newline of this chunk
+            starts = base + np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')) + 1
+            j = int(np.searchsorted(lines, seen + len(starts), side='right'))
+            offsets[i:j] = starts[lines[i:j] - seen - 1]
+            i, seen, base = j, seen + len(starts), base + len(chunk)
+    return offsets
+
+
+def enqueue(op_file: str, rows: pl.DataFrame) -> int:
+    """
+    Append unresolved rows to the queue
+
+    Args:
+        op_file: Processed output file (or trade store directory) the rows were written to
+        rows: Raw event columns plus `token_id` and `byte_offset` of the written line
+            (the row's ordinal for a trade store)
+
+    Returns:
+        Number of rows queued
+    """
+    if len(rows) == 0:
+        return 0
+    rows = rows.with_columns(pl.col('timestamp').dt.epoch('s')).select(
+        [pl.col(name).cast(dtype) for name, dtype in QUEUE_SCHEMA.items()]
+    )
+    path = queue_path(op_file)
+    exists = os.path.isfile(path)
+    with open(path, 'ab') as f:
+        rows.write_csv(f, include_header=not exists)
+    return len(rows)
+
+
+def read_queue(op_file: str, committed: Optional[int] = None) -> pl.DataFrame:
+    """
+    Queued rows, deduplicated by line
+
+    Entries at or past `committed` bytes belong to a batch whose state update
+    never landed; that batch is re-processed and re-queued, so they are dropped.
+    """
+    path = queue_path(op_file)
+    if not os.path.isfile(path):
+        return pl.DataFrame(schema=QUEUE_SCHEMA)
+    queue = pl.read_csv(path, schema=QUEUE_SCHEMA)
+    if committed is not None:
+        queue = queue.filter(pl.col('byte_offset') < committed)
+    return queue.unique(subset=['byte_offset'], keep='last').sort('byte_offset')
+
+
+def _write_queue(path: str, queue: pl.DataFrame) -> None:
+    with open(path, 'wb') as f:
+        queue.select(list(QUEUE_SCHEMA)).write_csv(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _replace_queue(op_file: str, queue: pl.DataFrame) -> None:
+    path = queue_path(op_file)
+    _write_queue(f"{path}.next", queue)
+    os.replace(f"{path}.next", path)
+
+
+# Bytes copied at a time when streaming a patched tail
+PATCH_CHUNK = 16 << 20
+
+
+def _copy_bytes(src, dst, size: int, chunk_size: int = PATCH_CHUNK) -> None:
+    """Copy exactly `size` bytes from src's position to dst in bounded chunks"""
+    while size > 0:
+        chunk = src.read(min(chunk_size, size))
+        if not chunk:
+            raise ValueError(f"Unexpected end of {src.name}")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _write_patched_tail(op_file: str, start: int, end: int, replacements: Dict[int, bytes],
+                        chunk_size: int = PATCH_CHUNK) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Stream op_file[start:end] into `<op_file>.patch`, swapping in replacement lines
+
+    Args:
+        op_file: Processed output file
+        start: Offset of the first replaced line
+        end: Committed size of op_file
+        replacements: New line for each replaced line's offset
+        chunk_size: Bytes copied at a time (bounds memory)
+
+    Returns:
+        Size of the new tail, the replaced offsets (sorted) and the cumulative
+        size change after each of them
+    """
+    offsets = np.array(sorted(replacements), dtype=np.int64)
+    deltas = np.zeros(len(offsets), dtype=np.int64)
+    written = 0
+    with open(op_file, 'rb') as src, open(f"{op_file}.patch", 'wb') as out:
+        src.seek(start)
+        position = start
+        for i, offset in enumerate(offsets.tolist()):
+            _copy_bytes(src, out, offset - position, chunk_size)
+            old = src.readline()
+            new = replacements[offset]
+            out.write(new)
+            deltas[i] = len(new) - len(old)
+            written += offset - position + len(new)
+            position = offset + len(old)
+        _copy_bytes(src, out, end - position, chunk_size)
+        written += end - position
+        out.flush()
+        os.fsync(out.fileno())
+    return written, offsets, np.cumsum(deltas)
+
+
+def _apply_patch(op_file: str, state: Dict) -> None:
+    """Write the journaled tail into op_file, swap in the new queue and commit the state"""
+    patch = state['patch']
+    size = os.path.getsize(f"{op_file}.patch")
+    if size != patch['size']:
+        raise ValueError(f"{op_file}.patch has {size:,} bytes, expected {patch['size']:,}")
+
+    with open(f"{op_file}.patch", 'rb') as tail, open(op_file, 'r+b') as f:
+        f.seek(patch['offset'])
+        _copy_bytes(tail, f, size)
+        f.truncate(patch['offset'] + size)
+        f.flush()
+        os.fsync(f.fileno())
+
+    queue = queue_path(op_file)
+    if os.path.isfile(f"{queue}.next"):
+        os.replace(f"{queue}.next", queue)
+
+    committed = {k: v for k, v in state.items() if k not in ('patch', 'updated_at')}
+    committed['byte_offset'] = patch['offset'] + size
+    write_state(op_file, **committed)
+    os.remove(f"{op_file}.patch")
+
+
+def recover_patch(op_file: str) -> bool:
+    """Finish a patch interrupted after it was journaled; returns True if one was applied"""
+    state = read_state(op_file)
+    if not state or 'patch' not in state:
+        return False
+    if not os.path.isfile(f"{op_file}.patch"):
+        # Journal already removed: the patch landed and only the state rewrite was lost
+        state.pop('patch')
+        state.pop('updated_at', None)
+        state['byte_offset'] = os.path.getsize(op_file)
+        write_state(op_file, **state)
+        return False
+    print(f"⚠ Finishing interrupted patch of {op_file}")
+    _apply_patch(op_file, state)
+    return True
+
+
+def _resolvable(queue: pl.DataFrame) -> pl.DataFrame:
+    """Queued rows whose token the index now knows"""
+    known = get_token_index().probe_frame(queue['token_id'])
+    return queue.filter(pl.col('token_id').is_in(known['asset_id']))
+
+
+def resolve_unresolved(op_file: str, fetch: bool = False, catalog=None) -> Dict[str, int]:
+    """
+    Resolve queued tokens and patch their rows in op_file
+
+    Args:
+        op_file: Processed output file (processed/trades.csv) or trade store directory
+        fetch: Also fetch tokens the markets files do not know from the Gamma API
+            (network; off in the regular pipeline runs)
+        catalog: Optional MarketCatalog consulted before fetching
+
+    Returns:
+        Counts of queued, patched and still unresolved rows
+    """
+    # Imported here: process_live imports this module for enqueue()
+    from update_utils.process_live import get_processed_df
+
+    store = TradeStore(op_file) if os.path.isdir(op_file) else None
+    if store is None:
+        recover_patch(op_file)
+        state = read_state(op_file)
+        committed = state.get('byte_offset') if state else None
+    else:
+        committed = store.rows
+    queue = read_queue(op_file, committed)
+    result = {'queued': len(queue), 'patched': 0, 'unresolved': len(queue)}
+    if len(queue) == 0 or committed is None:
+        return result
+
+    print(f"🔎 Resolving {len(queue):,} rows with unknown markets "
+          f"({queue['token_id'].n_unique():,} tokens)")
+    resolved = _resolvable(queue)
+    missing = queue.filter(~pl.col('token_id').is_in(resolved['token_id']))['token_id'].unique().to_list()
+    if missing and fetch:
+        update_missing_tokens(missing, catalog=catalog)
+        resolved = _resolvable(queue)
+    if len(resolved) == 0:
+        print("✓ No queued tokens could be resolved yet")
+        return result
+
+    # Re-process just the queued raw events; their lines replace the old ones
+    raw = resolved.select(CSV_COLUMNS + ['byte_offset']).with_columns(
+        pl.from_epoch(pl.col('timestamp'), time_unit='s').alias('timestamp')
+    )
+    processed = get_processed_df(raw, keep_columns=['byte_offset'])
+
+    if store is not None:
+        # Rows never move in the store, so the rest of the queue keeps its ordinals
+        store.patch_rows(processed.rename({'byte_offset': 'ordinal'}))
+        remaining = queue.filter(~pl.col('byte_offset').is_in(resolved['byte_offset']))
+        _replace_queue(op_file, remaining)
+        result.update(patched=len(resolved), unresolved=len(remaining))
+        print(f"✓ Patched {len(resolved):,} rows in {op_file}; {len(remaining):,} still unresolved")
+        return result
+
+    lines = processed.drop('byte_offset').write_csv(include_header=False).encode()
+    replacements = dict(zip(processed['byte_offset'].to_list(), lines.splitlines(keepends=True)))
+
+    # Journal the new tail, then apply it
+    start = min(replacements)
+    size, offsets, shifts = _write_patched_tail(op_file, start, committed, replacements)
+
+    # Rows still unresolved keep their place in the queue, moved by the size change of the lines before them
+    remaining = queue.filter(~pl.col('byte_offset').is_in(resolved['byte_offset']))
+    before = np.searchsorted(offsets, remaining['byte_offset'].to_numpy())
+    shift = np.where(before > 0, shifts[np.maximum(before - 1, 0)], 0)
+    remaining = remaining.with_columns(pl.col('byte_offset') + pl.Series(shift, dtype=pl.Int64))
+
+    queue_file = queue_path(op_file)
+    _write_queue(f"{queue_file}.next", remaining)
+    journaled = {k: v for k, v in state.items() if k != 'updated_at'}
+    journaled['patch'] = {'offset': start, 'size': size}
+    write_state(op_file, **journaled)
+    _apply_patch(op_file, read_state(op_file))
+
+    result.update(patched=len(resolved), unresolved=len(remaining))
+    print(f"✓ Patched {len(resolved):,} rows in {op_file} "
+          f"(rewrote {size / 1e6:.1f} MB tail); {len(remaining):,} still unresolved")
+    return result
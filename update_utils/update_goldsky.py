@@ -1,12 +1,14 @@
 import os
-import pandas as pd
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from flatten_json import flatten
 from datetime import datetime, timezone
-import subprocess
-import time
+import asyncio
 from update_utils.update_markets import update_markets
+from update_utils.event_store import EventStore
+from update_utils.goldsky_decode import decode_events
+from update_utils.goldsky_pager import KeysetCursor, PagerStats, iter_pages, pipelined_pages, MAX_PAGE_SIZE
+from update_utils.goldsky_client import GoldskyClient, AsyncGoldskyClient, QUERY_URL
+from update_utils.ingest_state import (
+    count_lines, read_state, write_state, validate_state, read_last_line, read_first_line,
+)
 
 # Global runtime timestamp - set once when program starts
 RUNTIME_TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -14,25 +16,40 @@ RUNTIME_TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
 # Columns to save
 COLUMNS_TO_SAVE = ['timestamp', 'maker', 'makerAssetId', 'makerAmountFilled', 'taker', 'takerAssetId', 'takerAmountFilled', 'transactionHash']
 
+OUTPUT_FILE = 'goldsky/orderFilled.csv'
+
 if not os.path.isdir('goldsky'):
     os.mkdir('goldsky')
 
-def get_latest_timestamp():
-    """Get the latest timestamp from orderFilled.csv, or 0 if file doesn't exist"""
-    cache_file = 'goldsky/orderFilled.csv'
+def get_latest_timestamp(output_format='csv'):
+    """Get the latest timestamp from orderFilled.csv (or the event store), or 0 if nothing exists"""
+    if output_format == 'parquet':
+        last_timestamp = EventStore().latest_timestamp()
+        if last_timestamp:
+            readable_time = datetime.fromtimestamp(last_timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+            print(f'Resuming from timestamp {last_timestamp} ({readable_time})')
+        else:
+            print("Empty event store, starting from beginning of time (timestamp 0)")
+        return last_timestamp
+
+    cache_file = OUTPUT_FILE
     
     if not os.path.isfile(cache_file):
         print("No existing file found, starting from beginning of time (timestamp 0)")
         return 0
+
+    state = validate_state(cache_file, read_state(cache_file))
+    if state:
+        last_timestamp = state['cursor']['timestamp']
+        readable_time = datetime.fromtimestamp(last_timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        print(f'Resuming from timestamp {last_timestamp} ({readable_time}) [state file]')
+        return last_timestamp
     
     try:
-        # Use tail to get the last line efficiently
-        result = subprocess.run(['tail', '-n', '1', cache_file], capture_output=True, text=True, check=True)
-        last_line = result.stdout.strip()
+        # No state file yet (older data): read the header and the last line directly
+        last_line = read_last_line(cache_file)
         if last_line:
-            # Get header to find timestamp column index
-            header_result = subprocess.run(['head', '-n', '1', cache_file], capture_output=True, text=True, check=True)
-            headers = header_result.stdout.strip().split(',')
+            headers = read_first_line(cache_file).split(',')
             
             if 'timestamp' in headers:
                 timestamp_index = headers.index('timestamp')
@@ -43,113 +60,189 @@ def get_latest_timestamp():
                     print(f'Resuming from timestamp {last_timestamp} ({readable_time})')
                     return last_timestamp
     except Exception as e:
-        print(f"Error reading latest file with tail: {e}")
-        # Fallback to pandas
-        try:
-            df = pd.read_csv(cache_file)
-            if len(df) > 0 and 'timestamp' in df.columns:
-                last_timestamp = df.iloc[-1]['timestamp']
-                readable_time = datetime.fromtimestamp(int(last_timestamp), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
-                print(f'Resuming from timestamp {last_timestamp} ({readable_time})')
-                return int(last_timestamp)
-        except Exception as e2:
-            print(f"Error reading with pandas: {e2}")
+        print(f"Error reading last line of {cache_file}: {e}")
     
     # Fallback to beginning of time
     print("Falling back to beginning of time (timestamp 0)")
     return 0
 
-def scrape(at_once=1000):
-    QUERY_URL = "https://api.goldsky.com/api/public/project_cl6mb8i9h0003e201j6li0diw/subgraphs/orderbook-subgraph/0.0.1/gn"
-    print(f"Query URL: {QUERY_URL}")
+def get_resume_cursor(output_format='csv'):
+    """Keyset cursor to resume from: the saved cursor (manifest or state file), else the latest timestamp"""
+    if output_format == 'parquet':
+        saved = EventStore().manifest.get('cursor')
+    else:
+        state = validate_state(OUTPUT_FILE, read_state(OUTPUT_FILE))
+        saved = state['cursor'] if state else None
+
+    if saved:
+        cursor = KeysetCursor.from_dict(saved)
+        readable_time = datetime.fromtimestamp(cursor.timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        print(f'Resuming from cursor ({cursor.timestamp}, {cursor.id}) ({readable_time})')
+        return cursor
+    return KeysetCursor(get_latest_timestamp(output_format))
+
+class RawEventWriter:
+    """
+    Commits decoded pages to goldsky/orderFilled.csv or the Parquet event store
+
+    Each write appends a page and records the cursor after it, so the scraper
+    and the follow loop share one commit path. The event store drops ids it
+    already holds (dedup index). The CSV has no id column to index; it relies
+    on the exact (timestamp, id) cursor instead, and a page appended without
+    its state update is truncated by validate_state() and fetched again.
+
+    Limitation: the CSV path never consults the dedup index, so duplicates
+    already in orderFilled.csv (e.g. written by older versions that resumed
+    from a timestamp) stay there. Use output_format='parquet' to deduplicate.
+    """
+
+    def __init__(self, output_format='csv'):
+        self.output_format = output_format
+        self.duplicates = 0
+        self.state = {}
+        self.row_count = None
+
+        if output_format == 'parquet':
+            # The store consults its own id index on every append
+            self.store = EventStore(dedup=True)
+            self.dedup = self.store.dedup
+            self.output_file = self.store.root
+        else:
+            self.store = None
+            self.output_file = OUTPUT_FILE
+            self.state = read_state(self.output_file) or {}
+            self.row_count = self.state.get('row_count')
+            if self.row_count is None and os.path.isfile(self.output_file):
+                # No state yet (older data): count the rows once, then keep the count in the state
+                self.row_count = max(0, count_lines(self.output_file)[0] - 1)
+            self.dedup = None
+
+    def write(self, df, cursor):
+        """
+        Append a decoded page and commit the cursor after it
+
+        Args:
+            df: Events from decode_events() (may be empty)
+            cursor: KeysetCursor after this page
+
+        Returns:
+            The events that were actually new
+        """
+        if self.store is not None:
+            new_df = self.store.append(df, cursor=cursor.to_dict())
+            self.duplicates += len(df) - len(new_df)
+            return new_df
+
+        new_df = df
+        if len(new_df) == 0:
+            if os.path.isfile(self.output_file):
+                write_state(self.output_file, cursor=cursor.to_dict(), row_count=self.row_count,
+                            last_event_id=self.state.get('last_event_id'))
+            return new_df
+
+        df_to_save = new_df.select(COLUMNS_TO_SAVE)
+        if os.path.isfile(self.output_file):
+            with open(self.output_file, mode='a') as f:
+                df_to_save.write_csv(f, include_header=False)
+        else:
+            df_to_save.write_csv(self.output_file)
+            self.row_count = 0
+
+        # Commit point: resume from here even if the next page never lands
+        if self.row_count is not None:
+            self.row_count += len(df_to_save)
+        self.state['last_event_id'] = new_df['id'][-1]
+        write_state(self.output_file, cursor=cursor.to_dict(), row_count=self.row_count,
+                    last_event_id=self.state['last_event_id'])
+        return new_df
+
+    def commit(self):
+        """Make everything written so far durable (flushes the event store buffer; CSV pages commit on write)"""
+        if self.store is not None:
+            self.store.flush()
+
+    def close(self):
+        self.commit()
+
+
+def scrape(at_once=MAX_PAGE_SIZE, output_format='csv', pipelined=False, url=QUERY_URL):
+    """
+    Scrape orderFilledEvents after the last saved (timestamp, id) cursor
+
+    Args:
+        at_once: Page size for each GraphQL request (at most MAX_PAGE_SIZE)
+        output_format: 'csv' appends to goldsky/orderFilled.csv,
+                       'parquet' writes day-partitioned segments to goldsky/events/
+        pipelined: Use the asyncio client and fetch the next page while the
+                   current one is being written (requires aiohttp)
+        url: Subgraph endpoint (e.g. a local stand-in for benchmarks)
+
+    Returns:
+        PagerStats for the run
+    """
+    print(f"Query URL: {url}")
     print(f"Runtime timestamp: {RUNTIME_TIMESTAMP}")
     
-    # Get starting timestamp from latest file
-    last_value = get_latest_timestamp()
+    # Get starting cursor from latest file
+    cursor = get_resume_cursor(output_format)
     count = 0
     total_records = 0
+    stats = PagerStats()
 
     print(f"\nStarting scrape for orderFilledEvents")
     
-    output_file = 'goldsky/orderFilled.csv'
-    print(f"Output file: {output_file}")
+    writer = RawEventWriter(output_format)
+    print(f"Output file: {writer.output_file}")
+    if writer.dedup is not None:
+        print(f"Dedup index: {writer.dedup.summary()}")
     print(f"Saving columns: {COLUMNS_TO_SAVE}")
 
-    while True:
-        q_string = '''query MyQuery {
-                        orderFilledEvents(orderBy: timestamp 
-                                             first: ''' + str(at_once) + '''
-                                             where: {timestamp_gt: "''' + str(last_value) + '''"}) {
-                            fee
-                            id
-                            maker
-                            makerAmountFilled
-                            makerAssetId
-                            orderHash
-                            taker
-                            takerAmountFilled
-                            takerAssetId
-                            timestamp
-                            transactionHash
-                        }
-                    }
-                '''
-
-        query = gql(q_string)
-        transport = RequestsHTTPTransport(url=QUERY_URL, verify=True, retries=3)
-        client = Client(transport=transport)
-        
-        try:
-            res = client.execute(query)
-        except Exception as e:
-            print(f"Query error: {e}")
-            print("Retrying in 5 seconds...")
-            time.sleep(5)
-            continue
-        
-        if not res['orderFilledEvents'] or len(res['orderFilledEvents']) == 0:
-            print(f"No more data for orderFilledEvents")
-            break
-
-        df = pd.DataFrame([flatten(x) for x in res['orderFilledEvents']]).reset_index(drop=True)
-        
-        # Sort by timestamp and update last_value
-        df = df.sort_values('timestamp', ascending=True).reset_index(drop=True)
-        last_value = df.iloc[-1]['timestamp']
-        
-        readable_time = datetime.fromtimestamp(int(last_value), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
-        print(f"Batch {count + 1}: Last timestamp {last_value} ({readable_time}), Records: {len(df)}")
-        
-        count += 1
-        total_records += len(df)
-
-        # Remove duplicates
-        df = df.drop_duplicates()
-
-        # Filter to only the columns we want to save
-        df_to_save = df[COLUMNS_TO_SAVE].copy()
-
-        # Save to file
-        if os.path.isfile(output_file):
-            df_to_save.to_csv(output_file, index=None, mode='a', header=None)
-        else:
-            df_to_save.to_csv(output_file, index=None)
+    def write_page(records, cursor):
+        nonlocal count, total_records
+        # Typed columns straight from the JSON page, sorted by (timestamp, id) and deduplicated
+        df = decode_events(records)
+        if len(df):
+            last_value = df['timestamp'][-1]
+            readable_time = datetime.fromtimestamp(int(last_value), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+            page_rate = stats.last_page_rows / stats.last_page_seconds if stats.last_page_seconds else 0
+            print(f"Batch {count + 1}: Last timestamp {last_value} ({readable_time}), Records: {len(df)}, "
+                  f"{page_rate:,.0f} rows/s (page), {stats.rows_per_second:,.0f} rows/s (overall)")
+            count += 1
+
+        total_records += len(writer.write(df, cursor))
+
+    if pipelined:
+        async def run():
+            async with AsyncGoldskyClient(url) as client:
+                await pipelined_pages(client, cursor, write_page, at_once, stats=stats)
+        asyncio.run(run())
+    else:
+        with GoldskyClient(url) as client:
+            for records, page_cursor in iter_pages(client, cursor, at_once, stats=stats):
+                write_page(records, page_cursor)
+
+    print(f"No more data for orderFilledEvents")
+    print(f"Pagination: {stats.summary()}")
 
-        if len(df) < at_once:
-            break
+    writer.close()
+    if writer.store is not None:
+        print(f"Event store: {writer.store.summary()}")
+    if writer.duplicates:
+        print(f"Skipped {writer.duplicates:,} events already stored")
 
     print(f"Finished scraping orderFilledEvents")
     print(f"Total new records: {total_records}")
-    print(f"Output file: {output_file}")
+    print(f"Output file: {writer.output_file}")
+    return stats
 
-def update_goldsky():
+def update_goldsky(output_format='csv', pipelined=False):
     """Run scraping for orderFilledEvents"""
     print(f"\n{'='*50}")
     print(f"Starting to scrape orderFilledEvents")
     print(f"Runtime: {RUNTIME_TIMESTAMP}")
     print(f"{'='*50}")
     try:
-        scrape()
+        scrape(output_format=output_format, pipelined=pipelined)
         print(f"Successfully completed orderFilledEvents")
     except Exception as e:
         print(f"Error scraping orderFilledEvents: {str(e)}")
\ No newline at end of file
@@ -1,11 +1,16 @@
-import requests
 import csv
-import json
 import os
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Union
+
+import requests
+
+from poly_utils.gamma_decode import MARKETS_CSV_COLUMNS, csv_rows, loads, payload_to_markets, read_payload
+from poly_utils.rate_control import get_controller
+from update_utils.ingest_state import read_state, write_state, validate_state
 
 def count_csv_lines(csv_filename: str) -> int:
-    """Count the number of data lines in CSV (excluding header)"""
+    """Count the number of data lines in CSV (excluding header); fallback when there is no state file"""
     if not os.path.exists(csv_filename):
         return 0
     
@@ -18,141 +23,147 @@ def count_csv_lines(csv_filename: str) -> int:
         print(f"Error reading CSV: {e}")
         return 0
 
-def update_markets(csv_filename: str = "markets.csv", batch_size: int = 500):
+MARKETS_URL = "https://gamma-api.polymarket.com/markets"
+
+# Attempts per offset window before the run stops at its last commit point
+MAX_WINDOW_RETRIES = 5
+
+# CSV headers for the required columns
+MARKET_HEADERS = MARKETS_CSV_COLUMNS
+
+
+def fetch_markets_window(offset: int, limit: int, rate=None, filters: Optional[Dict] = None,
+                         raw: bool = False, url: str = MARKETS_URL,
+                         max_retries: int = MAX_WINDOW_RETRIES) -> Union[List[Dict], bytes]:
+    """
+    Fetch one `limit`-sized window of markets ordered by creation date
+    
+    429s, 5xx and network errors are retried through the shared 'gamma'
+    controller, so concurrent windows back off together. After `max_retries`
+    attempts, or on any other status, the window raises instead of retrying.
+    
+    Args:
+        offset: Window start
+        limit: Window size
+        rate: RateController to use (defaults to the shared 'gamma' one)
+        filters: Extra query parameters, e.g. {'closed': 'false'}
+        raw: Return the undecoded response body (for read_payload)
+        url: Markets endpoint (e.g. a local stand-in)
+        max_retries: Attempts before giving up on the window
+    """
+    rate = rate or get_controller('gamma')
+    params = {
+        'order': 'createdAt',
+        'ascending': 'true',
+        'limit': limit,
+        'offset': offset,
+        **(filters or {}),
+    }
+    # Transport errors are re-raised by the controller once the attempts run out
+    response = rate.request('GET', url, params=params, timeout=30, max_attempts=max_retries)
+    if response.status_code != 200:
+        raise RuntimeError(f"API error {response.status_code} at offset {offset}: {response.text[:200]}")
+    return response.content if raw else loads(response.content)
+
+
+def update_markets(csv_filename: str = "markets.csv", batch_size: int = 500, workers: int = 4,
+                   url: str = MARKETS_URL):
     """
     Fetch markets ordered by creation date and save to CSV.
-    Automatically resumes from the correct offset based on existing CSV lines.
+    Automatically resumes from the offset in markets.state.json, falling back
+    to counting CSV lines for files written before the state file existed.
+    
+    Offset windows are fetched by up to `workers` threads at once and written
+    strictly in offset order, so the file always holds a contiguous prefix.
+    A window that fails after its retries ends the run at the last commit
+    point without raising; the next run resumes from there.
     
     Args:
         csv_filename: Name of CSV file to save to
         batch_size: Number of markets to fetch per request
+        workers: Offset windows fetched concurrently (1 = serial)
+        url: Markets endpoint (e.g. a local stand-in)
     """
+    rate = get_controller('gamma')
     
-    base_url = "https://gamma-api.polymarket.com/markets"
+    # O(1) resume: a committed window records its offset and the file size;
+    # bytes past that size are a half-written window and are truncated here
+    state = None
+    if os.path.exists(csv_filename):
+        state = validate_state(csv_filename, read_state(csv_filename))
     
-    # CSV headers for the required columns
-    headers = [
-        'createdAt', 'id', 'question', 'answer1', 'answer2', 'neg_risk', 
-        'market_slug', 'token1', 'token2', 'condition_id', 'volume', 'ticker', 'closedTime'
-    ]
-    
-    # Dynamically set offset based on existing records
-    current_offset = count_csv_lines(csv_filename)
+    # Last market committed, recorded with each window for the resume message
+    last_market = {'last_id': None, 'last_created_at': None}
+    if state:
+        current_offset = state['offset']
+        row_count = state.get('row_count', current_offset)
+        last_market = {key: state.get(key) for key in last_market}
+        print(f"Resuming from offset {current_offset} (state file, last market {state.get('last_id')} "
+              f"created {state.get('last_created_at')})")
+    else:
+        # Dynamically set offset based on existing records
+        current_offset = count_csv_lines(csv_filename)
+        row_count = current_offset
     file_exists = os.path.exists(csv_filename) and current_offset > 0
     
     if file_exists:
-        print(f"Found {current_offset} existing records. Resuming from offset {current_offset}")
+        print(f"Found {row_count} existing records. Resuming from offset {current_offset}")
         mode = 'a'
     else:
         print(f"Creating new CSV file: {csv_filename}")
         mode = 'w'
     
     total_fetched = 0
+    # Windows requested ahead of the commit point; bounds memory if one window stalls
+    max_in_flight = max(1, workers * 2)
     
-    with open(csv_filename, mode, newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        # Write headers only if file is new
-        if mode == 'w':
-            writer.writerow(headers)
-        
-        while True:
-            print(f"Fetching batch at offset {current_offset}...")
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = {}
+    try:
+        with open(csv_filename, mode, newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
             
-            try:
-                params = {
-                    'order': 'createdAt',
-                    'ascending': 'true',
-                    'limit': batch_size,
-                    'offset': current_offset
-                }
-                
-                response = requests.get(base_url, params=params, timeout=30)
-                
-                # Handle different HTTP status codes
-                if response.status_code == 500:
-                    print(f"Server error (500) - retrying in 5 seconds...")
-                    import time
-                    time.sleep(5)
-                    continue
-                elif response.status_code == 429:
-                    print(f"Rate limited (429) - waiting 10 seconds...")
-                    import time
-                    time.sleep(10)
-                    continue
-                elif response.status_code != 200:
-                    print(f"API error {response.status_code}: {response.text}")
-                    print("Retrying in 3 seconds...")
-                    import time
-                    time.sleep(3)
-                    continue
+            # Write headers only if file is new
+            if mode == 'w':
+                writer.writerow(MARKET_HEADERS)
+            
+            next_offset = current_offset
+            
+            while True:
+                while len(pending) < max_in_flight:
+                    pending[next_offset] = pool.submit(fetch_markets_window, next_offset, batch_size, rate, raw=True, url=url)
+                    next_offset += batch_size
                 
-                markets = response.json()
+                print(f"Fetching batch at offset {current_offset}...")
+                # The body goes straight into columns; no per-market dicts are built
+                try:
+                    markets = read_payload(pending.pop(current_offset).result())
+                except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+                    print(f"Window at offset {current_offset} failed ({e}); stopping at the last commit point")
+                    break
                 
-                if not markets:
+                if len(markets) == 0:
                     print(f"No more markets found at offset {current_offset}. Completed!")
                     break
                 
-                batch_count = 0
-                
-                for market in markets:
-                    try:
-                        # Parse outcomes for answer1 and answer2
-                        outcomes_str = market.get('outcomes', '[]')
-                        if isinstance(outcomes_str, str):
-                            outcomes = json.loads(outcomes_str)
-                        else:
-                            outcomes = outcomes_str
-                        
-                        answer1 = outcomes[0] if len(outcomes) > 0 else ''
-                        answer2 = outcomes[1] if len(outcomes) > 1 else ''
-                        
-                        # Parse clobTokenIds for token1 and token2
-                        clob_tokens_str = market.get('clobTokenIds', '[]')
-                        if isinstance(clob_tokens_str, str):
-                            clob_tokens = json.loads(clob_tokens_str)
-                        else:
-                            clob_tokens = clob_tokens_str
-                        
-                        token1 = clob_tokens[0] if len(clob_tokens) > 0 else ''
-                        token2 = clob_tokens[1] if len(clob_tokens) > 1 else ''
-                        
-                        # Check for negative risk indicators
-                        neg_risk = market.get('negRiskAugmented', False) or market.get('negRiskOther', False)
-                        
-                        # Create row with required columns
-                        question_text = market.get('question', '') or market.get('title', '')
-                        
-                        # Get ticker from events if available
-                        ticker = ''
-                        if market.get('events') and len(market.get('events', [])) > 0:
-                            ticker = market['events'][0].get('ticker', '')
-                        
-                        row = [
-                            market.get('createdAt', ''),
-                            market.get('id', ''),
-                            question_text,
-                            answer1,
-                            answer2,
-                            neg_risk,
-                            market.get('slug', ''),
-                            token1,
-                            token2,
-                            market.get('conditionId', ''),
-                            market.get('volume', ''),
-                            ticker,
-                            market.get('closedTime', '')
-                        ]
-                        
-                        writer.writerow(row)
-                        batch_count += 1
-                        
-                    except (ValueError, KeyError, json.JSONDecodeError) as e:
-                        print(f"Error processing market {market.get('id', 'unknown')}: {e}")
-                        continue
+                # Entries without an id are dropped here but still advance the offset
+                decoded = payload_to_markets(markets)
+                writer.writerows(csv_rows(decoded, MARKET_HEADERS))
+                batch_count = len(decoded)
                 
+                csvfile.flush()
+                rate.record_rows(batch_count)
                 total_fetched += batch_count
-                current_offset += batch_count  # Increment by actual records processed
+                row_count += batch_count
+                # Windows are fixed-size, so the commit point advances by what was fetched
+                current_offset += len(markets)
+                
+                if batch_count:
+                    # From the decoded rows, so a malformed last entry doesn't record a null id
+                    last_market = {'last_id': decoded['id'][-1], 'last_created_at': decoded['createdAt'][-1]}
+
+                # Commit point: the state (with the file size) is only written after the whole window
+                write_state(csv_filename, offset=current_offset, row_count=row_count, **last_market)
                 
                 print(f"Processed {batch_count} markets. Total new: {total_fetched}. Next offset: {current_offset}")
                 
@@ -160,23 +171,17 @@ def update_markets(csv_filename: str = "markets.csv", batch_size: int = 500):
                 if len(markets) < batch_size:
                     print(f"Received only {len(markets)} markets (less than batch size). Reached end.")
                     break
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Network error: {e}")
-                print(f"Retrying in 5 seconds...")
-                import time
-                time.sleep(5)
-                continue
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                print(f"Retrying in 3 seconds...")
-                import time
-                time.sleep(3)
-                continue
+    finally:
+        # Windows past the end (or behind a failed one) are not needed: drop the
+        # queued ones and don't wait on those already running
+        for future in pending.values():
+            future.cancel()
+        pool.shutdown(wait=False)
     
     print(f"\nCompleted! Fetched {total_fetched} new markets.")
+    print(rate.summary())
     print(f"Data saved to: {csv_filename}")
     print(f"Total records: {current_offset}")
 
 # if __name__ == "__main__":
-#     update_markets(batch_size=500)
\ No newline at end of file
+#     update_markets(batch_size=500)
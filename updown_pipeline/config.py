@@ -58,7 +58,8 @@ CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
 POLYMARKET_API_BASE = "https://gamma-api.polymarket.com"
 CLOB_API_BASE = "https://clob.polymarket.com"
 
-# API rate limiting (seconds between requests)
+# Initial API pacing (seconds between requests); the shared rate controller
+# adapts from here based on 429s and successful responses
 API_DELAY = 0.5
 
 # ============================================================================
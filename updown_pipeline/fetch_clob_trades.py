@@ -4,11 +4,15 @@ Query CLOB API for markets not in historical data.
 """
 import polars as pl
 import requests
-import time
 from typing import List, Dict, Any, Optional
 
+from poly_utils.rate_control import get_controller
+
 from . import config
 
+# Shared with any other CLOB fetcher; starts at the configured pace and adapts
+clob_rate = get_controller('clob', rate=1.0 / config.API_DELAY)
+
 
 def fetch_market_trades_from_clob(market_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
     """
@@ -28,18 +32,20 @@ def fetch_market_trades_from_clob(market_id: str, limit: int = 1000) -> List[Dic
     }
 
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = clob_rate.request('GET', url, params=params, timeout=30, max_attempts=3)
         response.raise_for_status()
         data = response.json()
 
         # CLOB API might return trades in different format
         # Adjust based on actual API response
         if isinstance(data, list):
-            return data
+            trades = data
         elif isinstance(data, dict) and 'data' in data:
-            return data['data']
+            trades = data['data']
         else:
-            return []
+            trades = []
+        clob_rate.record_rows(len(trades))
+        return trades
 
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
@@ -149,7 +155,7 @@ def fetch_clob_trades_for_new_markets() -> int:
 
     print(f"   Found {len(market_ids_to_fetch)} markets to fetch from CLOB API")
     print(f"\n→ Fetching trades from CLOB API...")
-    print(f"   (Rate limited: {config.API_DELAY}s between requests)")
+    print(f"   (Adaptive rate limit, starting at {clob_rate.rate:.1f} req/s)")
 
     # Fetch trades for each market
     all_new_trades = []
@@ -168,14 +174,11 @@ def fetch_clob_trades_for_new_markets() -> int:
         else:
             print("○ no trades")
 
-        # Rate limiting
-        if i < len(market_ids_to_fetch):
-            time.sleep(config.API_DELAY)
-
     print(f"\n→ Summary:")
     print(f"   Markets queried: {len(market_ids_to_fetch)}")
     print(f"   Markets with trades: {markets_with_trades}")
     print(f"   Total new trades: {len(all_new_trades):,}")
+    print(f"   {clob_rate.summary()}")
 
     if not all_new_trades:
         print("\n✅ Stage 2B complete: No new trades found")
@@ -6,25 +6,27 @@ import re
 import requests
 import polars as pl
 import time
-from datetime import datetime
 from typing import List, Dict, Any, Optional
-import ast
+
+from poly_utils.gamma_decode import decode_event_markets, iso_to_unix, loads
 
 from . import config
 
 
-def fetch_polymarket_events(closed: bool = False, limit: int = 1000) -> List[Dict[str, Any]]:
+def fetch_polymarket_events(closed: bool = False, limit: int = 1000,
+                            api_base: str = config.POLYMARKET_API_BASE) -> List[Dict[str, Any]]:
     """
     Fetch events from Polymarket API
 
     Args:
         closed: Include closed markets
         limit: Max number of events to fetch
+        api_base: Gamma API root (e.g. a local stand-in)
 
     Returns:
         List of event dictionaries
     """
-    url = f"{config.POLYMARKET_API_BASE}/events"
+    url = f"{api_base}/events"
     params = {
         "limit": limit,
         "closed": "true" if closed else "false",
@@ -34,7 +36,7 @@ def fetch_polymarket_events(closed: bool = False, limit: int = 1000) -> List[Dic
     try:
         response = requests.get(url, params=params, timeout=30)
         response.raise_for_status()
-        events = response.json()
+        events = loads(response.content)
         return events if isinstance(events, list) else []
     except Exception as e:
         print(f"❌ Error fetching events: {e}")
@@ -95,60 +97,53 @@ def extract_asset(event: Dict[str, Any]) -> Optional[str]:
     return None
 
 
+def updown_market_frame(events: List[Dict[str, Any]], assets: List[str], durations: List[str]) -> pl.DataFrame:
+    """
+    Structured up/down market rows for a batch of events, decoded in one pass
+
+    Args:
+        events: Up/down events (first market of each is used)
+        assets: Asset of each event
+        durations: Duration of each event
+
+    Returns:
+        One row per event that has a market
+    """
+    decoded = decode_event_markets(events)
+    labels = pl.DataFrame({
+        'event_index': list(range(len(events))),
+        'asset': assets,
+        'duration': durations,
+    }, schema={'event_index': pl.UInt32, 'asset': pl.Utf8, 'duration': pl.Utf8})
+
+    return decoded.join(labels, on='event_index', how='left').select(
+        pl.col('event_id'),
+        pl.col('id').alias('market_id'),
+        pl.col('event_slug').alias('slug'),
+        pl.col('asset'),
+        pl.col('duration'),
+        pl.when(pl.col('question') != '').then(pl.col('question')).otherwise(pl.col('event_title')).alias('question'),
+        iso_to_unix('event_start_time').alias('start_time'),
+        # Convert to Unix timestamps; the event's end date wins over the market's
+        pl.coalesce(iso_to_unix('event_end_date'), iso_to_unix('end_date')).alias('end_time'),
+        pl.col('token1').replace('', None).alias('yes_token_id'),
+        pl.col('token2').replace('', None).alias('no_token_id'),
+        pl.col('resolution_source'),
+        pl.col('volume').cast(pl.Float64, strict=False).fill_null(0.0),
+        pl.col('active').fill_null(False),
+        pl.col('closed').fill_null(False),
+    )
+
+
 def extract_market_data(event: Dict[str, Any], asset: str, duration: str) -> Dict[str, Any]:
     """
     Extract structured market data from event
 
     Returns:
-        Dictionary with market metadata
+        Dictionary with market metadata (empty if the event has no market)
     """
-    # Get first market (up/down events usually have one market)
-    markets = event.get('markets', [])
-    market = markets[0] if markets else {}
-
-    # Extract token IDs
-    token_ids_str = market.get('clobTokenIds', '[]')
-    try:
-        token_ids = ast.literal_eval(token_ids_str)
-        yes_token_id = token_ids[0] if len(token_ids) > 0 else None
-        no_token_id = token_ids[1] if len(token_ids) > 1 else None
-    except:
-        yes_token_id = None
-        no_token_id = None
-
-    # Parse timestamps
-    end_date = event.get('endDate') or market.get('endDate')
-    event_start_time = market.get('eventStartTime')
-
-    # Convert to Unix timestamps if needed
-    def parse_timestamp(ts_str):
-        if not ts_str:
-            return None
-        try:
-            dt = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-            return int(dt.timestamp())
-        except:
-            return None
-
-    end_time = parse_timestamp(end_date)
-    start_time = parse_timestamp(event_start_time)
-
-    return {
-        'event_id': event.get('id'),
-        'market_id': market.get('id'),
-        'slug': event.get('slug'),
-        'asset': asset,
-        'duration': duration,
-        'question': market.get('question') or event.get('title'),
-        'start_time': start_time,
-        'end_time': end_time,
-        'yes_token_id': yes_token_id,
-        'no_token_id': no_token_id,
-        'resolution_source': market.get('resolutionSource'),
-        'volume': float(market.get('volume', 0)),
-        'active': market.get('active', False),
-        'closed': market.get('closed', False),
-    }
+    df = updown_market_frame([event], [asset], [duration])
+    return df.row(0, named=True) if len(df) else {}
 
 
 def discover_updown_markets(include_closed: bool = False) -> int:
@@ -176,7 +171,7 @@ def discover_updown_markets(include_closed: bool = False) -> int:
 
     # Filter for up/down markets
     print(f"\n→ Filtering for up/down markets...")
-    updown_markets = []
+    matches = []
 
     for event in events:
         # Check if up/down market
@@ -194,27 +189,17 @@ def discover_updown_markets(include_closed: bool = False) -> int:
         if not duration or duration not in config.DURATIONS:
             continue
 
-        # Extract structured data
-        try:
-            market_data = extract_market_data(event, asset, duration)
-            if market_data.get('market_id'):  # Ensure we have a market ID
-                updown_markets.append(market_data)
-        except Exception as e:
-            print(f"   ⚠️ Error processing event {event.get('id')}: {e}")
-            continue
+        matches.append((event, asset, duration))
 
-    print(f"   Found {len(updown_markets)} up/down markets")
+    # Extract structured data for all matches at once; events without a market ID are dropped
+    df = updown_market_frame([m[0] for m in matches], [m[1] for m in matches], [m[2] for m in matches])
+    df = df.filter(pl.col('market_id').is_not_null())
+    print(f"   Found {len(df)} up/down markets")
 
-    if not updown_markets:
+    if len(df) == 0:
         print("❌ No up/down markets found")
         return 0
 
-    # Convert to DataFrame (with schema overrides for large token IDs)
-    df = pl.DataFrame(updown_markets, schema_overrides={
-        'yes_token_id': pl.Utf8,
-        'no_token_id': pl.Utf8
-    })
-
     # Summary by asset and duration
     print(f"\n→ Markets by asset:")
     asset_counts = df.group_by('asset').agg(pl.len().alias('count')).sort('asset')
@@ -230,10 +215,10 @@ def discover_updown_markets(include_closed: bool = False) -> int:
     print(f"\n→ Saving to {config.UPDOWN_MARKETS}...")
     df.write_csv(config.UPDOWN_MARKETS)
 
-    print(f"\n✅ Stage 1 complete: {len(updown_markets)} markets discovered")
+    print(f"\n✅ Stage 1 complete: {len(df)} markets discovered")
     print("="*70 + "\n")
 
-    return len(updown_markets)
+    return len(df)
 
 
 if __name__ == "__main__":